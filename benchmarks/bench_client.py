@@ -0,0 +1,183 @@
+"""
+    Client benchmarks against an in process stub Eureka server: register,
+    renew, registry fetch and parse, lookups and failover to a second peer.
+
+    python -m benchmarks.bench_client [--sizes 1000,10000,50000] [--output results.json]
+    python -m benchmarks.bench_client --compare baseline.json [--threshold 0.2]
+
+    Results are written as JSON keyed by benchmark name so that the runs of
+    two commits can be compared; ``--compare`` exits with status 1 when a
+    median got slower than ``--threshold``.
+"""
+
+import argparse
+import json
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+from flask_eureka.eurekaclient import EurekaClient
+from flask_eureka.jsonstream import ApplicationStream, loads
+from flask_eureka.model import Application
+from flask_eureka.serverhealth import ServerHealth
+from flask_eureka.stubserver import StubEureka
+
+
+def measure(fn, repeat):
+    fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'runs': repeat,
+        'mean_ms': sum(timings) / repeat * 1e3,
+        'p50_ms': timings[repeat // 2] * 1e3,
+        'p99_ms': timings[min(int(repeat * 0.99), repeat - 1)] * 1e3,
+        'min_ms': timings[0] * 1e3,
+    }
+
+
+def client_for(urls, **kwargs):
+    client = EurekaClient(name='bench', host_name='bench-host', port=8080, eureka_url=urls[0],
+                          use_dns=False, status_update_delay=0, **kwargs)
+    client.eureka_urls = list(urls)
+    return client
+
+
+def unused_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def bench_operations(results, repeat):
+    with StubEureka() as stub:
+        client = client_for([stub.url])
+        results['register'] = measure(client.register, repeat)
+        results['renew'] = measure(client.renew, repeat)
+        results['set_status'] = measure(lambda: client.set_status('UP', immediate=True), repeat)
+
+
+def bench_registry(results, size, repeat):
+    with StubEureka(instances=size, apps=max(size // 100, 1)) as stub:
+        client = client_for([stub.url], fetch_registry=True)
+        body = stub.handle('GET', ['apps'], {}, b'')[1]
+
+        def parse():
+            applications = loads(body)['applications']['application']
+            return [Application.from_dict(application) for application in applications]
+
+        def parse_stream():
+            chunks = (body[i:i + 65536] for i in range(0, len(body), 65536))
+            return [Application.from_dict(application) for application in ApplicationStream(chunks)]
+
+        results['parse_%d' % size] = measure(parse, repeat)
+        results['parse_stream_%d' % size] = measure(parse_stream, repeat)
+        results['fetch_apps_%d' % size] = measure(lambda: client._get_from_any_instance('apps'), repeat)
+        results['registry_full_fetch_%d' % size] = measure(client.registry.fetch_full, repeat)
+        results['registry_delta_fetch_%d' % size] = measure(client.registry.fetch_delta, repeat)
+
+        lookups = 1000
+        app_id = 'APP-%d' % (size // 200)
+        instance_id = next(iter(loads(stub.handle('GET', ['apps', app_id], {}, b'')[1])
+                                ['application']['instance']))['instanceId']
+        results['lookup_up_instances_%d' % size] = per_lookup(
+            measure(lambda: [client.get_up_instances(app_id) for _ in range(lookups)], repeat), lookups)
+        results['lookup_app_%d' % size] = per_lookup(
+            measure(lambda: [client.get_app(app_id) for _ in range(lookups)], repeat), lookups)
+        results['lookup_instance_%d' % size] = per_lookup(
+            measure(lambda: [client.get_instance(instance_id) for _ in range(lookups)], repeat), lookups)
+
+
+def per_lookup(result, lookups):
+    for key in ('mean_ms', 'p50_ms', 'p99_ms', 'min_ms'):
+        result[key] /= lookups
+    return result
+
+
+def bench_failover(results, repeat):
+    hung = socket.socket()
+    hung.bind(('127.0.0.1', 0))
+    hung.listen(1024)
+    try:
+        with StubEureka(instances=100) as stub:
+            for name, primary in (('refused', 'http://127.0.0.1:%d/' % unused_port()),
+                                  ('hung', 'http://127.0.0.1:%d/' % hung.getsockname()[1])):
+                client = client_for([primary, stub.url])
+                # with the default read timeout, the hung primary gets half of the request deadline
+                client.request_timeout = 0.4
+
+                def cold():
+                    # a new breaker every time: the dead primary is tried first
+                    client.server_health = ServerHealth()
+                    client.get_app('APP-1')
+
+                results['failover_%s_cold' % name] = measure(cold, repeat)
+                client.server_health = ServerHealth()
+                results['failover_%s_open_breaker' % name] = measure(lambda: client.get_app('APP-1'), repeat)
+    finally:
+        hung.close()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode('utf8').strip()
+    except Exception:
+        return None
+
+
+def compare(baseline, current, threshold):
+    regressions = 0
+    print("%-34s %12s %12s %8s" % ('benchmark', 'baseline ms', 'current ms', 'change'))
+    for name, result in sorted(current['results'].items()):
+        before = baseline['results'].get(name)
+        if before is None:
+            print("%-34s %12s %12.4f" % (name, '-', result['p50_ms']))
+            continue
+        change = result['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+        flag = ''
+        if change > threshold:
+            regressions += 1
+            flag = '  REGRESSION'
+        print("%-34s %12.4f %12.4f %+7.1f%%%s" % (name, before['p50_ms'], result['p50_ms'], change * 100, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,50000', help='registry sizes, comma separated')
+    parser.add_argument('--repeat', type=int, default=20, help='runs of every benchmark')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown reported as a regression')
+    args = parser.parse_args()
+
+    results = {}
+    bench_operations(results, args.repeat * 10)
+    for size in [int(size) for size in args.sizes.split(',')]:
+        bench_registry(results, size, max(args.repeat // max(size // 10000, 1), 3))
+    bench_failover(results, args.repeat)
+
+    current = {'commit': git_commit(), 'python': platform.python_version(),
+               'platform': platform.platform(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+    for name, result in sorted(results.items()):
+        print("%-34s p50 %10.4f ms  p99 %10.4f ms" % (name, result['p50_ms'], result['p99_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+    Startup cost of host discovery: in process HostInfo vs the former
+    ifconfig | grep | awk pipelines.
+
+    python -m benchmarks.bench_hostinfo
+"""
+
+import subprocess
+import timeit
+
+from flask_eureka import hostinfo
+from flask_eureka.hostinfo import HostInfo
+
+LEGACY_COMMANDS = [
+    "ifconfig %s | grep 'inet addr' | awk '{ print $2 }'",
+    "ifconfig %s | grep inet6 | awk '{ print $3 }'",
+    "ifconfig %s | grep HWaddr | awk '{ print $5 }'",
+]
+
+
+def legacy(iface):
+    for command in LEGACY_COMMANDS:
+        subprocess.getoutput(command % iface)
+
+
+def cold():
+    hostinfo._cache.clear()
+    HostInfo().get()
+
+
+def report(name, number, seconds):
+    print("%-28s %10.1f us/call" % (name, seconds / number * 1e6))
+
+
+def main():
+    iface = hostinfo.default_interface() or 'eth0'
+    report('legacy ifconfig pipelines', 20, timeit.timeit(lambda: legacy(iface), number=20))
+    report('HostInfo cold', 1000, timeit.timeit(cold, number=1000))
+    report('HostInfo cached', 100000, timeit.timeit(lambda: HostInfo().get(), number=100000))
+
+
+if __name__ == '__main__':
+    main()
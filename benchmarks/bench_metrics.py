@@ -0,0 +1,41 @@
+"""
+    Overhead of the metrics recorded around every Eureka call.
+
+    python -m benchmarks.bench_metrics [calls]
+"""
+
+import sys
+import time
+
+from flask_eureka.metrics import Metrics
+
+
+def per_call(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    metrics = Metrics()
+    labels = (('method', 'PUT'), ('host', 'eureka-1:8761'))
+
+    def noop():
+        pass
+
+    baseline = per_call(noop, calls)
+    results = [
+        ('observe', per_call(lambda: metrics.observe('duration_seconds', labels, 0.012), calls)),
+        ('inc', per_call(lambda: metrics.inc('requests_total', labels), calls)),
+        ('record', per_call(lambda: metrics.record('renew', 'http://eureka-1:8761/', 0.0, True), calls)),
+        ('timed', per_call(lambda: metrics.timed('renew', 'http://eureka-1:8761/', noop), calls)),
+    ]
+    print("%d calls, lambda overhead %.0f ns" % (calls, baseline))
+    for name, ns in results:
+        print("%-10s %8.0f ns/call" % (name, ns - baseline))
+
+
+if __name__ == '__main__':
+    main()
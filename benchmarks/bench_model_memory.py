@@ -0,0 +1,77 @@
+"""
+    Memory held by the registry as decoded dicts vs slotted model objects.
+
+    python -m benchmarks.bench_model_memory [instances]
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+
+from flask_eureka.model import Application
+
+APPS = 200
+
+
+def registry(instances):
+    per_app = max(instances // APPS, 1)
+    return json.dumps({'applications': {'application': [{
+        'name': 'APP-%d' % a,
+        'instance': [{
+            'instanceId': 'host-%d-%d:app-%d:8080' % (a, i, a),
+            'app': 'APP-%d' % a,
+            'hostName': 'host-%d-%d' % (a, i),
+            'ipAddr': '10.%d.%d.%d' % (a % 250, i // 250, i % 250),
+            'status': 'UP',
+            'overriddenstatus': 'UNKNOWN',
+            'port': {'$': 8080, '@enabled': 'true'},
+            'securePort': {'$': 443, '@enabled': 'false'},
+            'countryId': 1,
+            'dataCenterInfo': {'@class': 'com.netflix.appinfo.InstanceInfo$DefaultDataCenterInfo',
+                               'name': 'MyOwn'},
+            'leaseInfo': {'renewalIntervalInSecs': 30, 'durationInSecs': 90},
+            'metadata': {'management.port': '8081', 'version': '2'},
+            'homePageUrl': 'http://host-%d-%d:8080/' % (a, i),
+            'statusPageUrl': 'http://host-%d-%d:8080/info' % (a, i),
+            'healthCheckUrl': 'http://host-%d-%d:8080/health' % (a, i),
+            'vipAddress': 'app-%d' % a,
+            'secureVipAddress': 'app-%d' % a,
+            'isCoordinatingDiscoveryServer': 'false',
+            'lastUpdatedTimestamp': '1500000000000',
+            'lastDirtyTimestamp': '1500000000000',
+            'actionType': 'ADDED',
+        } for i in range(per_app)],
+    } for a in range(APPS)]}})
+
+
+def measure(build, body):
+    gc.collect()
+    tracemalloc.start()
+    held = build(body)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def as_dicts(body):
+    return json.loads(body)
+
+
+def as_models(body):
+    return [Application.from_dict(application) for application in json.loads(body)['applications']['application']]
+
+
+def main():
+    instances = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    body = registry(instances)
+    dicts = measure(as_dicts, body)
+    models = measure(as_models, body)
+    print("%d instances" % instances)
+    print("%-10s %8.1f MB %6d bytes/instance" % ('dicts', dicts / 2 ** 20, dicts // instances))
+    print("%-10s %8.1f MB %6d bytes/instance" % ('models', models / 2 ** 20, models // instances))
+
+
+if __name__ == '__main__':
+    main()
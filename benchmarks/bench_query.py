@@ -0,0 +1,75 @@
+"""
+    Registry lookups by VIP, zone, status and metadata: scanning every
+    instance vs the registry indexes.
+
+    python -m benchmarks.bench_query [instances]
+"""
+
+import sys
+import time
+
+from flask_eureka.model import InstanceInfo
+from flask_eureka.registry import RegistryCache
+from flask_eureka.stubserver import generate_instance
+
+APPS = 500
+
+
+def registry(instances):
+    applications = {}
+    for index in range(instances):
+        app = 'APP-%d' % (index % APPS)
+        applications.setdefault(app, []).append(
+            generate_instance(app, index // APPS, 'UP' if index % 10 else 'DOWN'))
+    response = {'applications': {'versions__delta': '1', 'application': [
+        {'name': name, 'instance': instances} for name, instances in applications.items()]}}
+    cache = RegistryCache(lambda endpoint: response, index_metadata=['version'])
+    cache.fetch_full()
+    return cache
+
+
+def scan(cache, vip, zone, status, version):
+    return [instance for application in cache._applications() for instance in application.instances.values()
+            if vip in (instance.vip_address or '').split(',') and instance.zone == zone
+            and instance.status == status and (instance.metadata or {}).get('version') == version]
+
+
+def per_call(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    instances = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    cache = registry(instances)
+    criteria = ('app-7', 'us-east-1b', 'UP', '2')
+
+    started = time.perf_counter()
+    cache._indexed()
+    build = (time.perf_counter() - started) * 1e3
+    scanned = scan(cache, *criteria)
+    indexed = cache.query(vip_address=criteria[0], zone=criteria[1], status=criteria[2],
+                          metadata={'version': criteria[3]})
+    assert sorted(i.instance_id for i in scanned) == sorted(i.instance_id for i in indexed)
+
+    # a delta toggling the status of one instance back and forth
+    changed = InstanceInfo.from_dict(dict(generate_instance('APP-7', 1), status='DOWN', actionType='MODIFIED'))
+    restored = InstanceInfo.from_dict(dict(generate_instance('APP-7', 1), actionType='MODIFIED'))
+
+    def delta():
+        with cache._lock:
+            cache._apply('APP-7', changed)
+            cache._apply('APP-7', restored)
+
+    print("%d instances, %d matches, index built in %.1f ms" % (instances, len(indexed), build))
+    print("%-16s %10.1f us/query" % ('scan', per_call(lambda: scan(cache, *criteria), 20)))
+    print("%-16s %10.1f us/query" % ('index', per_call(lambda: cache.query(
+        vip_address=criteria[0], zone=criteria[1], status=criteria[2], metadata={'version': criteria[3]}), 2000)))
+    print("%-16s %10.1f us/query" % ('index by vip', per_call(lambda: cache.query(vip_address=criteria[0]), 2000)))
+    print("%-16s %10.1f us/update" % ('delta', per_call(delta, 2000) / 2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+    Eureka server discovery through DNS TXT records
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dns.resolver
+
+logger = logging.getLogger('service.eureka')
+
+_resolve = getattr(dns.resolver, 'resolve', None) or dns.resolver.query
+
+
+class DnsZoneDiscovery(object):
+    """
+    Resolves the ``txt.<region>.<domain>`` record listing the zone records,
+    then every zone record in parallel. Results are cached for the smallest
+    TTL seen, and an optional background thread re-resolves them when they
+    expire and reports changes.
+    """
+
+    def __init__(self, region, domain_name, max_workers=8, min_ttl=30, max_ttl=300):
+        self.region = region
+        self.domain_name = domain_name
+        self.max_workers = max_workers
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self._lock = threading.Lock()
+        self._zones = None
+        self._expires = 0
+        self._stop = threading.Event()
+        self.refresh_task = None
+
+    def _get_txt_records(self, domain):
+        answer = _resolve(domain, 'TXT')
+        strings = []
+        for record in answer:
+            for string in record.strings:
+                strings.append(string.decode('utf8') if isinstance(string, bytes) else string)
+        return strings, answer.rrset.ttl
+
+    def resolve(self):
+        """
+        Resolve the zone records, ignoring the cache
+
+        :return: tuple of ({zone: [eureka host, ...]}, ttl)
+        """
+        zone_urls, ttl = self._get_txt_records('txt.%s.%s' % (self.region, self.domain_name))
+        zones = {}
+        if zone_urls:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(zone_urls))) as executor:
+                answers = executor.map(lambda zone_url: self._get_txt_records('txt.%s' % zone_url), zone_urls)
+                for zone_url, (hosts, zone_ttl) in zip(zone_urls, answers):
+                    zones[zone_url.split(".")[0]] = hosts
+                    ttl = min(ttl, zone_ttl)
+        return zones, min(max(ttl, self.min_ttl), self.max_ttl)
+
+    def get_zones(self):
+        """
+        Zone map, resolved again once the records TTL expired
+        """
+        with self._lock:
+            if self._zones is None or time.time() >= self._expires:
+                zones, ttl = self.resolve()
+                self._zones = zones
+                self._expires = time.time() + ttl
+            return dict((zone, list(hosts)) for zone, hosts in self._zones.items())
+
+    def start(self, on_change):
+        """
+        Re-resolve the records on a background thread when they expire and
+        call ``on_change(zones)`` when they differ from the previous ones
+        """
+        if self.refresh_task is not None:
+            return
+        self._stop.clear()
+        self.refresh_task = threading.Thread(target=self._refresh_loop, args=(on_change,))
+        self.refresh_task.daemon = True
+        self.refresh_task.start()
+
+    def stop(self):
+        self._stop.set()
+        self.refresh_task = None
+
+    def _refresh_loop(self, on_change):
+        while not self._stop.wait(max(self._expires - time.time(), 1)):
+            try:
+                previous = self._zones
+                zones = self.get_zones()
+                if previous is not None and zones != previous:
+                    logger.info("Eureka zone records changed: %s" % zones)
+                    on_change(zones)
+            except Exception as ex:
+                logger.debug("Exception during DNS refresh: %s" % str(ex))
@@ -1,27 +1,49 @@
+import threading
 import time
-import urllib
 import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
 
 METAOPTS = ['ami-id', 'ami-launch-index', 'ami-manifest-path',
             'ancestor-ami-id', 'availability-zone', 'block-device-mapping',
-            'instance-id', 'instance-type', 'local-hostname', 'local-ipv4',
+            'hostname', 'instance-id', 'instance-type', 'local-hostname', 'local-ipv4',
             'kernel-id', 'product-codes', 'public-hostname', 'public-ipv4',
             'public-keys', 'ramdisk-id', 'reservation-id', 'security-groups',
             'user-data']
 
+TOKEN_HEADER = 'X-aws-ec2-metadata-token'
+TOKEN_TTL_HEADER = 'X-aws-ec2-metadata-token-ttl-seconds'
+
 
 class Error(Exception):
     pass
 
 
 class EC2Metadata:
-    """Class for querying metadata from EC2"""
+    """Class for querying metadata from EC2
+
+    Connectivity is probed once per instance, values are cached for ``ttl``
+    seconds and IMDSv2 session tokens are used when the metadata service
+    hands them out (falling back to IMDSv1 otherwise).
+    """
 
-    def __init__(self, addr='169.254.169.254', api='latest'):
+    def __init__(self, addr='169.254.169.254', api='latest', ttl=300, timeout=1.0,
+                 token_ttl=21600, max_workers=8):
         self.addr = addr
         self.api = api
-
-        if not self._test_connectivity(self.addr, 80):
+        self.ttl = ttl
+        self.token_ttl = token_ttl
+        self.max_workers = max_workers
+        self.timeout = urllib3.Timeout(connect=timeout, read=timeout)
+        self.pool_manager = urllib3.PoolManager(maxsize=max_workers)
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._token = None
+        self._token_expires = 0
+
+        host, _, port = self.addr.partition(':')
+        if not self._test_connectivity(host, int(port or 80)):
             raise Error("could not establish connection to: %s" % self.addr)
 
     @staticmethod
@@ -33,24 +55,47 @@ class EC2Metadata:
                 s.close()
                 return True
             except:
+                s.close()
                 time.sleep(1)
 
         return False
 
-    def _get(self, uri):
+    def _request(self, method, uri, headers=None):
         url = 'http://%s/%s/%s' % (self.addr, self.api, uri)
-        value = urllib.urlopen(url).read()
-        if "404 - Not Found" in value:
+        return self.pool_manager.request(method, url, headers=headers, timeout=self.timeout, retries=False)
+
+    def _get_token(self, refresh=False):
+        with self._lock:
+            if self.token_ttl and (refresh or time.time() >= self._token_expires):
+                try:
+                    r = self._request('PUT', 'api/token', headers={TOKEN_TTL_HEADER: str(self.token_ttl)})
+                except urllib3.exceptions.HTTPError:
+                    r = None
+                if r is not None and r.status == 200:
+                    self._token = r.data.decode('utf8')
+                    # renew a little before the service expires it
+                    self._token_expires = time.time() + self.token_ttl * 0.9
+                else:
+                    # IMDSv1 only service, do not ask again before the next ttl
+                    self._token = None
+                    self._token_expires = time.time() + self.ttl
+            return self._token
+
+    def _get(self, uri):
+        token = self._get_token()
+        r = self._request('GET', uri, headers={TOKEN_HEADER: token} if token else None)
+        if r.status == 401 and token:
+            token = self._get_token(refresh=True)
+            r = self._request('GET', uri, headers={TOKEN_HEADER: token} if token else None)
+        value = r.data.decode('utf8')
+        if r.status == 404 or "404 - Not Found" in value:
             return None
+        if r.status != 200:
+            raise Error("metadata request for %s failed with status %s" % (uri, r.status))
 
         return value
 
-    def get(self, metaopt):
-        """return value of metaopt"""
-
-        if metaopt not in METAOPTS:
-            raise Error('unknown metaopt', metaopt, METAOPTS)
-
+    def _fetch(self, metaopt):
         if metaopt == 'availability-zone':
             return self._get('meta-data/placement/availability-zone')
 
@@ -72,20 +117,79 @@ class EC2Metadata:
 
         return self._get('meta-data/' + metaopt)
 
+    def get(self, metaopt):
+        """return value of metaopt"""
+
+        if metaopt not in METAOPTS:
+            raise Error('unknown metaopt', metaopt, METAOPTS)
+
+        cached = self._cache.get(metaopt)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+
+        value = self._fetch(metaopt)
+        self._cache[metaopt] = (value, time.time() + self.ttl)
+        return value
+
+    def get_many(self, metaopts):
+        """return a dict of metaopt -> value, fetching the uncached ones concurrently"""
+
+        for metaopt in metaopts:
+            if metaopt not in METAOPTS:
+                raise Error('unknown metaopt', metaopt, METAOPTS)
+
+        now = time.time()
+        missing = [metaopt for metaopt in metaopts
+                   if metaopt not in self._cache or self._cache[metaopt][1] <= now]
+        if len(missing) > 1:
+            # fetch the token once instead of racing for it in every worker
+            self._get_token()
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                list(executor.map(self.get, missing))
+
+        return dict((metaopt, self.get(metaopt)) for metaopt in metaopts)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """primitive: return the metadata provider shared by the process"""
+
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = EC2Metadata()
+        return _provider
+
+
+def set_provider(provider):
+    """primitive: replace the shared metadata provider (None resets it)"""
+
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
 
 def get_metadata(metaopt):
     """primitive: return value of metaopt"""
 
-    m = EC2Metadata()
-    return m.get(metaopt)
+    return get_provider().get(metaopt)
+
+
+def get_metadata_batch(metaopts):
+    """primitive: return a dict of metaopt -> value"""
+
+    return get_provider().get_many(metaopts)
 
 
 def display(metaopts, prefix=False):
     """primitive: display metaopts (list) values with optional prefix"""
 
-    m = EC2Metadata()
+    values = get_metadata_batch(metaopts)
     for metaopt in metaopts:
-        value = m.get(metaopt)
+        value = values[metaopt]
         if not value:
             value = "unavailable"
 
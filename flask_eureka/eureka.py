@@ -1,6 +1,18 @@
-from flask import Blueprint
+import logging
+import os
+import signal
+import threading
+import time
 
-from .eurekaclient import EurekaClient
+from flask import Blueprint, current_app, g, has_request_context, jsonify
+
+from .eurekaclient import EurekaClient, EurekaNoInstanceAvailableException
+from .health import HealthMonitor
+from .loadbalancer import ZoneAffinity, get_load_balancer
+from .metrics import get_default_metrics
+from .session import ServiceSession
+
+logger = logging.getLogger('service.eureka')
 
 eureka_bp = Blueprint('eureka', __name__)
 
@@ -8,12 +20,35 @@ eureka_bp = Blueprint('eureka', __name__)
 @eureka_bp.route('/healthcheck')
 def healthcheck():
     """
-    Return 200 as default
+    Return the cached aggregated status of the health indicators, 200 when UP
+    and 503 otherwise. The indicators run in the background, never here.
+    """
+    eureka = current_app.extensions.get('eureka')
+    if eureka is None:
+        return '', 200
+    health = eureka.health.as_dict()
+    return jsonify(health), 200 if health['status'] == 'UP' else 503
+
+
+@eureka_bp.route('/metrics')
+def metrics():
+    """
+    Latency and error metrics of the Eureka calls in the Prometheus text format
     """
-    return '', 200
+    eureka = current_app.extensions.get('eureka')
+    client = eureka.client if eureka is not None else None
+    registry = client.metrics if client is not None else get_default_metrics()
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 
 class Eureka(object):
+    EUREKA_LOAD_BALANCER = 'EUREKA_LOAD_BALANCER'
+    EUREKA_HEALTH_CHECK_INTERVAL = 'EUREKA_HEALTH_CHECK_INTERVAL'
+    EUREKA_HEALTH_CHECK_TIMEOUT = 'EUREKA_HEALTH_CHECK_TIMEOUT'
+    EUREKA_REGISTER_IN_BACKGROUND = 'EUREKA_REGISTER_IN_BACKGROUND'
+    EUREKA_ZONE_AFFINITY = 'EUREKA_ZONE_AFFINITY'
+    EUREKA_ZONE_AFFINITY_THRESHOLD = 'EUREKA_ZONE_AFFINITY_THRESHOLD'
+
     def __init__(self, app=None, **kwargs):
         """
         Initialize the flask extension
@@ -21,6 +56,14 @@ class Eureka(object):
 
         self.kwargs = kwargs if kwargs else {}
         self.app = None
+        self.client = None
+        self.load_balancer = None
+        self.zone_affinity = None
+        self.health = HealthMonitor()
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self.in_flight = 0
+        self._in_flight_condition = threading.Condition()
 
         if app is not None:
             self.init_app(app)
@@ -33,13 +76,35 @@ class Eureka(object):
         if 'eureka' in app.extensions:
             raise RuntimeError('Flask application already initialized')
         app.extensions['eureka'] = self
+        self.load_balancer = get_load_balancer(app.config.get(Eureka.EUREKA_LOAD_BALANCER, 'round_robin'))
+        self.health.interval = int(app.config.get(Eureka.EUREKA_HEALTH_CHECK_INTERVAL, 30))
+        self.health.timeout = float(app.config.get(Eureka.EUREKA_HEALTH_CHECK_TIMEOUT, 10))
+        app.before_request(self._request_started)
+        app.teardown_request(self._request_finished)
+
+    def _request_started(self):
+        with self._in_flight_condition:
+            self.in_flight += 1
+        g._eureka_in_flight = True
+
+    def _request_finished(self, exception=None):
+        if g.pop('_eureka_in_flight', False):
+            with self._in_flight_condition:
+                self.in_flight -= 1
+                self._in_flight_condition.notify_all()
 
-    def register_service(self, name=None, **kwargs):
+    def register_service(self, name=None, background=None, **kwargs):
         """
         Register service with eureka service
 
         :param name: name of the eureka application
+        :param background: return at once and register from the scheduler,
+                           retrying until Eureka is reachable. Defaults to the
+                           EUREKA_REGISTER_IN_BACKGROUND setting.
         """
+        if background is None:
+            background = str(self.app.config.get(Eureka.EUREKA_REGISTER_IN_BACKGROUND, False)).lower() in (
+                '1', 'true', 'yes')
         name = self.app.config.get('SERVICE_NAME', name)
         eureka_url = self.app.config.get(EurekaClient.EUREKA_SERVICE_URL, None)
         data_center = self.app.config.get(EurekaClient.EUREKA_INSTANCE_DATACENTER, None)
@@ -47,6 +112,7 @@ class Eureka(object):
         heartbeat_interval = self.app.config.get(EurekaClient.EUREKA_HEARTBEAT_INTERVAL, None)
         service_path = self.app.config.get(EurekaClient.EUREKA_SERVICE_PATH, None)
         port = self.app.config.get(EurekaClient.EUREKA_INSTANCE_PORT, self._get_service_port())
+        zone = self.app.config.get(EurekaClient.EUREKA_INSTANCE_ZONE, None)
 
         eureka_client = EurekaClient(name=name, host_name=host_name,
                                      eureka_url=eureka_url,
@@ -54,8 +120,175 @@ class Eureka(object):
                                      heartbeat_interval=heartbeat_interval,
                                      service_path=service_path,
                                      port=port,
+                                     zone=zone,
                                      **kwargs)
-        eureka_client.star()
+        self.client = eureka_client
+        self.zone_affinity = self._get_zone_affinity(eureka_client)
+        eureka_client.star(background=background)
+        self.health.on_change = self._on_health_change
+        self.health.start(eureka_client.scheduler)
+
+    def _get_zone_affinity(self, client):
+        """
+        Zone affinity filter for our own availability zone, None when it is
+        disabled or our zone is unknown
+        """
+        if str(self.app.config.get(Eureka.EUREKA_ZONE_AFFINITY, True)).lower() not in ('1', 'true', 'yes'):
+            return None
+        try:
+            zone = client.get_instance_zone()
+        except NotImplementedError:
+            return None
+        except Exception as ex:
+            logger.warning("Cannot get the availability zone, zone affinity disabled: %s" % str(ex))
+            return None
+        if not zone:
+            return None
+        return ZoneAffinity(zone, float(self.app.config.get(Eureka.EUREKA_ZONE_AFFINITY_THRESHOLD, 0.5)))
+
+    def shutdown(self, timeout=30):
+        """
+        Leave the Eureka registry gracefully: mark the instance OUT_OF_SERVICE,
+        deregister it so that peers stop calling it, wait up to ``timeout``
+        seconds for the requests in flight to complete, then stop the
+        heartbeats and the background refreshes.
+
+        :return: True if every request in flight completed in time
+        """
+        client = self.client
+        if client is not None:
+            try:
+                client.set_status('OUT_OF_SERVICE', immediate=True)
+            except Exception as ex:
+                logger.warning("Could not set status OUT_OF_SERVICE: %s" % str(ex))
+            try:
+                client.deregister()
+            except Exception as ex:
+                logger.warning("Could not deregister from eureka: %s" % str(ex))
+        drained = self.drain(timeout)
+        if not drained:
+            logger.warning("%d requests still in flight after %s seconds" % (self.in_flight, timeout))
+        self.health.stop()
+        if client is not None:
+            client.stop()
+        return drained
+
+    def drain(self, timeout=None):
+        """
+        Wait until no request is in flight, not counting the calling request
+
+        :return: False if the timeout expired first
+        """
+        own = 1 if has_request_context() and g.get('_eureka_in_flight') else 0
+        deadline = None if timeout is None else time.time() + timeout
+        with self._in_flight_condition:
+            while self.in_flight > own:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._in_flight_condition.wait(remaining)
+        return True
+
+    def shutdown_on_signal(self, signals=(signal.SIGTERM,), timeout=30):
+        """
+        Run :meth:`shutdown` when one of ``signals`` is received, then the
+        handler that was installed before (the server's own, if any). Must be
+        called from the main thread.
+        """
+        for signum in signals:
+            previous = signal.getsignal(signum)
+
+            def handler(signum, frame, previous=previous):
+                self.shutdown(timeout)
+                if callable(previous):
+                    previous(signum, frame)
+                elif previous == signal.SIG_DFL:
+                    signal.signal(signum, signal.SIG_DFL)
+                    os.kill(os.getpid(), signum)
+
+            signal.signal(signum, handler)
+
+    def wait_ready(self, timeout=None):
+        """
+        Block until the service is registered with Eureka, for applications
+        registering in the background that want to wait for it
+
+        :return: True if registered, False if the timeout expired first
+        """
+        if self.client is None:
+            raise RuntimeError('register_service was not called')
+        return self.client.wait_until_registered(timeout)
+
+    def health_indicator(self, name, check=None, interval=None, timeout=None):
+        """
+        Add a health indicator, run in the background every ``interval``
+        seconds. Can be used as a decorator. ``check`` returns True (UP),
+        False (DOWN) or a status string, an exception or no result within
+        ``timeout`` seconds counts as DOWN. The worst status is served by the
+        healthcheck endpoint and pushed to Eureka when it changes.
+
+        :param name: name of the indicator in the health details
+        """
+        if check is None:
+            def decorator(fn):
+                self.health.add(name, fn, interval, timeout)
+                return fn
+            return decorator
+        return self.health.add(name, check, interval, timeout)
+
+    def _on_health_change(self, status):
+        if self.client is not None:
+            self.client.set_status(status)
+
+    def choose(self, app_id=None, vip_address=None):
+        """
+        Choose an UP instance of an application (or of a VIP address) with the
+        configured load balancer. Callers using *power_of_two_choices* must
+        call :meth:`release` once the request to the instance completes.
+
+        :param app_id: eureka application id
+        :param vip_address: vip address, used when no app_id is given
+        """
+        key = app_id if app_id is not None else vip_address
+        instances = self.up_instances(app_id, vip_address)
+        if not instances:
+            raise EurekaNoInstanceAvailableException("No UP instance available for %s" % key)
+        return self.load_balancer.choose(key, instances)
+
+    def up_instances(self, app_id=None, vip_address=None):
+        """
+        UP instances of an application (or of a VIP address) to choose from:
+        those of our own availability zone while enough of them are UP when
+        zone affinity is enabled, all of them otherwise
+        """
+        zone_affinity = self.zone_affinity
+        if app_id is not None:
+            if zone_affinity is None:
+                return self.client.get_up_instances(app_id)
+            return zone_affinity.filter(app_id, self.client.get_instances(app_id))
+        if zone_affinity is None:
+            return self.client.get_up_vip_instances(vip_address)
+        return zone_affinity.filter(('vip', vip_address), self.client.get_vip_instances(vip_address))
+
+    def release(self, instance):
+        """
+        Signal the load balancer that the call to a chosen instance completed
+        """
+        self.load_balancer.release(instance)
+
+    def session(self, app_id, **kwargs):
+        """
+        Session calling the instances of an application, shared by the
+        callers of the same application so connections are reused.
+        ``kwargs`` are passed to :class:`ServiceSession` when it is created.
+
+        :param app_id: eureka application id
+        """
+        with self._sessions_lock:
+            session = self._sessions.get(app_id)
+            if session is None:
+                session = self._sessions[app_id] = ServiceSession(self, app_id, **kwargs)
+            return session
 
     def _get_service_port(self):
         """
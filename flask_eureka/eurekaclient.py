@@ -6,19 +6,25 @@ import json
 import logging
 import os
 import random
+import threading
 import time
-from threading import Thread
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 
 try:
     from urllib.parse import urljoin
 except ImportError:
     from urlparse import urljoin
 
-import dns.resolver
-
-from .ec2metadata import get_metadata
-from .httpclient import HttpClientObject, ApiException
+from .httpclient import HttpClientObject, ApiException, Deadline
 from .hostinfo import HostInfo
+from .jsonstream import ApplicationStream, loads
+from .metrics import get_default_metrics
+from .model import Application, as_list
+from .registry import RegistryCache
+from .scheduler import get_default_scheduler
+from .serverhealth import ServerHealth
 
 logger = logging.getLogger('service.eureka')
 
@@ -38,10 +44,18 @@ class EurekaHeartbeatFailedException(EurekaClientException):
     pass
 
 
+class EurekaDeregistrationFailedException(EurekaClientException):
+    pass
+
+
 class EurekaGetFailedException(EurekaClientException):
     pass
 
 
+class EurekaNoInstanceAvailableException(EurekaClientException):
+    pass
+
+
 class EurekaClient(object):
     """
         Eureka Client
@@ -53,6 +67,12 @@ class EurekaClient(object):
     EUREKA_INSTANCE_HOSTNAME = 'EUREKA_INSTANCE_HOSTNAME'
     EUREKA_INSTANCE_PORT = 'EUREKA_INSTANCE_PORT'
     EUREKA_INSTANCE_SECURE_PORT = 'EUREKA_INSTANCE_SECURE_PORT'
+    EUREKA_REGISTRY_FETCH_INTERVAL = 'EUREKA_REGISTRY_FETCH_INTERVAL'
+    EUREKA_REQUEST_TIMEOUT = 'EUREKA_REQUEST_TIMEOUT'
+    EUREKA_SHARED_REGISTRY_PATH = 'EUREKA_SHARED_REGISTRY_PATH'
+    EUREKA_REGISTRY_SNAPSHOT_PATH = 'EUREKA_REGISTRY_SNAPSHOT_PATH'
+    EUREKA_REGISTRY_INDEX_METADATA = 'EUREKA_REGISTRY_INDEX_METADATA'
+    EUREKA_INSTANCE_ZONE = 'EUREKA_INSTANCE_ZONE'
 
     def __init__(self,
                  name,
@@ -73,7 +93,26 @@ class EurekaClient(object):
                  https_enabled=False,
                  heartbeat_interval=None,
                  service_path=None,
-                 pool_manager=None):
+                 pool_manager=None,
+                 fetch_registry=False,
+                 registry_fetch_interval=None,
+                 fan_out=False,
+                 fan_out_workers=None,
+                 fan_out_timeout=None,
+                 scheduler=None,
+                 heartbeat_jitter=0.1,
+                 metadata=None,
+                 status_update_delay=0.5,
+                 request_timeout=None,
+                 pool_maxsize=None,
+                 prewarm=False,
+                 shared_registry_path=None,
+                 registry_snapshot_path=None,
+                 registry_index_metadata=None,
+                 metrics=None,
+                 registration_backoff=1.0,
+                 registration_max_backoff=60.0,
+                 zone=None):
 
         self.app_name = name
 
@@ -87,15 +126,40 @@ class EurekaClient(object):
         self.use_dns = use_dns
         self.region = region
         self.prefer_same_zone = prefer_same_zone
+        self.zone = zone or os.environ.get(EurekaClient.EUREKA_INSTANCE_ZONE, None)
         self.eureka_domain_name = eureka_domain_name
         self.eureka_port = eureka_port
         self.heartbeat_task = None
+        self.registered = threading.Event()
+        self.deregistered = False
+        self.registration_backoff = registration_backoff
+        self.registration_max_backoff = registration_max_backoff
+        self._registration_task = None
+        self._registration_lock = threading.RLock()
+        self._stopped = False
         self.instance_id = instance_id
         self.app_protocol = 'https://' if https_enabled else 'http://'
+        self.fan_out = fan_out
+        self.fan_out_workers = fan_out_workers
+        self.fan_out_timeout = fan_out_timeout
+        self._fan_out_pool = None
+        self._fan_out_lock = threading.Lock()
+        self.scheduler = scheduler or get_default_scheduler()
+        self.heartbeat_jitter = heartbeat_jitter
+        self.status = 'UP'
+        self.metadata = dict(metadata or {})
+        self.status_update_delay = status_update_delay
+        self._payload = None
+        self._pending_status = None
+        self._pending_metadata = {}
+        self._update_task = None
+        self._update_lock = threading.Lock()
+        self._update_backoff = registration_backoff
 
         host_info = HostInfo().get()
 
         if data_center == "Amazon":
+            from .ec2metadata import get_metadata
             self.host_name = get_metadata("hostname")
         elif not host_name:
             self.host_name = host_info['host']
@@ -110,25 +174,62 @@ class EurekaClient(object):
 
         # Relative URL to eureka
         self.context = context
-        self.eureka_urls = self.get_eureka_urls()
-        self.requests = HttpClientObject(pool_manager=pool_manager)
+        self.dns_discovery = None
+        self._eureka_urls = None
+        self.request_timeout = request_timeout or float(os.environ.get(EurekaClient.EUREKA_REQUEST_TIMEOUT, 10))
+        self.prewarm = prewarm
+        self.metrics = metrics or get_default_metrics()
+        self.requests = HttpClientObject(pool_manager=pool_manager, pool_maxsize=pool_maxsize, metrics=self.metrics)
+        self.server_health = ServerHealth()
+        self._validators = {}
+
+        self.registry = None
+        if fetch_registry:
+            self.registry = RegistryCache(
+                self._get_from_any_instance,
+                stream=lambda endpoint: self._get_from_any_instance(endpoint, stream=True),
+                refresh_interval=registry_fetch_interval or int(
+                    os.environ.get(EurekaClient.EUREKA_REGISTRY_FETCH_INTERVAL, 30)),
+                snapshot_path=shared_registry_path or os.environ.get(EurekaClient.EUREKA_SHARED_REGISTRY_PATH, None),
+                persist_path=registry_snapshot_path or os.environ.get(EurekaClient.EUREKA_REGISTRY_SNAPSHOT_PATH, None),
+                index_metadata=registry_index_metadata or [
+                    key for key in os.environ.get(EurekaClient.EUREKA_REGISTRY_INDEX_METADATA, '').split(',') if key])
+            self._register_registry_gauges()
+
+    def _register_registry_gauges(self):
+        """
+        Registry size gauges labelled by client. They only hold the registry
+        weakly, so the gauges of a discarded client disappear with it.
+        """
+        registry = weakref.ref(self.registry)
+        labels = (('app', self.app_name), ('instance', self.get_instance_id()))
+
+        def size(index):
+            cache = registry()
+            return cache.size()[index] if cache is not None else None
+        self.metrics.gauge_function('eureka_registry_applications', lambda: size(0), labels)
+        self.metrics.gauge_function('eureka_registry_instances', lambda: size(1), labels)
 
-    def _get_txt_records_from_dns(self, domain):
-        records = dns.resolver.query(domain, 'TXT')
-        for record in records:
-            for string in record.strings:
-                yield string
+    @property
+    def eureka_urls(self):
+        """
+        Urls of the eureka servers, looked up on first use so that building a
+        client never waits for DNS
+        """
+        if self._eureka_urls is None:
+            self._eureka_urls = self.get_eureka_urls()
+        return self._eureka_urls
 
-    def _get_zone_urls_from_dns(self, domain):
-        for zone in self._get_txt_records_from_dns(domain):
-            yield zone
+    @eureka_urls.setter
+    def eureka_urls(self, eureka_urls):
+        self._eureka_urls = eureka_urls
 
     def get_zones_from_dns(self):
-        return {
-            zone_url.split(".")[0]:
-                list(self._get_zone_urls_from_dns("txt.%s" % zone_url))
-            for zone_url in list(self._get_zone_urls_from_dns('txt.%s.%s' % (self.region, self.eureka_domain_name)))
-        }
+        if self.dns_discovery is None:
+            # dnspython is only imported by clients discovering eureka through DNS
+            from .dnsdiscovery import DnsZoneDiscovery
+            self.dns_discovery = DnsZoneDiscovery(self.region, self.eureka_domain_name)
+        return self.dns_discovery.get_zones()
 
     def get_eureka_urls(self):
         """
@@ -137,40 +238,56 @@ class EurekaClient(object):
         if self.eureka_url:
             return [self.eureka_url]
         elif self.use_dns:
-            zone_dns_map = self.get_zones_from_dns()
-            zones = zone_dns_map.keys()
-            assert len(zones) > 0, "No availability zones found for, please add them explicitly"
-            if self.prefer_same_zone:
-                if self.get_instance_zone() in zones:
-                    zones = [zones.pop(
-                        zones.index(self.get_instance_zone()))] + zones  # Add our zone as the first element
-                else:
-                    logger.warn("No match for the zone %s in the list of available zones %s" % (
-                        self.get_instance_zone(), zones)
-                                )
-            service_urls = []
-            for zone in zones:
-                eureka_instances = zone_dns_map[zone]
-                random.shuffle(eureka_instances)  # Shuffle order for load balancing
-                for eureka_instance in eureka_instances:
-                    server_uri = "http://%s" % eureka_instance
-                    if self.eureka_port:
-                        server_uri += ":%s" % self.eureka_port
-                    eureka_instance_url = urljoin(server_uri, self.context, "/")
-                    if not eureka_instance_url.endswith("/"):
-                        eureka_instance_url = "%s/" % eureka_instance_url
-                    service_urls.append(eureka_instance_url)
-            primary_server = service_urls.pop(0)
-            random.shuffle(service_urls)
-            service_urls.insert(0, primary_server)
-            logger.info("This client will talk to the following serviceUrls in order: %s" % service_urls)
-            return service_urls
+            return self._get_eureka_urls_from_zones(self.get_zones_from_dns())
+
+    def _get_eureka_urls_from_zones(self, zone_dns_map):
+        zones = list(zone_dns_map.keys())
+        assert len(zones) > 0, "No availability zones found for, please add them explicitly"
+        if self.prefer_same_zone:
+            if self.get_instance_zone() in zones:
+                zones = [zones.pop(
+                    zones.index(self.get_instance_zone()))] + zones  # Add our zone as the first element
+            else:
+                logger.warn("No match for the zone %s in the list of available zones %s" % (
+                    self.get_instance_zone(), zones)
+                            )
+        service_urls = []
+        for zone in zones:
+            eureka_instances = zone_dns_map[zone]
+            random.shuffle(eureka_instances)  # Shuffle order for load balancing
+            for eureka_instance in eureka_instances:
+                server_uri = "http://%s" % eureka_instance
+                if self.eureka_port:
+                    server_uri += ":%s" % self.eureka_port
+                eureka_instance_url = urljoin(server_uri, self.context, "/")
+                if not eureka_instance_url.endswith("/"):
+                    eureka_instance_url = "%s/" % eureka_instance_url
+                service_urls.append(eureka_instance_url)
+        primary_server = service_urls.pop(0)
+        random.shuffle(service_urls)
+        service_urls.insert(0, primary_server)
+        logger.info("This client will talk to the following serviceUrls in order: %s" % service_urls)
+        return service_urls
+
+    def _on_zones_changed(self, zone_dns_map):
+        self.eureka_urls = self._get_eureka_urls_from_zones(zone_dns_map)
+
+    def start_dns_refresh(self):
+        """
+        Follow changes of the eureka zone records, updating eureka_urls in the
+        background when they change
+        """
+        if self.dns_discovery is not None:
+            self.dns_discovery.start(self._on_zones_changed)
 
     def get_instance_zone(self):
         """
             Get Instance Zone
         """
+        if self.zone:
+            return self.zone
         if self.data_center == "Amazon":
+            from .ec2metadata import get_metadata
             return get_metadata('availability-zone')
         else:
             raise NotImplementedError("%s does not implement DNS lookups" % self.data_center)
@@ -185,25 +302,38 @@ class EurekaClient(object):
 
     def get_instance_data(self):
         """
-            Get Instance Data
+            Get Instance Data, our availability zone being published in the
+            ``zone`` metadata (Eureka keeps the data center metadata of Amazon
+            instances only) for the zone affinity of the other clients
         """
         data_center_info = {
-            'name': self.data_center
+            '@class': 'com.netflix.appinfo.InstanceInfo$DefaultDataCenterInfo',
+            'name': 'MyOwn',
         }
+        zone = self.zone
         if self.data_center == "Amazon":
+            from .ec2metadata import get_metadata_batch
+            metadata = get_metadata_batch(['ami-launch-index', 'local-hostname', 'availability-zone',
+                                           'instance-id', 'local-ipv4', 'hostname', 'ami-manifest-path',
+                                           'ami-id', 'instance-type'])
             data_center_info['metadata'] = {
-                'ami-launch-index': get_metadata('ami-launch-index'),
-                'local-hostname': get_metadata('local-hostname'),
-                'availability-zone': get_metadata('availability-zone'),
-                'instance-id': get_metadata('instance-id'),
-                'public-ipv4': get_metadata('local-ipv4'),
-                'public-hostname': get_metadata('hostname'),
-                'ami-manifest-path': get_metadata('ami-manifest-path'),
-                'local-ipv4': get_metadata('local-ipv4'),
-                'ami-id': get_metadata('ami-id'),
-                'instance-type': get_metadata('instance-type'),
+                'ami-launch-index': metadata['ami-launch-index'],
+                'local-hostname': metadata['local-hostname'],
+                'availability-zone': metadata['availability-zone'],
+                'instance-id': metadata['instance-id'],
+                'public-ipv4': metadata['local-ipv4'],
+                'public-hostname': metadata['hostname'],
+                'ami-manifest-path': metadata['ami-manifest-path'],
+                'local-ipv4': metadata['local-ipv4'],
+                'ami-id': metadata['ami-id'],
+                'instance-type': metadata['instance-type'],
             }
-        return {
+            if self.zone:
+                data_center_info['metadata']['availability-zone'] = self.zone
+            data_center_info['@class'] = 'com.netflix.appinfo.AmazonInfo'
+            data_center_info['name'] = 'Amazon'
+            zone = data_center_info['metadata']['availability-zone']
+        instance_data = {
             'instance': {
                 'app': self.app_name,
                 'instanceId': self.get_instance_id(),
@@ -221,104 +351,513 @@ class EurekaClient(object):
                     '@enabled': 'true' if self.secure_port is not None else 'false',
                 },
                 'vipAddress': self.vip_address,
-                'dataCenterInfo': {
-                    '@class': 'com.netflix.appinfo.InstanceInfo$DefaultDataCenterInfo',
-                    'name': 'MyOwn',
-                },
+                'dataCenterInfo': data_center_info,
             },
         }
+        if zone:
+            instance_data['instance']['metadata'] = {'zone': zone}
+        return instance_data
 
-    def star(self):
+    def get_instance_payload(self):
+        """
+        Registration body as encoded JSON, serialized again only when one of
+        the registered fields changed
+        """
+        key = (self.app_name, self.get_instance_id(), self.host_name, self.vip_address, self.port,
+               self.secure_port, self.app_protocol, self.data_center, self.zone, self.status,
+               tuple(sorted(self.metadata.items())))
+        if self._payload is None or self._payload[0] != key:
+            instance_data = self.get_instance_data()
+            instance_data['instance']['status'] = self.status
+            if self.metadata:
+                metadata = instance_data['instance'].setdefault('metadata', {})
+                metadata.update(self.metadata)
+            self._payload = (key, json.dumps(instance_data).encode('utf8'))
+        return self._payload[1]
+
+    def star(self, background=False):
         """
         Start registration process
-        :return:
+
+        :param background: register from the scheduler instead of blocking the
+                           caller, retrying with exponential backoff until
+                           Eureka accepts it. Use :meth:`wait_until_registered`
+                           to wait for it.
         """
         logger.info('Starting eureka registration')
+        if background:
+            with self._registration_lock:
+                self._stopped = False
+                self._registration_task = self.scheduler.call_later(
+                    0, self._register_in_background, self.registration_backoff)
+            return
+        self._start()
+
+    def _start(self):
+        if self.prewarm:
+            self.requests.prewarm(self.eureka_urls)
         self.register()
-        self.heartbeat_task = Thread(target=self._heartbeat)
-        self.heartbeat_task.daemon = True
-        self.heartbeat_task.start()
+        self.heartbeat_task = self.scheduler.call_every(
+            self.heartbeat_interval, self._heartbeat, jitter=self.heartbeat_jitter)
+        self.start_registry_fetch()
+        self.start_dns_refresh()
+
+    def _register_in_background(self, backoff):
+        if self._stopped:
+            return
+        try:
+            self._start()
+        except Exception as ex:
+            delay = random.uniform(backoff / 2.0, backoff)
+            logger.warning("Eureka registration failed, retrying in %.1f seconds: %s" % (delay, str(ex)))
+            with self._registration_lock:
+                if not self._stopped:
+                    self._registration_task = self.scheduler.call_later(
+                        delay, self._register_in_background, min(backoff * 2, self.registration_max_backoff))
+            return
+        with self._registration_lock:
+            self._registration_task = None
+            stopped = self._stopped
+        if stopped:
+            # stopped while registering, do not leave the heartbeats running
+            self.stop()
+
+    def wait_until_registered(self, timeout=None):
+        """
+        Block until a registration was accepted by Eureka
+
+        :return: True if registered, False if the timeout expired first
+        """
+        return self.registered.wait(timeout)
+
+    def start_registry_fetch(self):
+        """
+        Start the local registry cache, lookups are served from memory once the
+        first full fetch succeeded
+        """
+        if self.registry is not None:
+            self.registry.start()
+
+    def on_change(self, app_id, callback):
+        """
+        Call ``callback`` with an :class:`ApplicationChange` (the instances
+        added, removed and whose status changed) every time a registry refresh
+        changes the application. Callbacks run on a dedicated thread, one
+        change at a time. Requires ``fetch_registry``.
+
+        :param app_id: eureka application id
+        """
+        if self.registry is None:
+            raise EurekaClientException("Change subscriptions need the local registry (fetch_registry)")
+        self.registry.changes.subscribe(app_id, callback)
+        return callback
+
+    def remove_on_change(self, app_id, callback):
+        if self.registry is not None:
+            self.registry.changes.unsubscribe(app_id, callback)
+
+    def stop(self):
+        """
+        Stop the heartbeats and the background refreshes of this client
+        """
+        with self._registration_lock:
+            self._stopped = True
+            if self._registration_task is not None:
+                self._registration_task.cancel()
+                self._registration_task = None
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        if self.registry is not None:
+            self.registry.stop()
+        if self.dns_discovery is not None:
+            self.dns_discovery.stop()
+        self._close_fan_out_pool()
+
+    def _close_fan_out_pool(self):
+        with self._fan_out_lock:
+            pool, self._fan_out_pool = self._fan_out_pool, None
+        if pool is not None:
+            # calls in flight finish on their own, idle workers exit now
+            pool.shutdown(wait=False)
 
     def _heartbeat(self):
-        while True:
+        try:
+            self.renew()
+        except Exception as ex:
+            logger.debug("Exception during heartbeat: %s" % str(ex))
+
+    def _send_to_peers(self, operation, send, stop_on_404=False):
+        """
+        Call ``send(eureka_url, deadline)`` for every eureka peer, one after
+        another or concurrently on the fan-out pool when fan-out is enabled.
+        All peers share one ``request_timeout`` deadline: called one after
+        another, each peer gets its share of what is left of it so that a
+        hung peer does not keep the next ones from being called. Calls are
+        timed in the metrics under ``operation``.
+
+        :return: ordered dict of eureka url -> None on success or the
+                 exception raised for that peer
+        """
+        results = OrderedDict()
+        deadline = Deadline(self.request_timeout)
+        operation = operation.replace(' ', '_')
+
+        def timed(eureka_url, deadline):
+            return self.metrics.timed(operation, eureka_url, send, eureka_url, deadline)
+
+        if not self.fan_out or len(self.eureka_urls) < 2:
+            eureka_urls = self.eureka_urls
+            for index, eureka_url in enumerate(eureka_urls):
+                try:
+                    timed(eureka_url, deadline.share(len(eureka_urls) - index))
+                    results[eureka_url] = None
+                except ApiException as ex:
+                    results[eureka_url] = ex
+                    if stop_on_404 and ex.status == 404:
+                        break
+            return results
+
+        with self._fan_out_lock:
+            if self._fan_out_pool is None:
+                self._fan_out_pool = ThreadPoolExecutor(
+                    max_workers=self.fan_out_workers or min(len(self.eureka_urls), 8))
+            futures = [(eureka_url, self._fan_out_pool.submit(timed, eureka_url, deadline))
+                       for eureka_url in self.eureka_urls]
+        timeout = deadline.remaining() if self.fan_out_timeout is None else self.fan_out_timeout
+        done, _ = wait([future for _, future in futures], timeout=timeout)
+        for eureka_url, future in futures:
+            if future not in done:
+                future.cancel()
+                results[eureka_url] = EurekaClientException(
+                    "No reply within %s seconds" % timeout)
+                continue
             try:
-                time.sleep(self.heartbeat_interval)
-                self.renew()
-            except Exception as ex:
-                logger.debug("Exception during heartbeat: %s" % eureka_url, str(ex))
+                future.result()
+                results[eureka_url] = None
+            except ApiException as ex:
+                results[eureka_url] = ex
+        return results
+
+    def _instance_url(self, eureka_url, suffix=''):
+        return urljoin(eureka_url, self.service_path + '/%s/%s%s' % (
+            self.app_name,
+            self.get_instance_id(),
+            suffix
+        ))
 
-    def register(self, initial_status="UP"):
+    def register(self, initial_status=None):
         """
         Registers instance with Eureka, begins heartbeats, and fetches registry.
-        :param initial_status: status string
-        :return:
+        :param initial_status: status string, the current status when not given
+        :return: ordered dict of eureka url -> None or the exception raised by that peer
         """
-        instance_data = self.get_instance_data()
-        instance_data['instance']['status'] = initial_status
+        if initial_status is not None:
+            self.status = initial_status
+        payload = self.get_instance_payload()
+
+        def send(eureka_url, deadline):
+            self.requests.POST(
+                url=urljoin(eureka_url, self.service_path + "/%s" % self.app_name),
+                body=payload,
+                headers={'Content-Type': 'application/json'},
+                deadline=deadline)
+
+        results = self._send_to_peers('register', send)
+        for eureka_url, ex in results.items():
+            if ex is not None:
+                logger.debug("Exception while trying to register at '%s' error: %s" % (eureka_url, str(ex)))
+        if all(ex is not None for ex in results.values()):
+            raise EurekaRegistrationFailedException("Did not receive correct reply from any instances")
+        self.deregistered = False
+        self.registered.set()
+        return results
 
-        success = False
-        for eureka_url in self.eureka_urls:
-            url = urljoin(eureka_url, self.service_path + "/%s" % self.app_name)
+    def deregister(self):
+        """
+        Remove the instance from Eureka so that peers stop calling it before
+        its lease expires. Heartbeats and pending updates are stopped first so
+        that they do not register it again.
+        :return: ordered dict of eureka url -> None or the exception raised by that peer
+        """
+        self.deregistered = True
+        self.registered.clear()
+        self.stop()
+        with self._update_lock:
+            if self._update_task is not None:
+                self._update_task.cancel()
+                self._update_task = None
+
+        def send(eureka_url, deadline):
             try:
-                self.requests.POST(
-                    url=url, body=instance_data,
-                    headers={'Content-Type': 'application/json'})
-                success = True
+                self.requests.DELETE(url=self._instance_url(eureka_url), deadline=deadline)
             except ApiException as ex:
-                logger.debug("ApiException while trying to register at '%s' error: %s" %  (url, str(ex)))
-                success = False
-        if not success:
-            raise EurekaRegistrationFailedException("Did not receive correct reply from any instances")
+                # already unknown to that server
+                if ex.status != 404:
+                    raise
+
+        results = self._send_to_peers('deregister', send)
+        self._close_fan_out_pool()
+        for eureka_url, ex in results.items():
+            if ex is not None:
+                logger.debug("Exception while trying to deregister at '%s' error: %s" % (eureka_url, str(ex)))
+        if all(ex is not None for ex in results.values()):
+            raise EurekaDeregistrationFailedException("Did not receive correct reply from any instances")
+        return results
 
     def renew(self):
         """
             Send application instance heartbeat
+            :return: ordered dict of eureka url -> None or the exception raised by that peer
         """
         logger.info(' Updating registeration status ')
-        success = False
-        for eureka_url in self.eureka_urls:
-            url = urljoin(eureka_url, self.service_path + '/%s/%s' % (
-                self.app_name,
-                self.get_instance_id()
-            ))
-            try:
-                self.requests.PUT(url=url)
-                success = True
-            except ApiException as ex:
-                logger.debug("ApiException while trying to renew at '%s' error: %s" % (url, str(ex)))
-                if ex.status == 404:
-                    self.register()
-                    return
-                else:
-                    success = False
-        if not success:
+        return self._update('renew', lambda eureka_url, deadline: self.requests.PUT(
+            url=self._instance_url(eureka_url), deadline=deadline))
+
+    def _update(self, operation, send):
+        results = self._send_to_peers(operation, send, stop_on_404=True)
+        for eureka_url, ex in results.items():
+            if ex is not None:
+                logger.debug("Exception while trying to %s at '%s' error: %s" % (operation, eureka_url, str(ex)))
+        # a server that lost our registration answers 404, register again
+        # unless we deregistered on purpose
+        if any(getattr(ex, 'status', None) == 404 for ex in results.values()) and not self.deregistered:
+            return self.register()
+        if all(ex is not None for ex in results.values()):
             raise EurekaUpdateFailedException("Did not receive correct reply from any instances")
+        return results
+
+    def set_status(self, status, immediate=False):
+        """
+        Change the instance status (UP, DOWN, OUT_OF_SERVICE, ...) through the
+        status endpoint instead of registering again. Changes made within
+        ``status_update_delay`` seconds are coalesced into one call. Changes
+        Eureka did not accept are kept and sent again with exponential
+        backoff.
+
+        :param immediate: send the pending changes now and return the per
+                          peer results
+        """
+        with self._update_lock:
+            self.status = status
+            self._pending_status = status
+        return self._schedule_update(immediate)
+
+    def update_metadata(self, immediate=False, **metadata):
+        """
+        Add or change instance metadata entries through the metadata endpoint,
+        coalesced like :meth:`set_status`
+        """
+        with self._update_lock:
+            self.metadata.update(metadata)
+            self._pending_metadata.update(metadata)
+        return self._schedule_update(immediate)
+
+    def _schedule_update(self, immediate):
+        if immediate or not self.status_update_delay:
+            return self._flush_updates()
+        with self._update_lock:
+            if self._update_task is None:
+                self._update_task = self.scheduler.call_later(self.status_update_delay, self._flush_updates)
+
+    def _flush_updates(self):
+        with self._update_lock:
+            if self._update_task is not None:
+                self._update_task.cancel()
+                self._update_task = None
+            status, self._pending_status = self._pending_status, None
+            metadata, self._pending_metadata = self._pending_metadata, {}
+
+        results = None
+        try:
+            if metadata:
+                results = self._update('update metadata', lambda eureka_url, deadline: self.requests.PUT(
+                    url=self._instance_url(eureka_url, '/metadata'), query_params=metadata, deadline=deadline))
+                metadata = None
+            if status is not None:
+                results = self._update('update status', lambda eureka_url, deadline: self.requests.PUT(
+                    url=self._instance_url(eureka_url, '/status'), query_params={'value': status},
+                    deadline=deadline))
+        except Exception:
+            self._retry_updates(status, metadata)
+            raise
+        with self._update_lock:
+            self._update_backoff = self.registration_backoff
+        return results
+
+    def _retry_updates(self, status, metadata):
+        """
+        Put back the updates that were not sent, behind the ones made since,
+        and send them again after a backoff
+        """
+        with self._update_lock:
+            if self._pending_status is None:
+                self._pending_status = status
+            if metadata:
+                metadata.update(self._pending_metadata)
+                self._pending_metadata = metadata
+            if self.deregistered:
+                return
+            if self._update_task is not None:
+                self._update_task.cancel()
+            backoff = self._update_backoff
+            self._update_backoff = min(backoff * 2, self.registration_max_backoff)
+            delay = random.uniform(backoff / 2.0, backoff)
+            logger.warning("Eureka update failed, retrying in %.1f seconds" % delay)
+            self._update_task = self.scheduler.call_later(delay, self._flush_updates)
 
     # a generic get request, since most of the get requests for discovery will take a similar form
-    def _get_from_any_instance(self, endpoint):
-        for eureka_url in self.eureka_urls:
+    def _get_from_any_instance(self, endpoint, stream=False):
+        """
+        Responses are requested gzip compressed. Unless streaming, the
+        ETag/Last-Modified validators of every server and endpoint are kept and
+        sent back, and a 304 reply returns the previously decoded result. Each
+        server tried gets its share of what is left of the ``request_timeout``
+        deadline, so that a hung server leaves time to fail over to the next.
+
+        :param stream: return an ApplicationStream decoding the applications
+                       of the response one by one instead of the whole
+                       decoded document
+        """
+        deadline = Deadline(self.request_timeout)
+        operation = 'get_delta' if endpoint == 'apps/delta' else 'get_' + endpoint.split('/')[0]
+        candidates = self.server_health.candidates(self.eureka_urls)
+        for index, state in enumerate(candidates):
+            if deadline.expired:
+                break
+            if not self.server_health.acquire(state):
+                continue
+            attempt = deadline.share(len(candidates) - index)
+            started = time.time()
+            headers = {'accept': 'application/json', 'Accept-Encoding': 'gzip'}
+            validated = None if stream else self._validators.get((state.url, endpoint))
+            if validated is not None:
+                if validated[0]:
+                    headers['If-None-Match'] = validated[0]
+                if validated[1]:
+                    headers['If-Modified-Since'] = validated[1]
             try:
-                r = self.requests.GET(urljoin(eureka_url, endpoint), headers={'accept': 'application/json'})
-                r.raise_for_status()
-                return json.loads(r.content)
-            except:
-                pass
+                r = self.requests.GET(urljoin(state.url, endpoint), headers=headers,
+                                      preload_content=not stream, deadline=attempt)
+                if stream:
+                    result = ApplicationStream(r.stream(), close=r.release_conn)
+                else:
+                    result = loads(r.content)
+                    etag, last_modified = r.getheader('ETag'), r.getheader('Last-Modified')
+                    if etag or last_modified:
+                        self._validators[(state.url, endpoint)] = (etag, last_modified, result)
+            except ApiException as ex:
+                if ex.status == 304 and validated is not None:
+                    self.server_health.record_success(state, time.time() - started)
+                    self.metrics.record(operation, state.url, started, True)
+                    return validated[2]
+                logger.debug("ApiException while trying to GET '%s' from '%s' error: %s" % (
+                    endpoint, state.url, str(ex)))
+                # the server answered, only its reply was not usable
+                if ex.status and ex.status < 500:
+                    self.server_health.record_success(state, time.time() - started)
+                else:
+                    self.server_health.record_failure(state, ex)
+                self.metrics.record(operation, state.url, started, False)
+                continue
+            except Exception as ex:
+                logger.debug("Exception while trying to GET '%s' from '%s' error: %s" % (
+                    endpoint, state.url, str(ex)))
+                self.server_health.record_failure(state, ex)
+                self.metrics.record(operation, state.url, started, False)
+                continue
+            self.server_health.record_success(state, time.time() - started)
+            self.metrics.record(operation, state.url, started, True)
+            return result
         raise EurekaGetFailedException("Failed to GET %s from all instances" % endpoint)
 
+    def server_states(self):
+        """
+        Circuit breaker state, latency and error rate of every eureka server,
+        for debugging
+        """
+        return self.server_health.as_list(self.eureka_urls)
+
+    def _get_from_registry(self, lookup, endpoint, *args):
+        if self.registry is not None and self.registry.ready:
+            result = getattr(self.registry, lookup)(*args)
+            if result is None:
+                raise EurekaGetFailedException("%s not found in the local registry" % endpoint)
+            return result
+        return self._get_from_any_instance(endpoint)
+
     def get_apps(self):
-        return self._get_from_any_instance("apps")
+        return self._get_from_registry('get_apps', "apps")
 
     def get_app(self, app_id):
-        return self._get_from_any_instance("apps/%s" % app_id)
+        return self._get_from_registry('get_app', "apps/%s" % app_id, app_id)
 
     def get_vip(self, vip_address):
-        return self._get_from_any_instance("vips/%s" % vip_address)
+        return self._get_from_registry('get_vip', "vips/%s" % vip_address, vip_address)
 
     def get_svip(self, vip_address):
-        return self._get_from_any_instance("svips/%s" % vip_address)
+        return self._get_from_registry('get_svip', "svips/%s" % vip_address, vip_address)
 
     def get_instance(self, instance_id):
-        return self._get_from_any_instance("instances/%s" % instance_id)
+        return self._get_from_registry('get_instance', "instances/%s" % instance_id, instance_id)
 
     def get_app_instance(self, app_id, instance_id):
-        return self._get_from_any_instance("apps/%s/%s" % (app_id, instance_id))
+        return self._get_from_registry('get_app_instance', "apps/%s/%s" % (app_id, instance_id),
+                                       app_id, instance_id)
+
+    def get_instances(self, app_id):
+        """
+        InstanceInfo of an application whatever their status
+        """
+        if self.registry is not None and self.registry.ready:
+            return self.registry.get_instances(app_id)
+        return tuple(Application.from_dict(
+            self._get_from_any_instance("apps/%s" % app_id)['application']).instances.values())
+
+    def get_vip_instances(self, vip_address):
+        """
+        InstanceInfo registered under a VIP address whatever their status
+        """
+        if self.registry is not None and self.registry.ready:
+            return self.registry.get_vip_instances(vip_address)
+        applications = self._get_from_any_instance("vips/%s" % vip_address)['applications']
+        return tuple(instance for application in as_list(applications.get('application'))
+                     for instance in Application.from_dict(application).instances.values())
+
+    def get_up_instances(self, app_id):
+        """
+        InstanceInfo of an application whose status is UP
+        """
+        if self.registry is not None and self.registry.ready:
+            return self.registry.get_up_instances(app_id)
+        application = Application.from_dict(self._get_from_any_instance("apps/%s" % app_id)['application'])
+        return tuple(instance for instance in application.instances.values() if instance.status == 'UP')
+
+    def get_up_vip_instances(self, vip_address):
+        """
+        InstanceInfo registered under a VIP address whose status is UP
+        """
+        if self.registry is not None and self.registry.ready:
+            return self.registry.get_up_vip_instances(vip_address)
+        applications = self._get_from_any_instance("vips/%s" % vip_address)['applications']
+        return tuple(instance for application in as_list(applications.get('application'))
+                     for instance in Application.from_dict(application).instances.values()
+                     if instance.status == 'UP')
+
+    def query_instances(self, app_id=None, vip_address=None, secure_vip_address=None, zone=None, status=None,
+                        metadata=None):
+        """
+        InstanceInfo of the local registry matching every given criterion,
+        e.g. the UP instances of a VIP address in a zone with a metadata
+        value. Lookups use indexes, metadata keys are indexed when listed in
+        ``registry_index_metadata`` and filtered otherwise. Requires
+        ``fetch_registry``.
+
+        :param metadata: dict of metadata key and values
+        """
+        if self.registry is None:
+            raise EurekaClientException("Queries need the local registry (fetch_registry)")
+        if not self.registry.ready:
+            raise EurekaGetFailedException("The local registry was not fetched yet")
+        return self.registry.query(app_id=app_id, vip_address=vip_address, secure_vip_address=secure_vip_address,
+                                   zone=zone, status=status, metadata=metadata)
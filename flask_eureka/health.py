@@ -0,0 +1,201 @@
+"""
+    Health indicators reported by the healthcheck endpoint
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .scheduler import get_default_scheduler
+
+logger = logging.getLogger('service.eureka')
+
+# aggregation order, the first status reported by any indicator wins
+SEVERITY = ['DOWN', 'OUT_OF_SERVICE', 'UNKNOWN', 'STARTING', 'UP']
+
+
+def _as_status(result):
+    if result is True or result is None:
+        return 'UP'
+    if result is False:
+        return 'DOWN'
+    return str(result).upper()
+
+
+def aggregate(statuses):
+    """
+    Worst of the given statuses, UP when there are none
+    """
+    worst = len(SEVERITY) - 1
+    for status in statuses:
+        worst = min(worst, SEVERITY.index(status) if status in SEVERITY else SEVERITY.index('UNKNOWN'))
+    return SEVERITY[worst]
+
+
+class HealthIndicator(object):
+    """
+    One periodic check. ``check`` returns True/None (UP), False (DOWN) or a
+    status string; an exception, or no result within ``timeout`` seconds, is
+    reported as DOWN.
+    """
+
+    def __init__(self, name, check, interval, timeout=None):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self.timeout = timeout
+        self.status = 'UNKNOWN'
+        self.error = None
+        self.duration = None
+        self.checked = None
+        self.task = None
+        self.future = None
+
+    def run(self):
+        started = time.time()
+        try:
+            status, error = _as_status(self.check()), None
+        except Exception as ex:
+            status, error = 'DOWN', str(ex)
+        self.duration = time.time() - started
+        self.checked = time.time()
+        self.status, self.error = status, error
+        return status
+
+    def expire(self):
+        self.checked = time.time()
+        self.status, self.error = 'DOWN', 'No result within %s seconds' % self.timeout
+
+    def as_dict(self):
+        result = {'status': self.status, 'checked': self.checked, 'duration': self.duration}
+        if self.error is not None:
+            result['error'] = self.error
+        return result
+
+
+class HealthMonitor(object):
+    """
+    Runs the health indicators in the background and caches their aggregated
+    status, so that answering a health probe never runs a check.
+    ``on_change`` is called with the new aggregated status whenever it
+    changes.
+
+    The scheduler only triggers the checks: they run on the monitor's own
+    ``max_workers`` threads, so slow checks never hold up the heartbeats
+    sharing the scheduler.
+    """
+
+    def __init__(self, scheduler=None, interval=30, on_change=None, timeout=10, max_workers=4):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.on_change = on_change
+        self.indicators = {}
+        self.status = 'UP'
+        self._lock = threading.Lock()
+        self._started = False
+        self._executor = None
+
+    def add(self, name, check, interval=None, timeout=None):
+        """
+        :param name: name of the indicator in the health details
+        :param check: callable run every ``interval`` seconds
+        :param interval: seconds between checks, the monitor interval by default
+        :param timeout: seconds after which a check not done yet is reported
+                        DOWN, the monitor timeout by default
+        """
+        indicator = HealthIndicator(name, check, interval or self.interval, timeout or self.timeout)
+        with self._lock:
+            previous = self.indicators.get(name)
+            if previous is not None and previous.task is not None:
+                previous.task.cancel()
+            self.indicators[name] = indicator
+            if self._started:
+                self._schedule(indicator)
+        return indicator
+
+    def remove(self, name):
+        with self._lock:
+            indicator = self.indicators.pop(name, None)
+            if indicator is not None and indicator.task is not None:
+                indicator.task.cancel()
+        self._update()
+
+    def start(self, scheduler=None):
+        """
+        Schedule every indicator, the first checks run right away
+        """
+        with self._lock:
+            if self._started:
+                return
+            self.scheduler = scheduler or self.scheduler or get_default_scheduler()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self._started = True
+            for indicator in self.indicators.values():
+                self._schedule(indicator)
+
+    def _schedule(self, indicator):
+        indicator.task = self.scheduler.call_every(indicator.interval, self._run, indicator, first_delay=0)
+
+    def stop(self):
+        with self._lock:
+            self._started = False
+            for indicator in self.indicators.values():
+                if indicator.task is not None:
+                    indicator.task.cancel()
+                    indicator.task = None
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _run(self, indicator):
+        """
+        Submit a check to the monitor threads, unless the previous one is
+        still running, and expire it after its timeout
+        """
+        executor = self._executor
+        if executor is None or (indicator.future is not None and not indicator.future.done()):
+            return
+        future = indicator.future = executor.submit(self._check, indicator)
+        self.scheduler.call_later(indicator.timeout, self._expire, indicator, future)
+
+    def _check(self, indicator):
+        indicator.run()
+        self._update()
+
+    def _expire(self, indicator, future):
+        if not future.done():
+            logger.warning("Health check %s gave no result within %s seconds" % (indicator.name, indicator.timeout))
+            indicator.expire()
+            self._update()
+
+    def check(self):
+        """
+        Run every indicator now, in the calling thread
+        """
+        for indicator in list(self.indicators.values()):
+            indicator.run()
+        return self._update()
+
+    def _update(self):
+        with self._lock:
+            status = aggregate([indicator.status for indicator in self.indicators.values()
+                                if indicator.checked is not None])
+            changed, self.status = status != self.status, status
+        if changed:
+            logger.info("Health status changed to %s" % status)
+            if self.on_change is not None:
+                try:
+                    self.on_change(status)
+                except Exception as ex:
+                    logger.warning("Could not report health status %s: %s" % (status, str(ex)))
+        return status
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'details': dict((name, indicator.as_dict()) for name, indicator in list(self.indicators.items())),
+        }
@@ -1,68 +1,146 @@
 from __future__ import division
 from __future__ import print_function
 
+import binascii
 import platform  # gets host info
-import subprocess
-from platform import python_version
+import socket
+import struct
+import threading
+import uuid
 
-if python_version().split('.')[0] == '2':
-    def getoutput(cmd):
-        return subprocess.check_output([cmd], shell=True)
-else:
-    def getoutput(cmd):
-        return subprocess.getoutput(cmd)
+PROC_ROUTE = '/proc/net/route'
+PROC_IF_INET6 = '/proc/net/if_inet6'
+SYS_CLASS_NET = '/sys/class/net'
+
+# Addresses are only used to pick the outgoing interface, no packet is sent
+PROBE_IPV4 = ('192.0.2.1', 80)
+PROBE_IPV6 = ('2001:db8::1', 80)
+
+SIOCGIFADDR = 0x8915
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def default_interface():
+    """
+    Name of the interface holding the default route (Linux only), None when
+    it cannot be found
+    """
+    if 'default_interface' in _cache:
+        return _cache['default_interface']
+    iface = None
+    for line in (_read(PROC_ROUTE) or '').splitlines()[1:]:
+        fields = line.split()
+        if len(fields) > 1 and fields[1] == '00000000':
+            iface = fields[0]
+            break
+    _cache['default_interface'] = iface
+    return iface
+
+
+def _outgoing_address(family, probe):
+    s = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        s.connect(probe)
+        return s.getsockname()[0]
+    except (socket.error, OSError):
+        return None
+    finally:
+        s.close()
+
+
+def _interface_ipv4(iface):
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        packed = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', iface[:15].encode('utf8')))
+        return socket.inet_ntoa(packed[20:24])
+    except (IOError, OSError):
+        return None
+    finally:
+        s.close()
+
+
+def _interface_ipv6(iface):
+    addresses = _read(PROC_IF_INET6)
+    if not addresses:
+        return None
+    for line in addresses.splitlines():
+        fields = line.split()
+        # global scope addresses only
+        if len(fields) == 6 and fields[5] == iface and fields[3] == '00':
+            return socket.inet_ntop(socket.AF_INET6, binascii.unhexlify(fields[0]))
+    return None
 
 
 class HostInfo(object):
     """
     This collects info on a host computer and generates a dictionary
     of it.
+
+    Addresses are discovered in process (sockets, /proc/net and
+    /sys/class/net), without spawning shells, and cached for the life of the
+    process. When no interface is given the one holding the default route is
+    used.
     """
     TB = 2 ** 40
     GB = 2 ** 30
     MB = 2 ** 20
     KB = 2 ** 10
 
-    def __init__(self, iface='en0'):
-        self.iface = iface
+    def __init__(self, iface=None):
         self.system = platform.system()
+        self.iface = iface or default_interface()
         self.macaddr = None
 
     def get(self):
-        return {
-            'host': platform.node(),
-            'IPv4': self.ipv4(),
-            'IPv6': self.ipv6(),
-            'MAC': self.mac()
-        }
+        with _cache_lock:
+            info = _cache.get(('info', self.iface))
+            if info is None:
+                info = _cache[('info', self.iface)] = {
+                    'host': platform.node(),
+                    'IPv4': self.ipv4(),
+                    'IPv6': self.ipv6(),
+                    'MAC': self.mac()
+                }
+        return dict(info)
 
     def mac(self):
         if self.macaddr is None:
-            if self.system == 'Darwin':
-                self.macaddr = getoutput("ifconfig " + self.iface + "| grep ether | awk '{ print $2 }'")
+            address = _read('%s/%s/address' % (SYS_CLASS_NET, self.iface)) if self.iface else None
+            if address:
+                self.macaddr = address.strip()
             else:
-                self.macaddr = getoutput("ifconfig " + self.iface + "| grep HWaddr | awk '{ print $5 }'")
+                node = uuid.getnode()
+                self.macaddr = ':'.join('%02x' % ((node >> shift) & 0xff) for shift in range(40, -8, -8))
 
         return self.macaddr
 
     def ipv4(self):
-        if self.system == 'Darwin':
-            ipv4 = getoutput("ifconfig " + self.iface + " | grep 'inet ' | awk '{ print $2 }'")
-        else:
-            ipv4 = getoutput("ifconfig " + self.iface + " | grep 'inet addr' | awk '{ print $2 }'")
-            if ipv4.__contains__(":"):
-                ipv4 = ipv4.split(':')[1]
-
-        # ipv4 = socket.gethostbyname(platform.node())
-        # if ipv4.split('.')[0] == '127':
-        # 	ipv4 = socket.gethostbyname(platform.node() + '.local')
+        ipv4 = _interface_ipv4(self.iface) if self.iface else None
+        if ipv4 is None:
+            ipv4 = _outgoing_address(socket.AF_INET, PROBE_IPV4)
+        if ipv4 is None:
+            try:
+                ipv4 = socket.gethostbyname(platform.node())
+            except socket.error:
+                ipv4 = ''
         return ipv4
 
     def ipv6(self):
-        if self.system == 'Darwin':
-            ipv6 = getoutput("ifconfig " + self.iface + "| grep inet6 | awk '{ print $2 }'")
-        else:
-            ipv6 = getoutput("ifconfig " + self.iface + "| grep inet6 | awk '{ print $3 }'")
-        # result = socket.getaddrinfo(host, port, socket.AF_INET6)
-        # return result[0][4][0]
-        return ipv6
+        ipv6 = _interface_ipv6(self.iface) if self.iface else None
+        if ipv6 is None and socket.has_ipv6:
+            ipv6 = _outgoing_address(socket.AF_INET6, PROBE_IPV6)
+        return ipv6 or ''
@@ -4,7 +4,9 @@ import sys
 import io
 import json
 import logging
-import re
+import os
+import threading
+import time
 
 try:
     import urllib3
@@ -18,15 +20,54 @@ except ImportError:
     # for python2
     from urllib import urlencode
 
+from .metrics import get_default_metrics
+from .scheduler import DEFAULT_MAX_WORKERS
+
 logger = logging.getLogger(__name__)
 
 
 class RESTResponse(io.IOBase):
+    """
+    Response wrapper keeping the raw body bytes in ``content``. ``data`` is
+    the body decoded to text, computed on first access. Responses requested
+    with ``preload_content=False`` are not read until ``content`` or
+    ``stream`` is used.
+    """
     def __init__(self, resp):
         self.urllib3_response = resp
         self.status = resp.status
         self.reason = resp.reason
-        self.data = resp.data
+        self._content = None
+        self._data = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.urllib3_response.data
+        return self._content
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.content
+            # In the python 3, the response.data is bytes.
+            # we need to decode it to string.
+            if sys.version_info > (3,):
+                self._data = self._data.decode('utf8')
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def stream(self, chunk_size=65536):
+        """
+        Iterate over the body in chunks of bytes without keeping it in memory
+        """
+        return self.urllib3_response.stream(chunk_size)
+
+    def release_conn(self):
+        self.urllib3_response.release_conn()
 
     def getheaders(self):
         """
@@ -41,17 +82,134 @@ class RESTResponse(io.IOBase):
         return self.urllib3_response.getheader(name, default)
 
 
+# connections kept per host by the shared pool manager: one per scheduler
+# worker renewing in parallel, plus the registry refresh, DNS and caller
+# threads, so that none is discarded after use
+DEFAULT_POOL_MAXSIZE = DEFAULT_MAX_WORKERS + 4
+
+_default_pool_manager = None
+_default_pool_manager_pid = None
+_default_pool_manager_lock = threading.Lock()
+
+
+def get_default_pool_manager():
+    """
+    Pool manager shared by every HttpClientObject created without one, so
+    that the clients of a process reuse the same connections. A forked child
+    gets its own instead of sharing the sockets of its parent.
+    """
+    global _default_pool_manager, _default_pool_manager_pid
+    if _default_pool_manager_pid != os.getpid():
+        with _default_pool_manager_lock:
+            if _default_pool_manager_pid != os.getpid():
+                _default_pool_manager = urllib3.PoolManager(num_pools=10, maxsize=DEFAULT_POOL_MAXSIZE)
+                _default_pool_manager_pid = os.getpid()
+    return _default_pool_manager
+
+
+class Deadline(object):
+    """
+    Time budget shared by every request of one logical operation
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.time() + seconds
+
+    def remaining(self):
+        return max(self.expires - time.time(), 0)
+
+    def share(self, parts):
+        """
+        Deadline of one of ``parts`` attempts left, so that a hung attempt
+        leaves time for the following ones
+        """
+        return Deadline(self.remaining() / max(parts, 1))
+
+    @property
+    def expired(self):
+        return time.time() >= self.expires
+
+
 class HttpClientObject(object):
-    def __init__(self, pool_manager=None):
+    def __init__(self, pool_manager=None, connect_timeout=3.0, read_timeout=10.0,
+                 pool_maxsize=None, host_pool_sizes=None, metrics=None):
+        """
+        :param connect_timeout: connect timeout in seconds, capped by the
+                                remaining deadline of a request
+        :param read_timeout: read timeout in seconds, capped by the remaining
+                             deadline of a request
+        :param pool_maxsize: when set, every host gets its own connection pool
+                             of this size
+        :param host_pool_sizes: pool size of given hosts (``host:port``)
+        :param metrics: Metrics recording the requests, the process wide one
+                        by default
+        """
 
-        # https pool manager
-        if  pool_manager is not None:
-            self.pool_manager = pool_manager
-        else:
-            self.pool_manager = urllib3.PoolManager(num_pools=4)
+        # https pool manager, the process wide one when not given
+        self._pool_manager = pool_manager
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_maxsize = pool_maxsize
+        self.host_pool_sizes = host_pool_sizes or {}
+        self.metrics = metrics if metrics is not None else get_default_metrics()
+
+    @property
+    def pool_manager(self):
+        # looked up on every use so that a forked child does not keep using
+        # the pool manager of its parent
+        if self._pool_manager is not None:
+            return self._pool_manager
+        return get_default_pool_manager()
+
+    @pool_manager.setter
+    def pool_manager(self, pool_manager):
+        self._pool_manager = pool_manager
+
+    def _timeout(self, deadline):
+        if deadline is None:
+            return urllib3.Timeout(connect=self.connect_timeout, read=self.read_timeout)
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise ApiException(status=0, reason="Deadline of %s seconds exceeded" % deadline.seconds)
+        return urllib3.Timeout(connect=min(self.connect_timeout, remaining),
+                               read=min(self.read_timeout, remaining))
+
+    def _pool_for(self, url):
+        """
+        Connection pool (or pool manager) used for an url, honouring the per
+        host pool sizes
+        """
+        if not self.pool_maxsize and not self.host_pool_sizes:
+            return self.pool_manager
+        parsed = urllib3.util.parse_url(url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        size = self.host_pool_sizes.get('%s:%s' % (parsed.host, port), self.pool_maxsize)
+        if not size:
+            return self.pool_manager
+        return self.pool_manager.connection_from_url(url, pool_kwargs={'maxsize': size})
+
+    def prewarm(self, urls, connections=1):
+        """
+        Open connections to the hosts of ``urls`` ahead of the first request
+        so it does not pay for TCP/TLS setup
+        """
+        for url in urls:
+            try:
+                pool = self._pool_for(url)
+                if pool is self.pool_manager:
+                    pool = self.pool_manager.connection_from_url(url)
+                conns = [pool._get_conn(timeout=0) for i in range(connections)]
+                for conn in conns:
+                    conn.timeout = self.connect_timeout
+                    conn.connect()
+                for conn in conns:
+                    pool._put_conn(conn)
+            except Exception as ex:
+                logger.debug("Could not pre-warm connection to %s: %s" % (url, str(ex)))
 
     def request(self, method, url, query_params=None, headers=None,
-                body=None, post_params=None):
+                body=None, post_params=None, preload_content=True, deadline=None):
         """
         :param method: http request method
         :param url: http request url
@@ -61,6 +219,9 @@ class HttpClientObject(object):
         :param post_params: request post parameters,
                             `application/x-www-form-urlencode`
                             and `multipart/form-data`
+        :param preload_content: when False the body is not read, use
+                                `RESTResponse.stream` to consume it
+        :param deadline: `Deadline` capping the connect and read timeouts
         """
         method = method.upper()
         assert method in ['GET', 'HEAD', 'DELETE', 'POST', 'PUT', 'PATCH', 'OPTIONS']
@@ -76,98 +237,125 @@ class HttpClientObject(object):
         if 'Content-Type' not in headers:
             headers['Content-Type'] = 'application/json'
 
+        opener = self._pool_for(url)
+        timeout = self._timeout(deadline)
+        started = time.time()
+        status = 0
         try:
             # For `POST`, `PUT`, `PATCH`, `OPTIONS`, `DELETE`
             if method in ['POST', 'PUT', 'PATCH', 'OPTIONS', 'DELETE']:
                 if query_params:
                     url += '?' + urlencode(query_params)
-                if re.search('json', headers['Content-Type'], re.IGNORECASE):
+                if 'json' in headers['Content-Type'].lower():
                     request_body = None
-                    if body:
+                    if isinstance(body, bytes):
+                        # already serialized by the caller
+                        request_body = body
+                    elif body:
                         request_body = json.dumps(body)
-                    r = self.pool_manager.request(method, url,
-                                                  body=request_body,
-                                                  headers=headers)
+                    r = opener.request(method, url,
+                                       body=request_body,
+                                       headers=headers,
+                                       timeout=timeout,
+                                       retries=False)
                 if headers['Content-Type'] == 'application/x-www-form-urlencoded':
-                    r = self.pool_manager.request(method, url,
-                                                  fields=post_params,
-                                                  encode_multipart=False,
-                                                  headers=headers)
+                    r = opener.request(method, url,
+                                       fields=post_params,
+                                       encode_multipart=False,
+                                       headers=headers,
+                                       timeout=timeout,
+                                       retries=False)
                 if headers['Content-Type'] == 'multipart/form-data':
                     # must del headers['Content-Type'], or the correct Content-Type
                     # which generated by urllib3 will be overwritten.
                     del headers['Content-Type']
-                    r = self.pool_manager.request(method, url,
-                                                  fields=post_params,
-                                                  encode_multipart=True,
-                                                  headers=headers)
+                    r = opener.request(method, url,
+                                       fields=post_params,
+                                       encode_multipart=True,
+                                       headers=headers,
+                                       timeout=timeout,
+                                       retries=False)
             # For `GET`, `HEAD`
             else:
-                r = self.pool_manager.request(method, url,
-                                              fields=query_params,
-                                              headers=headers)
-        except urllib3.exceptions.SSLError as e:
+                r = opener.request(method, url,
+                                   fields=query_params,
+                                   headers=headers,
+                                   preload_content=preload_content,
+                                   timeout=timeout,
+                                   retries=False)
+            status = r.status
+        except urllib3.exceptions.HTTPError as e:
+            # SSL, connection and timeout errors
             msg = "{0}\n{1}".format(type(e).__name__, str(e))
             raise ApiException(status=0, reason=msg)
+        finally:
+            # scheme://host:port/path, the host part is cheaper to cut than to parse
+            labels = (('method', method), ('host', url.split('/', 3)[2] if '//' in url else url))
+            self.metrics.observe('eureka_http_request_duration_seconds', labels, time.time() - started)
+            self.metrics.inc('eureka_http_requests_total', labels + (('status', status),))
 
         r = RESTResponse(r)
 
-        # In the python 3, the response.data is bytes.
-        # we need to decode it to string.
-        if sys.version_info > (3,):
-            r.data = r.data.decode('utf8')
-
         # log response body
-        logger.debug("response body: %s" % r.data)
+        if preload_content and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("response body: %s" % r.data)
 
         if r.status not in range(200, 206):
             raise ApiException(http_resp=r)
 
         return r
 
-    def GET(self, url, headers=None, query_params=None):
+    def GET(self, url, headers=None, query_params=None, preload_content=True, deadline=None):
         return self.request("GET", url,
                             headers=headers,
-                            query_params=query_params)
+                            query_params=query_params,
+                            preload_content=preload_content,
+                            deadline=deadline)
 
-    def HEAD(self, url, headers=None, query_params=None):
+    def HEAD(self, url, headers=None, query_params=None, deadline=None):
         return self.request("HEAD", url,
                             headers=headers,
-                            query_params=query_params)
+                            query_params=query_params,
+                            deadline=deadline)
 
-    def OPTIONS(self, url, headers=None, query_params=None, post_params=None, body=None):
+    def OPTIONS(self, url, headers=None, query_params=None, post_params=None, body=None, deadline=None):
         return self.request("OPTIONS", url,
                             headers=headers,
                             query_params=query_params,
                             post_params=post_params,
-                            body=body)
+                            body=body,
+                            deadline=deadline)
 
-    def DELETE(self, url, headers=None, query_params=None, body=None):
+    def DELETE(self, url, headers=None, query_params=None, body=None, deadline=None):
         return self.request("DELETE", url,
                             headers=headers,
                             query_params=query_params,
-                            body=body)
+                            body=body,
+                            deadline=deadline)
 
-    def POST(self, url, headers=None, query_params=None, post_params=None, body=None):
+    def POST(self, url, headers=None, query_params=None, post_params=None, body=None, deadline=None):
         return self.request("POST", url,
                             headers=headers,
                             query_params=query_params,
                             post_params=post_params,
-                            body=body)
+                            body=body,
+                            deadline=deadline)
 
-    def PUT(self, url, headers=None, query_params=None, post_params=None, body=None):
+    def PUT(self, url, headers=None, query_params=None, post_params=None, body=None, deadline=None):
         return self.request("PUT", url,
                             headers=headers,
                             query_params=query_params,
                             post_params=post_params,
-                            body=body)
+                            body=body,
+                            deadline=deadline)
 
-    def PATCH(self, url, headers=None, query_params=None, post_params=None, body=None):
+    def PATCH(self, url, headers=None, query_params=None, post_params=None, body=None, deadline=None):
         return self.request("PATCH", url,
                             headers=headers,
                             query_params=query_params,
                             post_params=post_params,
-                            body=body)
+                            body=body,
+                            deadline=deadline)
 
 
 class ApiException(Exception):
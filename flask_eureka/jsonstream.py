@@ -0,0 +1,133 @@
+"""
+    Incremental parsing of registry responses
+"""
+
+import codecs
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+APPLICATION_KEY = re.compile(r'"application"\s*:\s*([\[{])')
+HEADER_FIELDS = re.compile(r'"(versions__delta|apps__hashcode)"\s*:\s*"([^"]*)"')
+WHITESPACE = ' \t\n\r,'
+
+_decoder = json.JSONDecoder()
+
+
+def loads(content):
+    """
+    Decode a JSON document from bytes, with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    if isinstance(content, bytes):
+        content = content.decode('utf8')
+    return json.loads(content)
+
+
+class ApplicationStream(object):
+    """
+    Iterates over the applications of an ``{"applications": {...}}`` document
+    read from an iterable of byte chunks, decoding one application at a time.
+    Memory use is bounded by the largest application instead of the whole
+    registry. ``versions__delta`` and ``apps__hashcode`` are available once
+    the iteration is complete.
+    """
+
+    def __init__(self, chunks, close=None):
+        """
+        :param chunks: iterable of bytes
+        :param close: callable run once the stream is consumed or abandoned
+        """
+        self._chunks = iter(chunks)
+        self._close = close
+        self._decoder = codecs.getincrementaldecoder('utf8')()
+        self._buffer = ''
+        self._eof = False
+        self.versions_delta = None
+        self.apps_hashcode = None
+
+    def _read(self):
+        if self._eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._buffer += self._decoder.decode(b'', final=True)
+            self._eof = True
+            return False
+        self._buffer += self._decoder.decode(chunk)
+        return True
+
+    def _read_headers(self, text):
+        for name, value in HEADER_FIELDS.findall(text):
+            if name == 'versions__delta':
+                self.versions_delta = value
+            else:
+                self.apps_hashcode = value
+
+    def _decode_value(self, pos):
+        """
+        Decode the JSON value starting at ``pos``, reading more chunks until
+        it is complete. The amount read is doubled before every retry so a
+        value is parsed at most a logarithmic number of times.
+        """
+        while True:
+            try:
+                return _decoder.raw_decode(self._buffer, pos)
+            except ValueError:
+                wanted = max(len(self._buffer) - pos, 1)
+                start = len(self._buffer)
+                while len(self._buffer) - start < wanted and self._read():
+                    pass
+                if len(self._buffer) == start:
+                    raise
+
+    def __iter__(self):
+        try:
+            for application in self._iter_applications():
+                yield application
+        finally:
+            if self._close is not None:
+                self._close()
+                self._close = None
+
+    def _iter_applications(self):
+        match = APPLICATION_KEY.search(self._buffer)
+        while match is None and self._read():
+            match = APPLICATION_KEY.search(self._buffer)
+        if match is None:
+            self._read_headers(self._buffer)
+            return
+        self._read_headers(self._buffer[:match.start()])
+        pos = match.end()
+
+        if match.group(1) == '{':
+            application, pos = self._decode_value(pos - 1)
+            yield application
+        else:
+            while True:
+                while True:
+                    while pos < len(self._buffer) and self._buffer[pos] in WHITESPACE:
+                        pos += 1
+                    if pos < len(self._buffer) or not self._read():
+                        break
+                if pos >= len(self._buffer):
+                    raise ValueError("Unterminated application list")
+                if self._buffer[pos] == ']':
+                    pos += 1
+                    break
+                application, pos = self._decode_value(pos)
+                # drop what has been decoded so the buffer only holds the
+                # application being read
+                self._buffer = self._buffer[pos:]
+                pos = 0
+                yield application
+
+        while self._read():
+            pass
+        self._read_headers(self._buffer[pos:])
@@ -0,0 +1,155 @@
+"""
+    Client side load balancing over discovered instances
+"""
+
+import itertools
+import random
+import threading
+from bisect import bisect
+
+
+def instance_weight(instance):
+    """
+    Weight of an instance, read from the ``weight`` metadata entry (default 1)
+    """
+    try:
+        return max(float((instance.metadata or {}).get('weight', 1)), 0)
+    except (TypeError, ValueError):
+        return 1
+
+
+class LoadBalancer(object):
+    """
+    Base class of the instance choosers. ``choose`` receives a key (app id or
+    VIP) and the tuple of UP :class:`InstanceInfo` for that key.
+    """
+
+    def choose(self, key, instances):
+        raise NotImplementedError()
+
+    def release(self, instance):
+        """
+        Signal that the request sent to ``instance`` has completed
+        """
+        pass
+
+
+class RoundRobin(LoadBalancer):
+
+    def __init__(self):
+        self._counters = {}
+
+    def choose(self, key, instances):
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        # next() on itertools.count is atomic under the GIL
+        return instances[next(counter) % len(instances)]
+
+
+class WeightedRandom(LoadBalancer):
+
+    def __init__(self):
+        self._cumulative = {}
+
+    def _weights(self, key, instances):
+        cached = self._cumulative.get(key)
+        if cached is not None and cached[0] is instances:
+            return cached[1]
+        cumulative = list(itertools.accumulate(instance_weight(instance) for instance in instances))
+        self._cumulative[key] = (instances, cumulative)
+        return cumulative
+
+    def choose(self, key, instances):
+        cumulative = self._weights(key, instances)
+        if not cumulative[-1]:
+            return random.choice(instances)
+        return instances[bisect(cumulative, random.random() * cumulative[-1])]
+
+
+class PowerOfTwoChoices(LoadBalancer):
+    """
+    Pick two instances at random and use the one with fewer in-flight
+    requests. Callers must ``release`` the instance once the call completes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def in_flight(self, instance):
+        return self._in_flight.get(instance.instance_id, 0)
+
+    def choose(self, key, instances):
+        if len(instances) == 1:
+            chosen = instances[0]
+        else:
+            first, second = random.sample(range(len(instances)), 2)
+            chosen = instances[first]
+            if self.in_flight(instances[second]) < self.in_flight(chosen):
+                chosen = instances[second]
+        instance_id = chosen.instance_id
+        with self._lock:
+            self._in_flight[instance_id] = self._in_flight.get(instance_id, 0) + 1
+        return chosen
+
+    def release(self, instance):
+        instance_id = instance.instance_id
+        with self._lock:
+            count = self._in_flight.get(instance_id, 0) - 1
+            if count > 0:
+                self._in_flight[instance_id] = count
+            else:
+                self._in_flight.pop(instance_id, None)
+
+
+class ZoneAffinity(object):
+    """
+    Keep the UP instances of our own availability zone (see
+    :attr:`InstanceInfo.zone`) as long as at least ``threshold`` of the
+    instances of the zone are UP, and fall back to the UP instances of every
+    zone when fewer are, so that the remaining local instances are not
+    overloaded.
+    """
+
+    def __init__(self, zone, threshold=0.5):
+        self.zone = zone
+        self.threshold = threshold
+        self._filtered = {}
+
+    def filter(self, key, instances):
+        """
+        UP instances to choose from, among the ``instances`` of any status of
+        a key (app id or VIP). The result is memoized as long as the same
+        ``instances`` tuple is passed.
+        """
+        cached = self._filtered.get(key)
+        if cached is not None and cached[0] is instances:
+            return cached[1]
+        up = tuple(instance for instance in instances if instance.status == 'UP')
+        local = [instance for instance in instances if instance.zone == self.zone]
+        local_up = tuple(instance for instance in local if instance.status == 'UP')
+        if local_up and len(local_up) >= self.threshold * len(local):
+            up = local_up
+        self._filtered[key] = (instances, up)
+        return up
+
+
+LOAD_BALANCERS = {
+    'round_robin': RoundRobin,
+    'weighted_random': WeightedRandom,
+    'power_of_two_choices': PowerOfTwoChoices,
+}
+
+
+def get_load_balancer(strategy):
+    """
+    Build a load balancer from its name, instances are passed through
+    """
+    if isinstance(strategy, LoadBalancer):
+        return strategy
+    try:
+        return LOAD_BALANCERS[strategy]()
+    except KeyError:
+        raise ValueError("Unknown load balancing strategy '%s', expected one of %s" % (
+            strategy, sorted(LOAD_BALANCERS)))
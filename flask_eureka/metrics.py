@@ -0,0 +1,167 @@
+"""
+    Latency and error metrics in the Prometheus text format
+"""
+
+import bisect
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for key, value in labels)
+
+
+def _value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram(object):
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics(object):
+    """
+    Histograms, counters and gauges keyed by metric name and a tuple of
+    ``(label, value)`` pairs. Recording is a dict lookup and a few additions
+    under one lock; the text exposition is only built when it is scraped.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_functions = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def _observe(self, key, value):
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def _inc(self, key, amount):
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            self._observe((name, labels), value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._inc((name, labels), amount)
+
+    def gauge_function(self, name, fn, labels=()):
+        """
+        Gauge computed by calling ``fn`` when the metrics are rendered. The
+        gauge is dropped once ``fn`` returns None.
+        """
+        self._gauge_functions[(name, labels)] = fn
+
+    def record(self, operation, server, started, success):
+        """
+        Record the duration of a call to ``server`` started at ``started``,
+        its outcome and, for successes, the time of the last success
+        """
+        labels = (('operation', operation), ('server', server))
+        now = time.time()
+        with self._lock:
+            self._observe(('eureka_operation_duration_seconds', labels), now - started)
+            self._inc(('eureka_operation_total', labels + (('outcome', 'success' if success else 'error'),)), 1)
+        if success:
+            self._gauges[('eureka_operation_last_success_timestamp_seconds', labels)] = now
+
+    def timed(self, operation, server, fn, *args, **kwargs):
+        """
+        Call ``fn`` and :meth:`record` it
+        """
+        started = time.time()
+        success = False
+        try:
+            result = fn(*args, **kwargs)
+            success = True
+            return result
+        finally:
+            self.record(operation, server, started, success)
+
+    def _type(self, lines, name, kind):
+        if name in self._help:
+            lines.append('# HELP %s %s' % (name, self._help[name]))
+        lines.append('# TYPE %s %s' % (name, kind))
+
+    def render(self):
+        """
+        Prometheus text exposition format
+        """
+        with self._lock:
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in self._histograms.items()]
+            counters = list(self._counters.items())
+        gauges = list(self._gauges.items())
+        for key, fn in list(self._gauge_functions.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if value is None:
+                self._gauge_functions.pop(key, None)
+            else:
+                gauges.append((key, value))
+
+        lines = []
+        seen = set()
+        for (name, labels), counts, total, count in sorted(histograms, key=lambda h: h[0]):
+            if name not in seen:
+                seen.add(name)
+                self._type(lines, name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket%s %d' % (name, _labels(labels + (('le', bound),)), cumulative))
+            lines.append('%s_sum%s %s' % (name, _labels(labels), _value(total)))
+            lines.append('%s_count%s %d' % (name, _labels(labels), count))
+        for kind, samples in (('counter', counters), ('gauge', gauges)):
+            for (name, labels), value in sorted(samples, key=lambda sample: sample[0]):
+                if name not in seen:
+                    seen.add(name)
+                    self._type(lines, name, kind)
+                lines.append('%s%s %s' % (name, _labels(labels), _value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+_default_metrics = None
+_default_metrics_lock = threading.Lock()
+
+
+def get_default_metrics():
+    """
+    Metrics shared by every client of the process
+    """
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics()
+            _default_metrics.describe('eureka_operation_duration_seconds',
+                                      'Duration of register, renew, status and lookup calls per eureka server')
+            _default_metrics.describe('eureka_http_request_duration_seconds',
+                                      'Duration of HTTP requests per method and host')
+        return _default_metrics
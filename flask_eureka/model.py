@@ -0,0 +1,299 @@
+"""
+    Compact registry data model
+"""
+
+import sys
+import threading
+
+try:
+    intern = sys.intern
+except AttributeError:
+    pass
+
+STATUSES = ['UP', 'DOWN', 'STARTING', 'OUT_OF_SERVICE', 'UNKNOWN']
+_STATUS_CODES = dict((status, code) for code, status in enumerate(STATUSES))
+_status_lock = threading.Lock()
+
+
+def status_code(status):
+    """
+    Small integer standing for a status string, unknown statuses get a new
+    code
+    """
+    code = _STATUS_CODES.get(status)
+    if code is None:
+        with _status_lock:
+            code = _STATUS_CODES.get(status)
+            if code is None:
+                STATUSES.append(intern(status))
+                code = _STATUS_CODES[status] = len(STATUSES) - 1
+    return code
+
+
+def as_list(value):
+    """
+    Eureka's JSON codec collapses single element lists into a plain object,
+    normalise both shapes into a list.
+    """
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return value
+    return [value]
+
+
+class FrozenDict(dict):
+    """
+    dict refusing changes, for lookup results shared by every caller. Copies
+    (``copy.deepcopy``) are plain dicts and lists.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Registry lookup results are shared and read-only, change a copy.deepcopy of them")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def freeze(value):
+    """
+    Read-only version of decoded JSON: dicts become FrozenDict and lists
+    tuples
+    """
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def _intern(value):
+    return intern(value) if isinstance(value, str) else value
+
+
+def _intern_dict(values):
+    if not values:
+        return None
+    return dict((_intern(key), _intern(value)) for key, value in values.items())
+
+
+def _port(value):
+    """
+    Port number and enabled flag from ``{"$": 8080, "@enabled": "true"}``
+    """
+    if value is None:
+        return None, False
+    if not isinstance(value, dict):
+        return int(value), True
+    number = value.get('$')
+    return (int(number) if number not in (None, '') else None), str(value.get('@enabled')).lower() == 'true'
+
+
+class InstanceInfo(object):
+    """
+    One registered instance. Repeated strings (app names, statuses, data
+    center classes, metadata keys and values) are interned, ports are stored
+    as ints and the status as a small integer code.
+    """
+    __slots__ = ('app', 'instance_id', 'host_name', 'ip_addr', '_status', '_overridden_status',
+                 'port', 'port_enabled', 'secure_port', 'secure_port_enabled', 'vip_address',
+                 'secure_vip_address', 'home_page_url', 'status_page_url', 'health_check_url',
+                 'data_center_class', 'data_center_name', 'data_center_metadata', 'metadata',
+                 'lease_info', 'country_id', 'is_coordinating_discovery_server',
+                 'last_updated_timestamp', 'last_dirty_timestamp', 'action_type', 'extra')
+
+    FIELDS = {
+        'app': 'app',
+        'instanceId': 'instance_id',
+        'hostName': 'host_name',
+        'ipAddr': 'ip_addr',
+        'vipAddress': 'vip_address',
+        'secureVipAddress': 'secure_vip_address',
+        'homePageUrl': 'home_page_url',
+        'statusPageUrl': 'status_page_url',
+        'healthCheckUrl': 'health_check_url',
+        'countryId': 'country_id',
+        'isCoordinatingDiscoveryServer': 'is_coordinating_discovery_server',
+        'lastUpdatedTimestamp': 'last_updated_timestamp',
+        'lastDirtyTimestamp': 'last_dirty_timestamp',
+        'actionType': 'action_type',
+    }
+    INTERNED = frozenset(['app', 'vipAddress', 'secureVipAddress', 'countryId',
+                          'isCoordinatingDiscoveryServer', 'actionType'])
+    KNOWN_KEYS = frozenset(FIELDS) | frozenset(['status', 'overriddenstatus', 'overriddenStatus', 'port',
+                                                'securePort', 'dataCenterInfo', 'metadata', 'leaseInfo'])
+
+    def __init__(self, instance_id, app=None, status='UP', host_name=None, ip_addr=None,
+                 port=None, secure_port=None, vip_address=None, secure_vip_address=None, metadata=None):
+        for attribute in InstanceInfo.__slots__:
+            setattr(self, attribute, None)
+        self.instance_id = instance_id
+        self.app = _intern(app)
+        self.status = status
+        self.host_name = host_name
+        self.ip_addr = ip_addr
+        self.port = port
+        self.port_enabled = port is not None
+        self.secure_port = secure_port
+        self.secure_port_enabled = False
+        self.vip_address = _intern(vip_address)
+        self.secure_vip_address = _intern(secure_vip_address)
+        self.metadata = _intern_dict(metadata)
+
+    @property
+    def status(self):
+        return STATUSES[self._status]
+
+    @status.setter
+    def status(self, value):
+        self._status = status_code(value)
+
+    @property
+    def overridden_status(self):
+        return None if self._overridden_status is None else STATUSES[self._overridden_status]
+
+    @overridden_status.setter
+    def overridden_status(self, value):
+        self._overridden_status = None if value is None else status_code(value)
+
+    @property
+    def zone(self):
+        """
+        Availability zone from the Amazon data center metadata, or else from
+        the ``zone`` instance metadata, if any
+        """
+        return (self.data_center_metadata or {}).get('availability-zone') or (self.metadata or {}).get('zone')
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build an instance from the ``instance`` object of a registry response
+        """
+        instance = cls.__new__(cls)
+        for key, attribute in cls.FIELDS.items():
+            value = data.get(key)
+            setattr(instance, attribute, _intern(value) if key in cls.INTERNED else value)
+        instance.status = data.get('status', 'UNKNOWN')
+        overridden = data.get('overriddenstatus', data.get('overriddenStatus'))
+        instance.overridden_status = overridden
+        instance.port, instance.port_enabled = _port(data.get('port'))
+        instance.secure_port, instance.secure_port_enabled = _port(data.get('securePort'))
+        data_center = data.get('dataCenterInfo') or {}
+        instance.data_center_class = _intern(data_center.get('@class'))
+        instance.data_center_name = _intern(data_center.get('name'))
+        instance.data_center_metadata = _intern_dict(data_center.get('metadata'))
+        instance.metadata = _intern_dict(data.get('metadata'))
+        instance.lease_info = _intern_dict(data.get('leaseInfo'))
+        extra = [(key, value) for key, value in data.items() if key not in cls.KNOWN_KEYS]
+        instance.extra = dict(extra) if extra else None
+        return instance
+
+    def to_dict(self):
+        """
+        Registry response representation of the instance
+        """
+        data = {}
+        for key, attribute in InstanceInfo.FIELDS.items():
+            value = getattr(self, attribute)
+            if value is not None:
+                data[key] = value
+        data['status'] = self.status
+        if self._overridden_status is not None:
+            data['overriddenstatus'] = self.overridden_status
+        data['port'] = {'$': self.port, '@enabled': 'true' if self.port_enabled else 'false'}
+        data['securePort'] = {'$': self.secure_port, '@enabled': 'true' if self.secure_port_enabled else 'false'}
+        data_center = {}
+        if self.data_center_class is not None:
+            data_center['@class'] = self.data_center_class
+        if self.data_center_name is not None:
+            data_center['name'] = self.data_center_name
+        if self.data_center_metadata is not None:
+            data_center['metadata'] = dict(self.data_center_metadata)
+        if data_center:
+            data['dataCenterInfo'] = data_center
+        if self.metadata is not None:
+            data['metadata'] = dict(self.metadata)
+        if self.lease_info is not None:
+            data['leaseInfo'] = dict(self.lease_info)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self):
+        return '<InstanceInfo %s %s %s>' % (self.app, self.instance_id, self.status)
+
+
+def instance_version(instance):
+    """
+    Hash of the fields whose changes are reported to subscribers
+    """
+    return hash((instance.instance_id, instance._status))
+
+
+class Application(object):
+    """
+    A registered application and its instances, keyed by instance id.
+    ``version`` is the xor of :func:`instance_version` over the instances:
+    it is kept up to date in constant time by :meth:`put` and :meth:`pop`,
+    and tells whether two copies of an application differ without
+    comparing their instances.
+    """
+    __slots__ = ('name', 'instances', 'version')
+
+    def __init__(self, name, instances=None):
+        self.name = intern(name.upper())
+        self.instances = dict((instance.instance_id, instance) for instance in instances or ())
+        self.version = 0
+        for instance in self.instances.values():
+            self.version ^= instance_version(instance)
+
+    def put(self, instance):
+        """
+        Add or replace an instance, returning the one it replaced
+        """
+        previous = self.instances.get(instance.instance_id)
+        if previous is not None:
+            self.version ^= instance_version(previous)
+        self.instances[instance.instance_id] = instance
+        self.version ^= instance_version(instance)
+        return previous
+
+    def copy(self):
+        """
+        Copy sharing the instances, which are replaced rather than changed
+        """
+        application = Application.__new__(Application)
+        application.name = self.name
+        application.instances = dict(self.instances)
+        application.version = self.version
+        return application
+
+    def pop(self, instance_id):
+        instance = self.instances.pop(instance_id, None)
+        if instance is not None:
+            self.version ^= instance_version(instance)
+        return instance
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build an application from the ``application`` object of a registry
+        response
+        """
+        return cls(data['name'], [InstanceInfo.from_dict(instance) for instance in as_list(data.get('instance'))])
+
+    def to_dict(self, instances=None):
+        return {
+            'name': self.name,
+            'instance': [instance.to_dict() for instance in
+                         (self.instances.values() if instances is None else instances)],
+        }
+
+    def __len__(self):
+        return len(self.instances)
+
+    def __repr__(self):
+        return '<Application %s (%d instances)>' % (self.name, len(self.instances))
@@ -0,0 +1,109 @@
+"""
+    Secondary indexes over the local registry
+"""
+
+INDEXED_FIELDS = ('app', 'vip', 'svip', 'zone', 'status')
+
+
+def _vips(value):
+    return [vip for vip in (value or '').split(',') if vip]
+
+
+class RegistryIndex(object):
+    """
+    Instances of the registry indexed by application, VIP address, secure VIP
+    address, availability zone, status and the chosen metadata keys. Every
+    index maps a value to the ``{instance id: instance}`` having it, so that
+    instances are added and removed in constant time as deltas are applied,
+    and a query only intersects the postings of its criteria, starting with
+    the smallest one.
+    """
+
+    def __init__(self, metadata_keys=()):
+        self.metadata_keys = tuple(metadata_keys)
+        self.instances = {}
+        self._instance_app = {}
+        self._indexes = dict((field, {}) for field in INDEXED_FIELDS)
+        self._indexes.update((('metadata', key), {}) for key in self.metadata_keys)
+
+    def _keys(self, instance, app):
+        yield 'app', app
+        for vip in _vips(instance.vip_address):
+            yield 'vip', vip
+        for vip in _vips(instance.secure_vip_address):
+            yield 'svip', vip
+        yield 'zone', instance.zone
+        yield 'status', instance.status
+        if instance.metadata:
+            for key in self.metadata_keys:
+                value = instance.metadata.get(key)
+                if value is not None:
+                    yield ('metadata', key), value
+
+    def add(self, instance, app=None):
+        """
+        Index an instance of ``app`` (by default its own ``app``), replacing
+        the one with the same instance id
+        """
+        self.remove(instance)
+        app = (app or instance.app or '').upper()
+        self.instances[instance.instance_id] = instance
+        self._instance_app[instance.instance_id] = app
+        for field, value in self._keys(instance, app):
+            self._indexes[field].setdefault(value, {})[instance.instance_id] = instance
+
+    def remove(self, instance):
+        """
+        Remove the indexed instance having the instance id of ``instance``
+        """
+        instance = self.instances.pop(instance.instance_id, None)
+        if instance is None:
+            return
+        app = self._instance_app.pop(instance.instance_id)
+        for field, value in self._keys(instance, app):
+            postings = self._indexes[field].get(value)
+            if postings is not None:
+                postings.pop(instance.instance_id, None)
+                if not postings:
+                    del self._indexes[field][value]
+
+    def app(self, instance_id):
+        return self._instance_app.get(instance_id)
+
+    def query(self, app=None, vip=None, svip=None, zone=None, status=None, metadata=None):
+        """
+        Instances matching every given criterion. ``metadata`` maps metadata
+        keys to values, the keys that are not indexed are filtered on the
+        instances selected by the other criteria.
+        """
+        criteria = [('app', app.upper() if app is not None else None), ('vip', vip), ('svip', svip),
+                    ('zone', zone), ('status', status)]
+        unindexed = []
+        for key, value in (metadata or {}).items():
+            if ('metadata', key) in self._indexes:
+                criteria.append((('metadata', key), value))
+            else:
+                unindexed.append((key, value))
+        postings = []
+        for field, value in criteria:
+            if value is None:
+                continue
+            matches = self._indexes[field].get(value)
+            if not matches:
+                return []
+            postings.append(matches)
+        if not postings:
+            candidates = self.instances.values()
+        else:
+            postings.sort(key=len)
+            others = postings[1:]
+            candidates = [instance for instance_id, instance in postings[0].items()
+                          if all(instance_id in other for other in others)]
+        if unindexed:
+            candidates = [instance for instance in candidates
+                          if instance.metadata and all(instance.metadata.get(key) == value
+                                                       for key, value in unindexed)]
+        return list(candidates)
+
+    def __len__(self):
+        return len(self.instances)
@@ -0,0 +1,454 @@
+"""
+    Local registry cache
+"""
+
+import logging
+import threading
+import time
+
+from .model import Application, InstanceInfo, as_list, freeze
+from .query import RegistryIndex
+from .snapshot import LeaderLock, SnapshotError, SnapshotReader, signature, write_snapshot
+from .subscriptions import ApplicationChange, ChangeDispatcher, diff_applications
+
+logger = logging.getLogger('service.eureka')
+
+
+def reconcile_hashcode(instances):
+    """
+    Compute the Eureka reconcile hash code (``STATUS_COUNT_`` for every status,
+    sorted by status name) for an iterable of instances.
+    """
+    counts = {}
+    for instance in instances:
+        status = instance.status
+        counts[status] = counts.get(status, 0) + 1
+    return ''.join('%s_%s_' % (status, counts[status]) for status in sorted(counts))
+
+
+class RegistryCache(object):
+    """
+    In memory copy of the Eureka registry, held as :class:`Application` and
+    :class:`InstanceInfo` objects and rendered back to the registry response
+    shapes by the lookups.
+
+    The registry is loaded with one full fetch of ``apps`` and then kept up to
+    date with periodic ``apps/delta`` fetches on a background thread. After
+    every delta the local ``apps__hashcode`` is compared with the one sent by
+    the server, and a full fetch is done when they differ.
+
+    The applications subscribed to on ``changes`` are diffed on every
+    refresh: from the delta itself, or by comparing the versions of the old
+    and new copies of each subscribed application after a full fetch.
+
+    The VIP, instance and :meth:`query` lookups use a :class:`RegistryIndex`
+    built on first use and then kept up to date by every refresh.
+    """
+
+    def __init__(self, fetch, refresh_interval=30, stream=None, snapshot_path=None, persist_path=None,
+                 index_metadata=()):
+        """
+        :param fetch: callable taking an endpoint (``apps``, ``apps/delta``)
+                      and returning the decoded JSON response
+        :param refresh_interval: seconds between delta fetches
+        :param stream: optional callable taking an endpoint and returning an
+                       ApplicationStream, used for full fetches
+        :param snapshot_path: optional file shared by the worker processes of
+                              a host. One process elected with a file lock
+                              fetches from Eureka and writes the snapshot,
+                              the others map it instead of fetching.
+        :param persist_path: optional file the last fetched registry is
+                             written to, and served from at construction
+                             until the first live fetch succeeds
+        :param index_metadata: metadata keys indexed for :meth:`query`
+        """
+        self._fetch = fetch
+        self._stream = stream
+        self.refresh_interval = refresh_interval
+        self.snapshot_path = snapshot_path
+        self.persist_path = persist_path
+        self._leader = LeaderLock(snapshot_path + '.lock') if snapshot_path else None
+        self._snapshot = None
+        self._written = None
+        self._write_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._apps = {}
+        self._instance_app = {}
+        self._up = {}
+        self._rendered = {}
+        self.index_metadata = tuple(index_metadata)
+        self._index = None
+        self._stop = threading.Event()
+        self.refresh_task = None
+        self.version = None
+        self.last_refresh = None
+        self.ready = False
+        self.changes = ChangeDispatcher()
+        if persist_path:
+            self.load_snapshot(persist_path)
+
+    @property
+    def is_leader(self):
+        return self._leader is None or self._leader.held
+
+    def start(self):
+        """
+        Fetch the full registry and start the background delta fetches
+        """
+        if self.refresh_task is not None:
+            return
+        try:
+            self.refresh()
+        except Exception as ex:
+            logger.warning("Initial registry fetch failed: %s" % str(ex))
+        self._stop.clear()
+        self.refresh_task = threading.Thread(target=self._refresh_loop)
+        self.refresh_task.daemon = True
+        self.refresh_task.start()
+
+    def stop(self):
+        self._stop.set()
+        self.refresh_task = None
+        self.changes.stop()
+        if self._leader is not None:
+            self._leader.release()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as ex:
+                logger.debug("Exception during registry refresh: %s" % str(ex))
+
+    def refresh(self):
+        """
+        Apply a delta, falling back to a full fetch when we have no registry
+        yet or when the hash codes do not match afterwards. With a shared
+        snapshot, processes that are not the leader reload the snapshot
+        instead.
+        """
+        if self._leader is not None and not self._leader.try_acquire():
+            self.load_snapshot()
+            return
+        if not self.ready or self._snapshot is not None:
+            self.fetch_full()
+        else:
+            self.fetch_delta()
+        self.write_snapshot()
+
+    def load_snapshot(self, path=None):
+        """
+        Map a snapshot, the shared one by default, if it was replaced since it
+        was last loaded
+        """
+        path = path or self.snapshot_path
+        current = signature(path)
+        if current is None or (self._snapshot is not None and self._snapshot.signature == current):
+            return
+        try:
+            reader = SnapshotReader(path)
+        except (IOError, OSError, SnapshotError) as ex:
+            logger.debug("Cannot load registry snapshot %s: %s" % (path, str(ex)))
+            return
+        with self._lock:
+            apps = {}
+            changes = []
+            for name in self.changes.watched():
+                if name in reader:
+                    apps[name] = reader.application(name)
+                changes.append(diff_applications(name, self._app(name), apps.get(name)))
+            previous = self._snapshot
+            self._snapshot = reader
+            self._apps = apps
+            self._instance_app = reader.instances
+            self._up = {}
+            self._rendered = {}
+            self._index = None
+            self.version = reader.version
+            self.last_refresh = time.time()
+            self.ready = True
+            if previous is not None:
+                previous.close()
+        self.changes.publish(changes)
+        logger.debug("Loaded registry snapshot: %d applications" % len(reader.apps))
+
+    def write_snapshot(self):
+        """
+        Write a live registry to the shared and persisted snapshots when it
+        changed since the last write. The applications are copied under the
+        lock and encoded outside of it, so lookups are not held up meanwhile.
+        """
+        paths = [path for path in (self.snapshot_path, self.persist_path) if path]
+        if not paths:
+            return
+        with self._write_lock:
+            with self._lock:
+                if self._snapshot is not None:
+                    return
+                written = (self.version, self.hashcode())
+                if written == self._written:
+                    return
+                applications = [application.copy() for application in self._apps.values()]
+            for path in paths:
+                try:
+                    write_snapshot(path, applications, *written)
+                except (IOError, OSError) as ex:
+                    logger.warning("Cannot write registry snapshot %s: %s" % (path, str(ex)))
+            self._written = written
+
+    def fetch_full(self):
+        if self._stream is not None:
+            applications = self._stream('apps')
+            self._load(applications, lambda: applications.versions_delta)
+        else:
+            applications = self._fetch('apps').get('applications', {})
+            self._load(as_list(applications.get('application')), lambda: applications.get('versions__delta'))
+
+    def _load(self, applications, version):
+        apps = {}
+        instance_app = {}
+        for application in applications:
+            application = Application.from_dict(application)
+            for instance_id in application.instances:
+                instance_app[instance_id] = application.name
+            if application.instances:
+                apps[application.name] = application
+        index = None
+        if self._index is not None:
+            index = self._build_index(apps.values())
+        with self._lock:
+            changes = [diff_applications(name, self._app(name), apps.get(name)) for name in self.changes.watched()]
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+            self._apps = apps
+            self._instance_app = instance_app
+            self._up = {}
+            self._rendered = {}
+            self._index = index
+            self.version = version()
+            self.last_refresh = time.time()
+            self.ready = True
+        self.changes.publish(changes)
+        logger.debug("Fetched full registry: %d applications" % len(apps))
+
+    def fetch_delta(self):
+        applications = self._fetch('apps/delta').get('applications', {})
+        changes = {}
+        with self._lock:
+            watched = self.changes.watched()
+            for application in as_list(applications.get('application')):
+                name = application['name'].upper()
+                for instance in as_list(application.get('instance')):
+                    instance = InstanceInfo.from_dict(instance)
+                    previous = self._apply(name, instance)
+                    self._up = {}
+                    self._rendered = {}
+                    if name in watched:
+                        if name not in changes:
+                            changes[name] = ApplicationChange(name)
+                        changes[name].record(previous, instance if instance.action_type != 'DELETED' else None)
+            local_hashcode = self.hashcode()
+            self.version = applications.get('versions__delta')
+            self.last_refresh = time.time()
+        self.changes.publish(changes.values())
+        remote_hashcode = applications.get('apps__hashcode')
+        if remote_hashcode is not None and remote_hashcode != local_hashcode:
+            logger.info("Registry hash code mismatch (local %s, remote %s), fetching full registry" % (
+                local_hashcode, remote_hashcode))
+            self.fetch_full()
+
+    def _apply(self, name, instance):
+        """
+        Apply one delta instance, returning the instance it replaced or removed
+        """
+        instance_id = instance.instance_id
+        application = self._apps.get(name)
+        if instance.action_type == 'DELETED':
+            previous = None
+            if application is not None:
+                previous = application.pop(instance_id)
+                if not application.instances:
+                    del self._apps[name]
+            self._instance_app.pop(instance_id, None)
+            if previous is not None and self._index is not None:
+                self._index.remove(previous)
+            return previous
+        if application is None:
+            application = self._apps[name] = Application(name)
+        self._instance_app[instance_id] = name
+        if self._index is not None:
+            self._index.add(instance, name)
+        return application.put(instance)
+
+    def _app(self, name):
+        """
+        Application by upper case name, decoded from the snapshot on first use
+        """
+        application = self._apps.get(name)
+        if application is None and self._snapshot is not None and name in self._snapshot:
+            application = self._apps[name] = self._snapshot.application(name)
+        return application
+
+    def _applications(self):
+        if self._snapshot is not None and len(self._apps) < len(self._snapshot.apps):
+            for name in self._snapshot.apps:
+                self._app(name)
+        return self._apps.values()
+
+    def _build_index(self, applications):
+        index = RegistryIndex(self.index_metadata)
+        for application in applications:
+            for instance in application.instances.values():
+                index.add(instance, application.name)
+        return index
+
+    def _indexed(self):
+        if self._index is None:
+            self._index = self._build_index(self._applications())
+        return self._index
+
+    def query(self, app_id=None, vip_address=None, secure_vip_address=None, zone=None, status=None,
+              metadata=None):
+        """
+        :class:`InstanceInfo` matching every given criterion, looked up in the
+        indexes. See :meth:`RegistryIndex.query`.
+        """
+        with self._lock:
+            return self._indexed().query(app=app_id, vip=vip_address, svip=secure_vip_address, zone=zone,
+                                         status=status, metadata=metadata)
+
+    def size(self):
+        """
+        Number of applications and instances held
+        """
+        with self._lock:
+            applications = len(self._snapshot.apps) if self._snapshot is not None else len(self._apps)
+            return applications, len(self._instance_app)
+
+    def hashcode(self):
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.hashcode is not None:
+                return self._snapshot.hashcode
+            return reconcile_hashcode(
+                instance for application in self._applications() for instance in application.instances.values())
+
+    def _render(self, key, build):
+        """
+        Registry response of a lookup, rendered once and memoized until the
+        registry changes. ``build`` returns None when nothing matches. The
+        response is shared by every caller and therefore read-only.
+        """
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            with self._lock:
+                rendered = build()
+                if rendered is not None:
+                    rendered = self._rendered[key] = freeze(rendered)
+        return rendered
+
+    def get_apps(self):
+        return self._render(('apps',), lambda: {
+            'applications': {
+                'versions__delta': self.version,
+                'apps__hashcode': self.hashcode(),
+                'application': [application.to_dict() for application in self._applications()],
+            }
+        })
+
+    def get_app(self, app_id):
+        name = app_id.upper()
+
+        def build():
+            application = self._app(name)
+            return {'application': application.to_dict()} if application is not None else None
+        return self._render(('app', name), build)
+
+    def _get_by_vip(self, field, vip_address):
+        return self._render((field, vip_address), lambda: self._render_vip(field, vip_address))
+
+    def _render_vip(self, field, vip_address):
+        with self._lock:
+            matches = {}
+            index = self._indexed()
+            for instance in index.query(**{field: vip_address}):
+                matches.setdefault(index.app(instance.instance_id), []).append(instance)
+            if not matches:
+                return None
+            applications = [self._app(name).to_dict(instances) for name, instances in matches.items()]
+            return {'applications': {'versions__delta': self.version, 'application': applications}}
+
+    def get_vip(self, vip_address):
+        return self._get_by_vip('vip', vip_address)
+
+    def get_svip(self, vip_address):
+        return self._get_by_vip('svip', vip_address)
+
+    def get_instance(self, instance_id):
+        def build():
+            name = self._instance_app.get(instance_id)
+            if name is None:
+                return None
+            return {'instance': self._app(name).instances[instance_id].to_dict()}
+        return self._render(('instance', instance_id), build)
+
+    def get_app_instance(self, app_id, instance_id):
+        name = app_id.upper()
+
+        def build():
+            application = self._app(name)
+            instance = application.instances.get(instance_id) if application is not None else None
+            return {'instance': instance.to_dict()} if instance is not None else None
+        return self._render(('app_instance', name, instance_id), build)
+
+    def _get_all(self, key, select):
+        instances = self._up.get(key)
+        if instances is None:
+            with self._lock:
+                instances = self._up[key] = tuple(select())
+        return instances
+
+    def get_instances(self, app_id):
+        """
+        :class:`InstanceInfo` of an application whatever their status,
+        memoized until the registry changes
+        """
+        name = app_id.upper()
+
+        def select():
+            application = self._app(name)
+            return application.instances.values() if application is not None else ()
+        return self._get_all(('all', name), select)
+
+    def get_vip_instances(self, vip_address):
+        """
+        Instances registered under a VIP address whatever their status,
+        memoized until the registry changes
+        """
+        return self._get_all(('all-vip', vip_address), lambda: self._indexed().query(vip=vip_address))
+
+    def _get_up(self, key, select):
+        up = self._up.get(key)
+        if up is None:
+            with self._lock:
+                up = tuple(instance for instance in select() if instance.status == 'UP')
+                self._up[key] = up
+        return up
+
+    def get_up_instances(self, app_id):
+        """
+        UP :class:`InstanceInfo` of an application, memoized until the registry changes
+        """
+        name = app_id.upper()
+
+        def select():
+            application = self._app(name)
+            return application.instances.values() if application is not None else ()
+        return self._get_up(('app', name), select)
+
+    def get_up_vip_instances(self, vip_address):
+        """
+        UP instances registered under a VIP address, memoized until the
+        registry changes
+        """
+        return self._get_up(('vip', vip_address), lambda: self._indexed().query(vip=vip_address))
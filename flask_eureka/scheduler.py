@@ -0,0 +1,170 @@
+"""
+    Shared task scheduler
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('service.eureka')
+
+
+class ScheduledTask(object):
+    """
+    Handle of a scheduled call, periodic when ``interval`` is set
+    """
+
+    def __init__(self, fn, args, interval=None, jitter=0.0):
+        self.fn = fn
+        self.args = args
+        self.interval = interval
+        self.jitter = jitter
+        self.when = None
+        self.running = False
+        self.cancelled = False
+
+    def next_delay(self):
+        if not self.jitter:
+            return self.interval
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            self.fn(*self.args)
+        except Exception as ex:
+            logger.debug("Exception in scheduled task %s: %s" % (self.fn, str(ex)))
+        finally:
+            self.running = False
+
+
+DEFAULT_MAX_WORKERS = 4
+
+_fork_lock = threading.Lock()
+
+
+class Scheduler(object):
+    """
+    Runs delayed and periodic calls for every client of the process from one
+    timer thread backed by a heap. Calls are executed on a small worker pool
+    so a slow one does not delay the others; a periodic call is skipped while
+    its previous run is still in progress. In a forked child the timer
+    thread is started again on the next call, the tasks of the parent being
+    left to the parent.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._heap = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._pid = os.getpid()
+
+    def call_later(self, delay, fn, *args):
+        """
+        Call ``fn(*args)`` once, ``delay`` seconds from now
+        """
+        task = ScheduledTask(fn, args)
+        self._schedule(task, delay)
+        return task
+
+    def call_every(self, interval, fn, *args, **kwargs):
+        """
+        Call ``fn(*args)`` every ``interval`` seconds
+
+        :param jitter: fraction of the interval each period is randomly
+                       shortened or lengthened by, so that many tasks with the
+                       same interval do not fire together
+        :param first_delay: delay of the first call, one period by default
+        """
+        jitter = kwargs.pop('jitter', 0.0)
+        first_delay = kwargs.pop('first_delay', None)
+        task = ScheduledTask(fn, args, interval=interval, jitter=jitter)
+        self._schedule(task, task.next_delay() if first_delay is None else first_delay)
+        return task
+
+    def _schedule(self, task, delay):
+        if self._pid != os.getpid():
+            self._forked()
+        with self._condition:
+            task.when = time.time() + delay
+            heapq.heappush(self._heap, (task.when, next(self._seq), task))
+            if self._thread is None or not self._thread.is_alive():
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                self._thread = threading.Thread(target=self._run, name='eureka-scheduler')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def _forked(self):
+        """
+        Forget the timer thread and workers of the parent process, they do not
+        exist in the child, nor may a lock they held be released there
+        """
+        with _fork_lock:
+            if self._pid != os.getpid():
+                self._condition = threading.Condition()
+                self._heap = []
+                self._thread = self._executor = None
+                self._pid = os.getpid()
+
+    def _run(self):
+        with self._condition:
+            while self._thread is threading.current_thread():
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                _, _, task = heapq.heappop(self._heap)
+                if task.cancelled:
+                    continue
+                if not task.running:
+                    task.running = True
+                    self._executor.submit(task.run)
+                if task.interval is not None:
+                    task.when += task.next_delay()
+                    heapq.heappush(self._heap, (task.when, next(self._seq), task))
+
+    def stop(self, timeout=None):
+        """
+        Stop the timer thread and the workers, pending calls are dropped
+        """
+        with self._condition:
+            thread, executor = self._thread, self._executor
+            self._thread = self._executor = None
+            self._heap = []
+            self._condition.notify()
+        if thread is not None:
+            thread.join(timeout)
+            executor.shutdown(wait=True)
+
+    def __len__(self):
+        return sum(1 for _, _, task in self._heap if not task.cancelled)
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler():
+    """
+    Scheduler shared by every client of the process
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler()
+        return _default_scheduler
@@ -0,0 +1,160 @@
+"""
+    Eureka server health tracking
+"""
+
+import threading
+import time
+
+
+class ServerState(object):
+    """
+    Circuit breaker and health score of one eureka server.
+
+    The circuit opens after ``failure_threshold`` consecutive failures. Once
+    ``reset_timeout`` seconds have passed a single half-open probe is let
+    through, closing the circuit on success and re-opening it on failure.
+    Latency and error rate are tracked as exponentially weighted moving
+    averages.
+    """
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    def __init__(self, url, failure_threshold=3, reset_timeout=30, alpha=0.3):
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.alpha = alpha
+        self.state = ServerState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.latency = None
+        self.error_rate = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_success = None
+
+    def available(self, now):
+        """
+        Whether a request may be sent without changing the breaker state
+        """
+        if self.state == ServerState.CLOSED:
+            return True
+        if self.state == ServerState.OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        return False
+
+    def acquire(self, now):
+        """
+        Claim the right to send a request, moving an expired open circuit to
+        half-open so that only one probe is in flight
+        """
+        if self.state == ServerState.CLOSED:
+            return True
+        if self.state == ServerState.OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = ServerState.HALF_OPEN
+            return True
+        return False
+
+    def score(self):
+        """
+        Lower is better: latency EWMA penalised by the error rate EWMA
+        """
+        return (self.latency or 0.0) * (1 + 10 * self.error_rate) + self.error_rate
+
+    def record_success(self, latency, now):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.last_success = now
+        self.latency = latency if self.latency is None else \
+            self.alpha * latency + (1 - self.alpha) * self.latency
+        self.error_rate = (1 - self.alpha) * self.error_rate
+        self.state = ServerState.CLOSED
+        self.opened_at = None
+
+    def record_failure(self, error, now):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        if self.state == ServerState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = ServerState.OPEN
+            self.opened_at = now
+
+    def as_dict(self):
+        return {
+            'url': self.url,
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'successes': self.successes,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'last_success': self.last_success,
+            'opened_at': self.opened_at,
+        }
+
+
+class ServerHealth(object):
+    """
+    Health table of the eureka servers. Reads stick to the current server as
+    long as its circuit is closed and move to the best scored healthy server
+    otherwise.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30, alpha=0.3):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._states = {}
+        self.current = None
+
+    def state(self, url):
+        state = self._states.get(url)
+        if state is None:
+            with self._lock:
+                state = self._states.setdefault(url, ServerState(
+                    url, self.failure_threshold, self.reset_timeout, self.alpha))
+        return state
+
+    def candidates(self, urls):
+        """
+        Servers to try in order: the sticky current server, then healthy
+        servers by score, then servers due for a half-open probe. Servers with
+        an open circuit are left out.
+        """
+        now = time.time()
+        states = [self.state(url) for url in urls]
+        for url in list(self._states):
+            if url not in urls:
+                self._states.pop(url, None)
+        closed = sorted((state for state in states if state.state == ServerState.CLOSED),
+                        key=ServerState.score)
+        probes = [state for state in states if state.state != ServerState.CLOSED and state.available(now)]
+        ordered = closed + probes
+        current = self._states.get(self.current)
+        if current is not None and current.state == ServerState.CLOSED:
+            ordered.remove(current)
+            ordered.insert(0, current)
+        return ordered
+
+    def acquire(self, state):
+        with self._lock:
+            return state.acquire(time.time())
+
+    def record_success(self, state, latency):
+        with self._lock:
+            state.record_success(latency, time.time())
+            self.current = state.url
+
+    def record_failure(self, state, error):
+        with self._lock:
+            state.record_failure(error, time.time())
+            if self.current == state.url:
+                self.current = None
+
+    def as_list(self, urls):
+        return [self.state(url).as_dict() for url in urls]
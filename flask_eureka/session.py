@@ -0,0 +1,170 @@
+"""
+    Outbound calls to services discovered through Eureka
+"""
+
+import json
+import logging
+import threading
+
+import urllib3
+
+try:
+    # for python3
+    from urllib.parse import urlencode
+except ImportError:
+    # for python2
+    from urllib import urlencode
+
+from .eurekaclient import EurekaNoInstanceAvailableException
+from .httpclient import ApiException, RESTResponse
+
+logger = logging.getLogger('service.eureka')
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+# errors raised before the request was sent, safe to retry for any method
+CONNECT_ERRORS = (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError)
+
+
+def instance_base_url(instance, secure=False):
+    host = instance.host_name or instance.ip_addr
+    if secure:
+        return 'https://%s:%s' % (host, instance.secure_port or 443)
+    return 'http://%s:%s' % (host, instance.port or 80)
+
+
+class ServiceSession(object):
+    """
+    Calls the instances of one application. Instances are chosen with the
+    load balancer of the :class:`Eureka` extension, every instance gets its
+    own keep-alive connection pool and the pools of instances that left the
+    registry are closed. Requests that fail to connect are retried on
+    another instance, as are idempotent requests failing afterwards.
+    """
+
+    def __init__(self, eureka, app_id, secure=False, retries=2, pool_maxsize=10,
+                 connect_timeout=3.0, read_timeout=10.0):
+        """
+        :param eureka: :class:`Eureka` extension used to resolve instances
+        :param app_id: eureka application id to call
+        :param secure: call the secure port over https
+        :param retries: number of other instances tried after a failure
+        :param pool_maxsize: connections kept per instance
+        """
+        self.eureka = eureka
+        self.app_id = app_id
+        self.secure = secure
+        self.retries = retries
+        self.pool_maxsize = pool_maxsize
+        self.timeout = urllib3.Timeout(connect=connect_timeout, read=read_timeout)
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._instances = None
+
+    def _evict(self, instances):
+        """
+        Close the pools of instances missing from ``instances``. The UP
+        instances are memoized by the registry, so this only runs when they
+        changed.
+        """
+        if instances is self._instances:
+            return
+        with self._lock:
+            self._instances = instances
+            current = set(instance.instance_id for instance in instances)
+            for instance_id in [instance_id for instance_id in self._pools if instance_id not in current]:
+                logger.debug("Closing connection pool of %s" % instance_id)
+                self._pools.pop(instance_id)[1].close()
+
+    def _pool(self, instance):
+        base_url = instance_base_url(instance, self.secure)
+        with self._lock:
+            entry = self._pools.get(instance.instance_id)
+            if entry is None or entry[0] != base_url:
+                if entry is not None:
+                    entry[1].close()
+                entry = (base_url, urllib3.connection_from_url(base_url, maxsize=self.pool_maxsize,
+                                                               block=False, timeout=self.timeout))
+                self._pools[instance.instance_id] = entry
+            return entry[1]
+
+    def _choose(self, tried):
+        """
+        Instance not tried yet, None when every UP instance was
+        """
+        instances = self.eureka.up_instances(self.app_id)
+        self._evict(instances)
+        untried = tuple(instance for instance in instances if instance.instance_id not in tried)
+        if not untried:
+            return None
+        return self.eureka.load_balancer.choose(self.app_id, untried)
+
+    def request(self, method, path, query_params=None, headers=None, body=None):
+        """
+        :param method: http request method
+        :param path: path of the request on the chosen instance
+        :param query_params: query parameters in the url
+        :param headers: http request headers
+        :param body: bytes sent as is, other values are sent as json
+        """
+        method = method.upper()
+        headers = dict(headers or {})
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf8')
+            headers.setdefault('Content-Type', 'application/json')
+        if query_params:
+            path += '?' + urlencode(query_params)
+
+        tried = set()
+        error = None
+        while True:
+            instance = self._choose(tried)
+            if instance is None:
+                # every instance failed: report why rather than their absence
+                if error is not None:
+                    raise error
+                raise EurekaNoInstanceAvailableException("No UP instance available for %s" % self.app_id)
+            tried.add(instance.instance_id)
+            try:
+                r = self._pool(instance).urlopen(method, path, body=body, headers=headers, retries=False)
+            except urllib3.exceptions.HTTPError as ex:
+                retry = len(tried) <= self.retries and (
+                    method in IDEMPOTENT_METHODS or isinstance(ex, CONNECT_ERRORS))
+                logger.debug("%s %s on %s failed: %s" % (method, path, instance.instance_id, str(ex)))
+                error = ApiException(status=0, reason="{0}\n{1}".format(type(ex).__name__, str(ex)))
+                if not retry:
+                    raise error
+                continue
+            finally:
+                self.eureka.release(instance)
+
+            r = RESTResponse(r)
+            if r.status not in range(200, 206):
+                raise ApiException(http_resp=r)
+            return r
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def head(self, path, **kwargs):
+        return self.request('HEAD', path, **kwargs)
+
+    def options(self, path, **kwargs):
+        return self.request('OPTIONS', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for base_url, pool in self._pools.values():
+                pool.close()
+            self._pools = {}
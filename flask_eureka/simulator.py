@@ -0,0 +1,222 @@
+"""
+    Heartbeat simulator: many EurekaClient registrations in one process
+    against a stub (or a real) Eureka server.
+
+    python -m flask_eureka.simulator --instances 5000 --heartbeat-interval 10 --duration 60 --wipe-at 30
+
+    With the in process stub, the CPU figures include the share of the stub
+    server answering the calls.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from .eurekaclient import EurekaClient
+from .metrics import Metrics
+from .scheduler import Scheduler
+from .stubserver import StubEureka
+
+
+class RecordingMetrics(Metrics):
+    """
+    Metrics also keeping every (time, duration, success) of each operation,
+    for exact percentiles
+    """
+
+    def __init__(self):
+        super(RecordingMetrics, self).__init__()
+        self.calls = {}
+
+    def record(self, operation, server, started, success):
+        super(RecordingMetrics, self).record(operation, server, started, success)
+        self.calls.setdefault(operation, []).append((started, time.time() - started, success))
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def summarize(calls, since=None, until=None):
+    selected = [(duration, success) for started, duration, success in calls
+                if (since is None or started >= since) and (until is None or started < until)]
+    durations = sorted(duration for duration, _ in selected)
+    return {
+        'calls': len(selected),
+        'errors': sum(1 for _, success in selected if not success),
+        'p50_ms': _ms(percentile(durations, 0.5)),
+        'p90_ms': _ms(percentile(durations, 0.9)),
+        'p99_ms': _ms(percentile(durations, 0.99)),
+        'max_ms': _ms(durations[-1] if durations else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1e3, 3)
+
+
+def _cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Simulation(object):
+    """
+    Registers ``instances`` clients sharing one scheduler and one metrics
+    recorder, lets them heartbeat for ``duration`` seconds and optionally
+    wipes the stub server's registrations at ``wipe_at`` seconds to provoke
+    the renew 404 -> register storm.
+    """
+
+    def __init__(self, instances, heartbeat_interval=30, duration=60, wipe_at=None, workers=32,
+                 latency=0.0, failure_rate=0.0, jitter=0.1, eureka_url=None):
+        if wipe_at is not None and eureka_url:
+            raise ValueError('wipe_at needs the in process stub server, not %s' % eureka_url)
+        self.instances = instances
+        self.heartbeat_interval = heartbeat_interval
+        self.duration = duration
+        self.wipe_at = wipe_at
+        self.workers = workers
+        self.jitter = jitter
+        self.stub = None if eureka_url else StubEureka(latency=latency, failure_rate=failure_rate)
+        self.eureka_url = eureka_url or self.stub.url
+        self.metrics = RecordingMetrics()
+        self.scheduler = Scheduler(max_workers=workers)
+        self.clients = []
+
+    def _client(self, index):
+        client = EurekaClient(name='SIM-%d' % (index % 100), host_name='sim-%d' % index,
+                              instance_id='sim-%d' % index, port=8080, eureka_url=self.eureka_url,
+                              use_dns=False, heartbeat_interval=self.heartbeat_interval,
+                              heartbeat_jitter=self.jitter, scheduler=self.scheduler,
+                              metrics=self.metrics, pool_maxsize=self.workers, status_update_delay=0)
+        client.eureka_urls = [self.eureka_url]
+        return client
+
+    def run(self):
+        if self.stub is not None:
+            self.stub.start()
+        try:
+            return self._run()
+        finally:
+            self.scheduler.stop(timeout=5)
+            if self.stub is not None:
+                self.stub.stop()
+
+    def _run(self):
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        self.clients = [self._client(index) for index in range(self.instances)]
+        memory = tracemalloc.get_traced_memory()[0] - memory_before
+        tracemalloc.stop()
+
+        cpu_before = _cpu_seconds()
+        started = time.time()
+        for client in self.clients:
+            client.register()
+            # spread the first heartbeats over one interval, like instances
+            # started at different times
+            client.heartbeat_task = self.scheduler.call_every(
+                self.heartbeat_interval, client._heartbeat, jitter=self.jitter,
+                first_delay=random.uniform(0, self.heartbeat_interval))
+        registered = time.time()
+        cpu_registration = _cpu_seconds() - cpu_before
+
+        wiped = None
+        recovered = None
+        deadline = registered + self.duration
+        while time.time() < deadline:
+            if self.wipe_at is not None and wiped is None and time.time() >= registered + self.wipe_at:
+                self.stub.wipe()
+                wiped = time.time()
+            if wiped is not None and recovered is None and self.stub.instance_count() >= self.instances:
+                recovered = time.time()
+            time.sleep(0.05)
+        for client in self.clients:
+            client.stop()
+        finished = time.time()
+        cpu = _cpu_seconds() - cpu_before
+
+        renew = self.metrics.calls.get('renew', [])
+        register = self.metrics.calls.get('register', [])
+        report = {
+            'instances': self.instances,
+            'heartbeat_interval': self.heartbeat_interval,
+            'registration_seconds': round(registered - started, 3),
+            'heartbeats_per_second': round(
+                len([call for call in renew if call[0] >= registered]) / (finished - registered), 1),
+            'expected_heartbeats_per_second': round(self.instances / float(self.heartbeat_interval), 1),
+            'renew': summarize(renew, since=registered),
+            'register': summarize(register, until=registered),
+            'cpu_seconds': round(cpu, 3),
+            'cpu_ms_per_instance_registration': round(cpu_registration / self.instances * 1e3, 3),
+            'cpu_us_per_heartbeat': round((cpu - cpu_registration) / max(len(renew), 1) * 1e6, 1),
+            'memory_bytes_per_instance': memory // self.instances,
+        }
+        if resource is not None:
+            report['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+        if wiped is not None:
+            storm = [call for call in register if call[0] >= wiped]
+            per_second = {}
+            for call in storm:
+                second = int(call[0] - wiped)
+                per_second[second] = per_second.get(second, 0) + 1
+            report['wipe'] = {
+                'reregistrations': len(storm),
+                'peak_registrations_per_second': max(per_second.values()) if per_second else 0,
+                'recovery_seconds': round(recovered - wiped, 3) if recovered is not None else None,
+                'register': summarize(register, since=wiped),
+                'renew': summarize(renew, since=wiped),
+            }
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate many Eureka clients heartbeating in one process')
+    parser.add_argument('--instances', type=int, default=1000)
+    parser.add_argument('--heartbeat-interval', type=float, default=30)
+    parser.add_argument('--duration', type=float, default=60, help='seconds of heartbeats after registration')
+    parser.add_argument('--wipe-at', type=float, help='seconds after registration the stub forgets everyone')
+    parser.add_argument('--workers', type=int, default=32, help='scheduler worker threads')
+    parser.add_argument('--jitter', type=float, default=0.1, help='heartbeat jitter, fraction of the interval')
+    parser.add_argument('--latency', type=float, default=0.0, help='stub server reply delay in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of stub replies failing')
+    parser.add_argument('--eureka-url', help='use this eureka server instead of the in process stub')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+    if args.wipe_at is not None and args.eureka_url:
+        parser.error('--wipe-at cannot be combined with --eureka-url, it needs the in process stub server')
+
+    report = Simulation(args.instances, heartbeat_interval=args.heartbeat_interval, duration=args.duration,
+                        wipe_at=args.wipe_at, workers=args.workers, latency=args.latency,
+                        failure_rate=args.failure_rate, jitter=args.jitter, eureka_url=args.eureka_url).run()
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        _print(report)
+
+
+def _print(report, indent=''):
+    for key, value in sorted(report.items()):
+        if isinstance(value, dict):
+            print('%s%s:' % (indent, key))
+            _print(value, indent + '  ')
+        else:
+            print('%s%-36s %s' % (indent, key, value))
+
+
+if __name__ == '__main__':
+    main()
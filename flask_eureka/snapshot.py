@@ -0,0 +1,142 @@
+"""
+    Memory mapped registry snapshots
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .jsonstream import loads
+from .model import Application
+
+MAGIC = b'FEKS'
+FORMAT_VERSION = 1
+# magic, format version, index offset, index length
+HEADER = struct.Struct('<4sIQQ')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def write_snapshot(path, applications, version=None, hashcode=None):
+    """
+    Atomically write a registry snapshot: one compact JSON blob per
+    application followed by an index of their offsets. Readers mapping the
+    previous file keep seeing it until they open the new one.
+
+    :param applications: iterable of :class:`Application`
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.eureka-snapshot-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0))
+            offset = HEADER.size
+            apps = {}
+            instances = {}
+            for application in applications:
+                blob = json.dumps(application.to_dict(), separators=(',', ':')).encode('utf8')
+                f.write(blob)
+                apps[application.name] = (offset, len(blob))
+                offset += len(blob)
+                for instance_id in application.instances:
+                    instances[instance_id] = application.name
+            index = json.dumps({'versions__delta': version, 'apps__hashcode': hashcode,
+                                'apps': apps, 'instances': instances}, separators=(',', ':')).encode('utf8')
+            f.write(index)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, offset, len(index)))
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+class SnapshotReader(object):
+    """
+    Read only view of a snapshot file. The file is memory mapped and an
+    application is decoded only when it is asked for, so the pages of a file
+    shared by several processes are held once by the OS page cache.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < HEADER.size:
+                raise SnapshotError("%s is not a registry snapshot" % path)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.signature = (stat.st_ino, stat.st_mtime, stat.st_size)
+        magic, format_version, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION or index_offset == 0:
+            raise SnapshotError("%s is not a registry snapshot" % path)
+        index = loads(self._map[index_offset:index_offset + index_length])
+        self.version = index['versions__delta']
+        self.hashcode = index['apps__hashcode']
+        self.apps = index['apps']
+        self.instances = index['instances']
+
+    def __contains__(self, name):
+        return name in self.apps
+
+    def application(self, name):
+        offset, length = self.apps[name]
+        return Application.from_dict(loads(self._map[offset:offset + length]))
+
+    def close(self):
+        self._map.close()
+
+
+def signature(path):
+    """
+    Identity of the file currently at ``path``, changes whenever a new
+    snapshot replaces it
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime, stat.st_size)
+
+
+class LeaderLock(object):
+    """
+    Non blocking exclusive lock electing a single process of the host. The lock
+    is released by the OS when its holder exits, letting another process take
+    over.
+    """
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise SnapshotError("Shared registry snapshots require fcntl")
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
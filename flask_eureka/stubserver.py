@@ -0,0 +1,269 @@
+"""
+    In process stub of the Eureka REST API, for benchmarks and simulations
+"""
+
+import collections
+import json
+import random
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlsplit
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlsplit
+
+RESOURCES = ('apps', 'vips', 'svips', 'instances')
+
+
+def generate_instance(app, index, status='UP'):
+    """
+    Registry representation of a made up instance of ``app``
+    """
+    host = '%s-%d' % (app.lower(), index)
+    return {
+        'instanceId': '%s:%s:8080' % (host, app.lower()),
+        'app': app,
+        'hostName': host,
+        'ipAddr': '10.%d.%d.%d' % (sum(map(ord, app)) % 250, index // 250 % 250, index % 250),
+        'status': status,
+        'overriddenstatus': 'UNKNOWN',
+        'port': {'$': 8080, '@enabled': 'true'},
+        'securePort': {'$': 443, '@enabled': 'false'},
+        'countryId': 1,
+        'dataCenterInfo': {'@class': 'com.netflix.appinfo.AmazonInfo', 'name': 'Amazon',
+                           'metadata': {'availability-zone': 'us-east-1%s' % 'abc'[index % 3]}},
+        'leaseInfo': {'renewalIntervalInSecs': 30, 'durationInSecs': 90},
+        'metadata': {'management.port': '8081', 'version': str(index % 2 + 1)},
+        'homePageUrl': 'http://%s:8080/' % host,
+        'statusPageUrl': 'http://%s:8080/info' % host,
+        'healthCheckUrl': 'http://%s:8080/health' % host,
+        'vipAddress': app.lower(),
+        'secureVipAddress': app.lower(),
+        'isCoordinatingDiscoveryServer': 'false',
+        'lastUpdatedTimestamp': '1500000000000',
+        'lastDirtyTimestamp': '1500000000000',
+        'actionType': 'ADDED',
+    }
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, avoid the delayed ACK stall
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _route(self, method):
+        stub = self.server.stub
+        parsed = urlsplit(self.path)
+        segments = [segment for segment in parsed.path.split('/') if segment]
+        # the client prefixes some calls with its context (eureka/apps/...)
+        # and not others (apps/...)
+        while segments and segments[0] not in RESOURCES:
+            segments.pop(0)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if stub.latency:
+            time.sleep(stub.latency)
+        if stub.failure_rate and random.random() < stub.failure_rate:
+            return self._reply(500)
+        status, payload = stub.handle(method, segments, parse_qs(parsed.query), body)
+        self._reply(status, payload)
+
+    def _reply(self, status, payload=b''):
+        self.send_response(status)
+        if payload:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def do_PUT(self):
+        self._route('PUT')
+
+    def do_DELETE(self):
+        self._route('DELETE')
+
+
+class StubEureka(object):
+    """
+    Eureka server answering register, renew, status and metadata updates,
+    deregistration and the registry lookups from memory. Every reply can be
+    delayed by ``latency`` seconds and fail with a 500 at ``failure_rate``.
+
+    ``url`` is the service url to give to :class:`EurekaClient`.
+    """
+
+    def __init__(self, instances=0, apps=10, latency=0.0, failure_rate=0.0, host='127.0.0.1', port=0):
+        """
+        :param instances: number of made up instances registered at start,
+                          spread over ``apps`` applications
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()
+        self._apps = {}
+        self._changes = collections.deque(maxlen=1000)
+        self._version = 0
+        self._encoded = {}
+        self._server = _Server((host, port), _Handler)
+        self._server.stub = self
+        self._thread = None
+        if instances:
+            self.populate(instances, apps)
+
+    @property
+    def url(self):
+        return 'http://%s:%d/' % self._server.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-eureka')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def populate(self, instances, apps=10):
+        with self._lock:
+            for index in range(instances):
+                app = 'APP-%d' % (index % apps)
+                instance = generate_instance(app, index // apps)
+                self._apps.setdefault(app, {})[instance['instanceId']] = instance
+            self._changed()
+
+    def wipe(self):
+        """
+        Forget every registration, like a restarted server: the next renews
+        get a 404
+        """
+        with self._lock:
+            self._apps = {}
+            self._changes.clear()
+            self._changed()
+
+    def instance_count(self):
+        with self._lock:
+            return sum(len(instances) for instances in self._apps.values())
+
+    def _changed(self, action=None, instance=None):
+        self._version += 1
+        self._encoded = {}
+        if action is not None:
+            change = dict(instance)
+            change['actionType'] = action
+            self._changes.append(change)
+
+    def _hashcode(self):
+        counts = collections.Counter(instance['status'] for instances in self._apps.values()
+                                     for instance in instances.values())
+        return ''.join('%s_%s_' % (status, counts[status]) for status in sorted(counts))
+
+    def _applications(self, applications):
+        return {'applications': {'versions__delta': str(self._version), 'apps__hashcode': self._hashcode(),
+                                 'application': applications}}
+
+    def _encoded_registry(self, key, build):
+        encoded = self._encoded.get(key)
+        if encoded is None:
+            encoded = self._encoded[key] = json.dumps(build()).encode('utf8')
+        return encoded
+
+    def handle(self, method, segments, query, body):
+        """
+        Reply (status, body bytes) to a request on ``segments``, the path
+        starting at the resource name
+        """
+        resource, rest = (segments[0], segments[1:]) if segments else (None, [])
+        with self._lock:
+            self.counts[(method, resource, len(rest))] += 1
+            if resource == 'apps' and method == 'POST' and len(rest) == 1:
+                instance = json.loads(body.decode('utf8'))['instance']
+                data_center = instance.get('dataCenterInfo') or {}
+                if data_center.get('name') != 'Amazon':
+                    # like Eureka's codec, only the name of other data centers is kept
+                    instance['dataCenterInfo'] = dict((key, value) for key, value in data_center.items()
+                                                      if key in ('@class', 'name'))
+                self._apps.setdefault(rest[0].upper(), {})[instance['instanceId']] = instance
+                self._changed('ADDED', instance)
+                return 204, b''
+            if resource == 'apps' and len(rest) >= 2:
+                instances = self._apps.get(rest[0].upper(), {})
+                instance = instances.get(rest[1])
+                if instance is None:
+                    return 404, b''
+                if method == 'PUT' and len(rest) == 2:
+                    return 200, b''
+                if method == 'PUT' and rest[2:] == ['status']:
+                    instance['status'] = query['value'][0]
+                    self._changed('MODIFIED', instance)
+                    return 200, b''
+                if method == 'PUT' and rest[2:] == ['metadata']:
+                    metadata = instance.setdefault('metadata', {})
+                    metadata.update((key, values[0]) for key, values in query.items())
+                    self._changed('MODIFIED', instance)
+                    return 200, b''
+                if method == 'DELETE' and len(rest) == 2:
+                    del instances[rest[1]]
+                    self._changed('DELETED', instance)
+                    return 200, b''
+                if method == 'GET' and len(rest) == 2:
+                    return 200, json.dumps({'instance': instance}).encode('utf8')
+            if method != 'GET':
+                return 405, b''
+            if resource == 'apps' and not rest:
+                return 200, self._encoded_registry('apps', lambda: self._applications([
+                    {'name': name, 'instance': list(instances.values())}
+                    for name, instances in self._apps.items() if instances]))
+            if resource == 'apps' and rest == ['delta']:
+                return 200, json.dumps(self._applications([
+                    {'name': change['app'], 'instance': [change]} for change in self._changes])).encode('utf8')
+            if resource == 'apps' and len(rest) == 1:
+                instances = self._apps.get(rest[0].upper())
+                if not instances:
+                    return 404, b''
+                return 200, json.dumps({'application': {'name': rest[0].upper(),
+                                                        'instance': list(instances.values())}}).encode('utf8')
+            if resource in ('vips', 'svips') and len(rest) == 1:
+                attribute = 'vipAddress' if resource == 'vips' else 'secureVipAddress'
+                applications = [{'name': name, 'instance': matches} for name, matches in (
+                    (name, [instance for instance in instances.values()
+                            if rest[0] in (instance.get(attribute) or '').split(',')])
+                    for name, instances in self._apps.items()) if matches]
+                if not applications:
+                    return 404, b''
+                return 200, json.dumps(self._applications(applications)).encode('utf8')
+            if resource == 'instances' and len(rest) == 1:
+                for instances in self._apps.values():
+                    if rest[0] in instances:
+                        return 200, json.dumps({'instance': instances[rest[0]]}).encode('utf8')
+                return 404, b''
+        return 404, b''
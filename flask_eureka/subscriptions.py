@@ -0,0 +1,142 @@
+"""
+    Notifications of registry changes
+"""
+
+import logging
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger('service.eureka')
+
+
+class ApplicationChange(object):
+    """
+    Instances of an application added, removed, or whose status changed
+    since the previous notification. ``status_changed`` holds
+    ``(previous status, instance)`` pairs.
+    """
+    __slots__ = ('app', 'added', 'removed', 'status_changed')
+
+    def __init__(self, app):
+        self.app = app
+        self.added = []
+        self.removed = []
+        self.status_changed = []
+
+    def record(self, previous, instance):
+        """
+        Record the transition of one instance, ``previous`` or ``instance``
+        being None when it was added or removed
+        """
+        if previous is None:
+            if instance is not None:
+                self.added.append(instance)
+        elif instance is None:
+            self.removed.append(previous)
+        elif previous._status != instance._status:
+            self.status_changed.append((previous.status, instance))
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.status_changed)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return '<ApplicationChange %s +%d -%d ~%d>' % (
+            self.app, len(self.added), len(self.removed), len(self.status_changed))
+
+
+def diff_applications(name, old, new):
+    """
+    Change between two copies of an application (None when absent), only
+    comparing their instances when their versions differ
+    """
+    change = ApplicationChange(name)
+    old_version = old.version if old is not None else 0
+    new_version = new.version if new is not None else 0
+    if old_version == new_version and (old is None) == (new is None):
+        return change
+    old_instances = old.instances if old is not None else {}
+    new_instances = new.instances if new is not None else {}
+    for instance_id, instance in new_instances.items():
+        change.record(old_instances.get(instance_id), instance)
+    for instance_id, instance in old_instances.items():
+        if instance_id not in new_instances:
+            change.record(instance, None)
+    return change
+
+
+class ChangeDispatcher(object):
+    """
+    Calls the subscribers of an application with its changes, in order, on
+    a dedicated thread so that slow subscribers never hold up a registry
+    fetch
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def subscribe(self, app_id, callback):
+        with self._lock:
+            self._subscribers.setdefault(app_id.upper(), []).append(callback)
+
+    def unsubscribe(self, app_id, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(app_id.upper(), [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(app_id.upper(), None)
+
+    def watched(self):
+        """
+        Names of the applications having subscribers
+        """
+        return frozenset(self._subscribers)
+
+    def publish(self, changes):
+        """
+        Queue the non empty changes for their subscribers
+        """
+        changes = [change for change in changes if change]
+        if not changes:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='eureka-changes')
+                self._thread.daemon = True
+                self._thread.start()
+        self._queue.put(changes)
+
+    def _run(self):
+        while True:
+            changes = self._queue.get()
+            if changes is None:
+                self._queue.task_done()
+                return
+            for change in changes:
+                for callback in list(self._subscribers.get(change.app, ())):
+                    try:
+                        callback(change)
+                    except Exception as ex:
+                        logger.warning("Exception in registry change subscriber %s: %s" % (callback, str(ex)))
+            self._queue.task_done()
+
+    def join(self):
+        """
+        Wait until the changes published so far were delivered
+        """
+        self._queue.join()
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread = None
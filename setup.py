@@ -20,6 +20,11 @@ setup(
     packages=find_packages(exclude=['tests*', 'examples*']),
     include_package_data=True,
     install_requires=['Flask', 'dnspython', 'urllib3'],
+    entry_points={
+        'console_scripts': [
+            'flask-eureka-simulator = flask_eureka.simulator:main',
+        ],
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.3',
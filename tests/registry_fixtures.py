@@ -0,0 +1,27 @@
+"""
+    Registry responses shared by the registry tests
+"""
+
+
+def instance(app, instance_id, status='UP', action=None, vip='vip'):
+    data = {'app': app, 'instanceId': instance_id, 'status': status, 'vipAddress': vip}
+    if action:
+        data['actionType'] = action
+    return data
+
+
+class FakeEureka(object):
+    def __init__(self, full, delta=None):
+        self.responses = {'apps': full, 'apps/delta': delta}
+        self.calls = []
+
+    def __call__(self, endpoint):
+        self.calls.append(endpoint)
+        return self.responses[endpoint]
+
+
+def applications(apps, hashcode=None):
+    result = {'versions__delta': '1', 'application': apps}
+    if hashcode is not None:
+        result['apps__hashcode'] = hashcode
+    return {'applications': result}
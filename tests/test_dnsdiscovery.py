@@ -0,0 +1,47 @@
+import unittest
+from flask_eureka import dnsdiscovery
+from flask_eureka.dnsdiscovery import DnsZoneDiscovery
+
+RECORDS = {
+    'txt.us-east-1.example.com': ([b'us-east-1a.example.com', b'us-east-1b.example.com'], 120),
+    'txt.us-east-1a.example.com': ([b'eureka1.example.com'], 60),
+    'txt.us-east-1b.example.com': ([b'eureka2.example.com', b'eureka3.example.com'], 90),
+}
+
+
+class FakeAnswer(list):
+    def __init__(self, strings, ttl):
+        super(FakeAnswer, self).__init__([FakeRecord(strings)])
+        self.rrset = FakeRecord(strings)
+        self.rrset.ttl = ttl
+
+
+class FakeRecord(object):
+    def __init__(self, strings):
+        self.strings = strings
+
+
+class TestDnsZoneDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.queries = []
+
+        def resolve(domain, rdtype):
+            self.queries.append(domain)
+            return FakeAnswer(*RECORDS[domain])
+
+        original = dnsdiscovery._resolve
+        dnsdiscovery._resolve = resolve
+        self.addCleanup(setattr, dnsdiscovery, '_resolve', original)
+
+    def test_resolve_uses_smallest_ttl(self):
+        zones, ttl = DnsZoneDiscovery('us-east-1', 'example.com').resolve()
+        self.assertEqual(zones, {'us-east-1a': ['eureka1.example.com'],
+                                 'us-east-1b': ['eureka2.example.com', 'eureka3.example.com']})
+        self.assertEqual(ttl, 60)
+
+    def test_zones_cached_until_ttl(self):
+        discovery = DnsZoneDiscovery('us-east-1', 'example.com')
+        discovery.get_zones()
+        discovery.get_zones()
+        self.assertEqual(len(self.queries), 3)
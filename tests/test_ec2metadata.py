@@ -0,0 +1,83 @@
+import threading
+import unittest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from flask_eureka.ec2metadata import EC2Metadata, TOKEN_HEADER
+
+METADATA = {
+    '/latest/meta-data/instance-id': 'i-1234',
+    '/latest/meta-data/hostname': 'ip-10-0-0-1.ec2.internal',
+    '/latest/meta-data/local-ipv4': '10.0.0.1',
+    '/latest/meta-data/placement/availability-zone': 'us-east-1a',
+}
+
+
+class StubMetadataHandler(BaseHTTPRequestHandler):
+    token = 'stub-token'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=''):
+        body = body.encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        self.server.token_requests += 1
+        if not self.server.imdsv2:
+            return self._reply(403)
+        self._reply(200, self.token)
+
+    def do_GET(self):
+        self.server.gets.append(self.path)
+        if self.server.imdsv2 and self.headers.get(TOKEN_HEADER) != self.token:
+            return self._reply(401)
+        if self.path not in METADATA:
+            return self._reply(404)
+        self._reply(200, METADATA[self.path])
+
+
+class TestEC2Metadata(unittest.TestCase):
+
+    def start_server(self, imdsv2):
+        server = HTTPServer(('127.0.0.1', 0), StubMetadataHandler)
+        server.imdsv2 = imdsv2
+        server.token_requests = 0
+        server.gets = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def provider(self, server):
+        return EC2Metadata(addr='127.0.0.1:%d' % server.server_address[1])
+
+    def test_imdsv2_batch(self):
+        server = self.start_server(imdsv2=True)
+        values = self.provider(server).get_many(['instance-id', 'hostname', 'availability-zone', 'kernel-id'])
+
+        self.assertEqual(values, {'instance-id': 'i-1234', 'hostname': 'ip-10-0-0-1.ec2.internal',
+                                  'availability-zone': 'us-east-1a', 'kernel-id': None})
+        self.assertEqual(server.token_requests, 1)
+
+    def test_imdsv1_fallback(self):
+        server = self.start_server(imdsv2=False)
+        self.assertEqual(self.provider(server).get('local-ipv4'), '10.0.0.1')
+
+    def test_values_are_cached(self):
+        server = self.start_server(imdsv2=True)
+        provider = self.provider(server)
+        provider.get('instance-id')
+        provider.get_many(['instance-id', 'local-ipv4'])
+        provider.get('local-ipv4')
+
+        self.assertEqual(sorted(server.gets), ['/latest/meta-data/instance-id', '/latest/meta-data/local-ipv4'])
@@ -1,5 +1,16 @@
+import gzip
+import json
+import threading
+import time
 import unittest
-from flask_eureka.eurekaclient import EurekaClient
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from flask_eureka.eurekaclient import EurekaClient, EurekaRegistrationFailedException, EurekaUpdateFailedException
+from flask_eureka.httpclient import ApiException
 
 class EurekaClientMock(unittest.TestCase):
     def setUp(self):
@@ -60,4 +71,196 @@ class TestEurekaClient(EurekaClientMock):
 
         self.assertEqual(healthcheckUrl, 'http://mocked_host_name:8080/healthcheck')
         self.assertEqual(statusPageUrl, 'http://mocked_host_name:8080/healthcheck')
-        self.assertEqual(homePageUrl, 'http://mocked_host_name:8080/healthcheck')
\ No newline at end of file
+        self.assertEqual(homePageUrl, 'http://mocked_host_name:8080/healthcheck')
+
+    def test_zone_published_in_metadata(self):
+        e_client = self.mocked_client(name='orders', host_name='mocked_host_name', port=8080, zone='us-east-1b',
+                                      metadata={'version': '2'})
+        instance = e_client.get_instance_data()['instance']
+        self.assertEqual(instance['dataCenterInfo']['name'], 'MyOwn')
+        self.assertEqual(instance['metadata'], {'zone': 'us-east-1b'})
+        self.assertEqual(json.loads(e_client.get_instance_payload().decode('utf8'))['instance']['metadata'],
+                         {'zone': 'us-east-1b', 'version': '2'})
+
+        payload = e_client.get_instance_payload()
+        e_client.zone = 'us-east-1c'
+        self.assertIn(b'us-east-1c', e_client.get_instance_payload())
+        self.assertNotEqual(e_client.get_instance_payload(), payload)
+
+        no_zone = self.mocked_client(name='orders', host_name='mocked_host_name', port=8080)
+        self.assertNotIn('metadata', no_zone.get_instance_data()['instance'])
+
+
+class FakeRequests(object):
+    def __init__(self, failing=(), delay=0):
+        self.failing = failing
+        self.delay = delay
+        self.calls = []
+
+    def _call(self, url, query_params=None, deadline=None):
+        self.calls.append(url)
+        self.query_params = query_params
+        time.sleep(self.delay)
+        for failing_url, status in self.failing:
+            if url.startswith(failing_url):
+                raise ApiException(status=status, reason='failure')
+
+    def POST(self, url, body=None, headers=None, deadline=None):
+        self.body = body
+        self._call(url)
+
+    def PUT(self, url, query_params=None, deadline=None):
+        self._call(url, query_params)
+
+    def DELETE(self, url, deadline=None):
+        self._call(url)
+
+
+class TestEurekaClientPeers(EurekaClientMock):
+
+    def client(self, requests, **kwargs):
+        e_client = self.mocked_client(name='app', host_name='host', port=8080, **kwargs)
+        e_client.eureka_urls = ['http://peer1/', 'http://peer2/', 'http://peer3/']
+        e_client.requests = requests
+        return e_client
+
+    def test_register_reports_every_peer(self):
+        for fan_out in (False, True):
+            e_client = self.client(FakeRequests(failing=[('http://peer2/', 500)]), fan_out=fan_out)
+            results = e_client.register()
+            self.assertEqual(list(results), e_client.eureka_urls)
+            self.assertIsNone(results['http://peer1/'])
+            self.assertEqual(results['http://peer2/'].status, 500)
+
+    def test_register_fails_when_no_peer_replies(self):
+        for fan_out in (False, True):
+            e_client = self.client(FakeRequests(failing=[('http://', 500)]), fan_out=fan_out)
+            self.assertRaises(EurekaRegistrationFailedException, e_client.register)
+
+    def test_fan_out_runs_concurrently(self):
+        e_client = self.client(FakeRequests(delay=0.2), fan_out=True)
+        started = time.time()
+        e_client.renew()
+        self.assertLess(time.time() - started, 0.5)
+
+    def test_fan_out_deadline(self):
+        e_client = self.client(FakeRequests(delay=0.5), fan_out=True, fan_out_timeout=0.05)
+        self.assertRaises(EurekaUpdateFailedException, e_client.renew)
+
+    def test_fan_out_pool_shut_down(self):
+        def pool_threads():
+            return [thread for thread in threading.enumerate() if thread.name.startswith('ThreadPoolExecutor')]
+        before = pool_threads()
+        for _ in range(5):
+            e_client = self.client(FakeRequests(), fan_out=True)
+            e_client.register()
+            e_client.deregister()
+            e_client.stop()
+        for thread in pool_threads():
+            if thread not in before:
+                thread.join(1)
+        self.assertEqual([thread for thread in pool_threads() if thread not in before], [])
+
+    def test_renew_registers_on_404(self):
+        requests = FakeRequests(failing=[('http://peer1/eureka/apps/app/', 404)])
+        e_client = self.client(requests, fan_out=True)
+        e_client.renew()
+        self.assertIn('http://peer1/eureka/apps/app', requests.calls)
+
+
+class TestEurekaClientUpdates(EurekaClientMock):
+
+    def client(self, requests, **kwargs):
+        e_client = self.mocked_client(name='app', host_name='host', port=8080, **kwargs)
+        e_client.eureka_urls = ['http://peer1/']
+        e_client.requests = requests
+        return e_client
+
+    def test_payload_serialized_once(self):
+        e_client = self.client(FakeRequests())
+        payload = e_client.get_instance_payload()
+        self.assertIs(e_client.get_instance_payload(), payload)
+
+        e_client.status = 'DOWN'
+        self.assertIn(b'"status": "DOWN"', e_client.get_instance_payload())
+
+    def test_status_changes_coalesced(self):
+        requests = FakeRequests()
+        e_client = self.client(requests, status_update_delay=0.05)
+        e_client.set_status('DOWN')
+        e_client.set_status('OUT_OF_SERVICE')
+        time.sleep(0.2)
+
+        self.assertEqual(requests.calls, ['http://peer1/eureka/apps/app/host:app:8080/status'])
+        self.assertEqual(requests.query_params, {'value': 'OUT_OF_SERVICE'})
+
+    def test_failed_updates_retried(self):
+        requests = FakeRequests(failing=[('http://peer1/', 500)])
+        e_client = self.client(requests, status_update_delay=0.01, registration_backoff=0.05)
+        e_client.update_metadata(version='2')
+        e_client.set_status('DOWN')
+        time.sleep(0.05)
+        self.assertEqual(e_client._pending_status, 'DOWN')
+        self.assertEqual(e_client._pending_metadata, {'version': '2'})
+
+        e_client.update_metadata(version='3')
+        requests.failing = []
+        requests.calls = []
+        time.sleep(0.3)
+        self.assertEqual(requests.calls, ['http://peer1/eureka/apps/app/host:app:8080/metadata',
+                                          'http://peer1/eureka/apps/app/host:app:8080/status'])
+        self.assertEqual(requests.query_params, {'value': 'DOWN'})
+        self.assertIsNone(e_client._pending_status)
+        self.assertEqual(e_client._pending_metadata, {})
+
+    def test_update_metadata_immediate(self):
+        requests = FakeRequests()
+        e_client = self.client(requests)
+        e_client.update_metadata(immediate=True, version='2')
+
+        self.assertEqual(requests.calls, ['http://peer1/eureka/apps/app/host:app:8080/metadata'])
+        self.assertEqual(requests.query_params, {'version': '2'})
+        e_client.register()
+        self.assertIn(b'"metadata": {"version": "2"}', requests.body)
+
+
+class ConditionalHandler(BaseHTTPRequestHandler):
+    body = gzip.compress(json.dumps({'application': {'name': 'ORDERS', 'instance': []}}).encode('utf8'))
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+
+class TestEurekaClientConditionalGet(EurekaClientMock):
+
+    def test_gzip_and_not_modified(self):
+        server = HTTPServer(('127.0.0.1', 0), ConditionalHandler)
+        server.requests = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        e_client = self.mocked_client(name='app', host_name='host', port=8080)
+        e_client.eureka_urls = ['http://127.0.0.1:%d/' % server.server_address[1]]
+        first = e_client.get_app('ORDERS')
+        second = e_client.get_app('ORDERS')
+
+        self.assertEqual(first['application']['name'], 'ORDERS')
+        self.assertIs(second, first)
+        self.assertIn('gzip', server.requests[0]['Accept-Encoding'])
+        self.assertEqual(server.requests[1]['If-None-Match'], '"v1"')
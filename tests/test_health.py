@@ -0,0 +1,73 @@
+import threading
+import time
+import unittest
+from flask import Flask
+from flask_eureka import Eureka, eureka_bp
+from flask_eureka.health import HealthMonitor, aggregate
+from flask_eureka.scheduler import Scheduler
+
+
+class TestHealthMonitor(unittest.TestCase):
+
+    def test_aggregate_reports_worst_status(self):
+        self.assertEqual(aggregate([]), 'UP')
+        self.assertEqual(aggregate(['UP', 'OUT_OF_SERVICE', 'DOWN']), 'DOWN')
+        self.assertEqual(aggregate(['UP', 'WEIRD']), 'UNKNOWN')
+
+    def test_changes_are_reported(self):
+        changes = []
+        monitor = HealthMonitor(on_change=changes.append)
+        healthy = [True]
+        monitor.add('db', lambda: healthy[0])
+        monitor.add('cache', lambda: 'up')
+        self.assertEqual(monitor.check(), 'UP')
+
+        healthy[0] = False
+        monitor.check()
+        monitor.check()
+        self.assertEqual(changes, ['DOWN'])
+
+        monitor.add('db', lambda: 1 / 0)
+        monitor.check()
+        self.assertEqual(monitor.as_dict()['details']['db']['error'], 'division by zero')
+
+        monitor.remove('db')
+        self.assertEqual(changes, ['DOWN', 'UP'])
+
+    def test_slow_checks_time_out_without_blocking_the_scheduler(self):
+        scheduler = Scheduler(max_workers=1)
+        self.addCleanup(scheduler.stop)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        changes = []
+        monitor = HealthMonitor(interval=0.05, timeout=0.2, on_change=changes.append)
+        for index in range(4):
+            monitor.add('slow-%d' % index, release.wait)
+        heartbeats = []
+        scheduler.call_every(0.05, lambda: heartbeats.append(1))
+
+        monitor.start(scheduler)
+        self.addCleanup(monitor.stop)
+        time.sleep(0.5)
+        self.assertGreater(len(heartbeats), 4)
+        self.assertEqual(changes, ['DOWN'])
+        self.assertEqual(monitor.as_dict()['details']['slow-0']['error'], 'No result within 0.2 seconds')
+
+    def test_healthcheck_serves_cached_status(self):
+        app = Flask(__name__)
+        app.register_blueprint(eureka_bp)
+        eureka = Eureka(app)
+        calls = []
+
+        @eureka.health_indicator('downstream')
+        def downstream():
+            calls.append(1)
+            return 'OUT_OF_SERVICE'
+
+        client = app.test_client()
+        self.assertEqual(client.get('/healthcheck').status_code, 200)
+        eureka.health.check()
+        response = client.get('/healthcheck')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json()['status'], 'OUT_OF_SERVICE')
+        self.assertEqual(len(calls), 1)
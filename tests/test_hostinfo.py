@@ -0,0 +1,23 @@
+import subprocess
+import unittest
+from flask_eureka import hostinfo
+from flask_eureka.hostinfo import HostInfo
+
+
+class TestHostInfo(unittest.TestCase):
+
+    def test_no_process_spawned_and_cached(self):
+        def fail(*args, **kwargs):
+            raise AssertionError('process spawned')
+
+        original = subprocess.Popen
+        subprocess.Popen = fail
+        try:
+            hostinfo._cache.clear()
+            info = HostInfo().get()
+        finally:
+            subprocess.Popen = original
+
+        self.assertEqual(set(info), {'host', 'IPv4', 'IPv6', 'MAC'})
+        self.assertTrue(info['IPv4'])
+        self.assertEqual(HostInfo().get(), info)
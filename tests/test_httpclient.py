@@ -0,0 +1,57 @@
+import os
+import socket
+import time
+import unittest
+from flask_eureka.httpclient import ApiException, Deadline, HttpClientObject, get_default_pool_manager
+from flask_eureka.scheduler import Scheduler
+
+
+class TestHttpClientObject(unittest.TestCase):
+
+    def hung_server(self):
+        # accepts connections but never replies
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(8)
+        self.addCleanup(server.close)
+        return 'http://127.0.0.1:%d/' % server.getsockname()[1], server
+
+    def test_deadline_caps_read_timeout(self):
+        url, _ = self.hung_server()
+        client = HttpClientObject(read_timeout=30)
+        started = time.time()
+        with self.assertRaises(ApiException) as raised:
+            client.GET(url, deadline=Deadline(0.2))
+        self.assertEqual(raised.exception.status, 0)
+        self.assertLess(time.time() - started, 1)
+
+    def test_expired_deadline(self):
+        url, _ = self.hung_server()
+        self.assertRaises(ApiException, HttpClientObject().GET, url, deadline=Deadline(0))
+
+    def test_default_pool_keeps_a_connection_per_scheduler_worker(self):
+        pool = get_default_pool_manager().connection_from_url('http://eureka-1:8761/')
+        self.assertGreaterEqual(pool.pool.maxsize, Scheduler().max_workers)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_default_pool_manager_not_shared_with_forked_child(self):
+        client = HttpClientObject()
+        parent = client.pool_manager
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if client.pool_manager is not parent and client.pool_manager is client.pool_manager else 1)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertIs(client.pool_manager, parent)
+
+    def test_per_host_pool_and_prewarm(self):
+        url, server = self.hung_server()
+        client = HttpClientObject(pool_maxsize=3)
+        pool = client._pool_for(url)
+        self.assertEqual(pool.pool.maxsize, 3)
+        self.assertIs(client._pool_for(url + 'apps'), pool)
+
+        client.prewarm([url], connections=2)
+        accepted = [server.accept()[0] for _ in range(2)]
+        for conn in accepted:
+            conn.close()
+        self.assertEqual(pool.num_connections, 2)
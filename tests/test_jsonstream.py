@@ -0,0 +1,45 @@
+import json
+import unittest
+from flask_eureka.jsonstream import ApplicationStream, loads
+
+
+def chunked(document, size):
+    data = json.dumps(document).encode('utf8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestApplicationStream(unittest.TestCase):
+
+    def setUp(self):
+        self.applications = [
+            {'name': 'APP%d' % i, 'instance': [{'instanceId': 'i-%d-%d' % (i, j), 'app': u'caf\xe9'}
+                                               for j in range(i)]}
+            for i in range(1, 20)
+        ]
+        self.document = {'applications': {'versions__delta': '7', 'application': self.applications,
+                                          'apps__hashcode': 'UP_190_'}}
+
+    def test_small_chunks(self):
+        for size in (1, 7, 4096):
+            closed = []
+            stream = ApplicationStream(chunked(self.document, size), close=lambda: closed.append(True))
+            self.assertEqual(list(stream), self.applications)
+            self.assertEqual((stream.versions_delta, stream.apps_hashcode), ('7', 'UP_190_'))
+            self.assertEqual(closed, [True])
+
+    def test_single_application_object(self):
+        document = {'applications': {'application': self.applications[0]}}
+        self.assertEqual(list(ApplicationStream(chunked(document, 5))), self.applications[:1])
+
+    def test_empty_registry(self):
+        document = {'applications': {'versions__delta': '1', 'apps__hashcode': ''}}
+        stream = ApplicationStream(chunked(document, 5))
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.versions_delta, '1')
+
+    def test_truncated_document(self):
+        stream = ApplicationStream(chunked(self.document, 64)[:3])
+        self.assertRaises(ValueError, list, stream)
+
+    def test_loads_bytes(self):
+        self.assertEqual(loads(b'{"a": 1}'), {'a': 1})
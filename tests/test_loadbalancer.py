@@ -0,0 +1,84 @@
+import unittest
+from flask import Flask
+from flask_eureka import Eureka
+from flask_eureka.loadbalancer import RoundRobin, WeightedRandom, PowerOfTwoChoices, ZoneAffinity, \
+    get_load_balancer
+from flask_eureka.model import InstanceInfo
+
+
+def instance(instance_id, weight=None):
+    return InstanceInfo(instance_id, metadata={'weight': weight} if weight is not None else None)
+
+
+def zoned(instance_id, zone, status='UP'):
+    instance = InstanceInfo(instance_id, status=status)
+    instance.data_center_metadata = {'availability-zone': zone}
+    return instance
+
+
+class FakeClient(object):
+    def __init__(self, instances):
+        self.instances = tuple(instances)
+
+    def get_instance_zone(self):
+        return 'us-east-1a'
+
+    def get_instances(self, app_id):
+        return self.instances
+
+
+class TestLoadBalancer(unittest.TestCase):
+
+    def test_round_robin(self):
+        instances = (instance('a'), instance('b'), instance('c'))
+        balancer = RoundRobin()
+        chosen = [balancer.choose('app', instances).instance_id for _ in range(6)]
+        self.assertEqual(chosen, ['a', 'b', 'c', 'a', 'b', 'c'])
+
+    def test_weighted_random_skips_zero_weight(self):
+        instances = (instance('a', '0'), instance('b', '3'))
+        balancer = WeightedRandom()
+        chosen = set(balancer.choose('app', instances).instance_id for _ in range(50))
+        self.assertEqual(chosen, {'b'})
+
+    def test_power_of_two_choices_prefers_idle_instance(self):
+        busy, idle = instance('busy'), instance('idle')
+        balancer = PowerOfTwoChoices()
+        balancer.choose('app', (busy,))
+        self.assertEqual(balancer.choose('app', (busy, idle)).instance_id, 'idle')
+
+        balancer.release(busy)
+        balancer.release(idle)
+        self.assertEqual(balancer.in_flight(busy), 0)
+        self.assertEqual(balancer.in_flight(idle), 0)
+
+    def test_zone_affinity_prefers_own_zone(self):
+        instances = (zoned('a1', 'us-east-1a'), zoned('a2', 'us-east-1a', 'DOWN'), zoned('b1', 'us-east-1b'))
+        affinity = ZoneAffinity('us-east-1a', threshold=0.5)
+        filtered = affinity.filter('app', instances)
+        self.assertEqual([i.instance_id for i in filtered], ['a1'])
+        self.assertIs(affinity.filter('app', instances), filtered)
+
+    def test_zone_affinity_falls_back_below_threshold(self):
+        instances = (zoned('a1', 'us-east-1a'), zoned('a2', 'us-east-1a', 'DOWN'),
+                     zoned('a3', 'us-east-1a', 'DOWN'), zoned('b1', 'us-east-1b'), zoned('b2', 'us-east-1b', 'DOWN'))
+        affinity = ZoneAffinity('us-east-1a', threshold=0.5)
+        self.assertEqual([i.instance_id for i in affinity.filter('app', instances)], ['a1', 'b1'])
+        self.assertEqual([i.instance_id for i in ZoneAffinity('us-east-1c').filter('app', instances)],
+                         ['a1', 'b1'])
+
+    def test_choose_with_zone_affinity(self):
+        app = Flask(__name__)
+        app.config['EUREKA_ZONE_AFFINITY_THRESHOLD'] = '0.4'
+        eureka = Eureka(app)
+        eureka.client = FakeClient([zoned('a1', 'us-east-1a'), zoned('b1', 'us-east-1b')])
+        eureka.zone_affinity = eureka._get_zone_affinity(eureka.client)
+
+        self.assertEqual(eureka.zone_affinity.threshold, 0.4)
+        self.assertEqual(set(eureka.choose('app').instance_id for _ in range(4)), {'a1'})
+
+        app.config['EUREKA_ZONE_AFFINITY'] = 'false'
+        self.assertIsNone(eureka._get_zone_affinity(eureka.client))
+
+    def test_unknown_strategy(self):
+        self.assertRaises(ValueError, get_load_balancer, 'random')
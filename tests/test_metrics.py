@@ -0,0 +1,55 @@
+import gc
+import unittest
+from flask import Flask
+from flask_eureka import eureka_bp
+from flask_eureka.eurekaclient import EurekaClient
+from flask_eureka.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_render_prometheus_text(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.observe('latency_seconds', (('server', 'a'),), 0.05)
+        metrics.observe('latency_seconds', (('server', 'a'),), 0.5)
+        metrics.inc('calls_total', (('outcome', 'error'),))
+        metrics.gauge_function('registry_instances', lambda: 3)
+
+        lines = metrics.render().splitlines()
+        self.assertIn('# TYPE latency_seconds histogram', lines)
+        self.assertIn('latency_seconds_bucket{server="a",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{server="a",le="+Inf"} 2', lines)
+        self.assertIn('latency_seconds_count{server="a"} 2', lines)
+        self.assertIn('calls_total{outcome="error"} 1', lines)
+        self.assertIn('registry_instances 3', lines)
+
+    def test_timed_records_outcome(self):
+        metrics = Metrics()
+        metrics.timed('renew', 'http://eureka/', lambda: None)
+        self.assertRaises(ZeroDivisionError, metrics.timed, 'renew', 'http://eureka/', lambda: 1 / 0)
+
+        text = metrics.render()
+        self.assertIn('eureka_operation_total{operation="renew",server="http://eureka/",outcome="success"} 1', text)
+        self.assertIn('eureka_operation_total{operation="renew",server="http://eureka/",outcome="error"} 1', text)
+        self.assertIn('eureka_operation_last_success_timestamp_seconds{operation="renew"', text)
+
+    def test_registry_gauges_per_client(self):
+        metrics = Metrics()
+        clients = [EurekaClient(name=name, host_name='host', port=8080, eureka_url='http://eureka/',
+                                use_dns=False, fetch_registry=True, metrics=metrics) for name in ('orders', 'users')]
+        text = metrics.render()
+        self.assertIn('eureka_registry_instances{app="orders",instance="host:orders:8080"} 0', text)
+        self.assertIn('eureka_registry_instances{app="users",instance="host:users:8080"} 0', text)
+
+        del clients[0]
+        gc.collect()
+        text = metrics.render()
+        self.assertNotIn('app="orders"', text)
+        self.assertIn('eureka_registry_applications{app="users",instance="host:users:8080"} 0', text)
+
+    def test_metrics_endpoint(self):
+        app = Flask(__name__)
+        app.register_blueprint(eureka_bp)
+        response = app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
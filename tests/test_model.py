@@ -0,0 +1,48 @@
+import unittest
+from flask_eureka.model import Application, InstanceInfo
+
+INSTANCE = {
+    'instanceId': 'host:orders:8080',
+    'app': 'ORDERS',
+    'hostName': 'host',
+    'ipAddr': '10.0.0.1',
+    'status': 'OUT_OF_SERVICE',
+    'overriddenstatus': 'UNKNOWN',
+    'port': {'$': 8080, '@enabled': 'true'},
+    'securePort': {'$': '443', '@enabled': 'false'},
+    'vipAddress': 'orders',
+    'dataCenterInfo': {'@class': 'com.netflix.appinfo.AmazonInfo', 'name': 'Amazon',
+                       'metadata': {'availability-zone': 'us-east-1a'}},
+    'metadata': {'version': '2'},
+    'leaseInfo': {'renewalIntervalInSecs': 30},
+    'lastDirtyTimestamp': '1500000000000',
+    'custom': [1, 2],
+}
+
+
+class TestModel(unittest.TestCase):
+
+    def test_round_trip(self):
+        instance = InstanceInfo.from_dict(INSTANCE)
+        self.assertEqual(instance.port, 8080)
+        self.assertEqual(instance.secure_port, 443)
+        self.assertFalse(instance.secure_port_enabled)
+        self.assertEqual(instance.zone, 'us-east-1a')
+        self.assertEqual(instance.to_dict(), dict(INSTANCE, securePort={'$': 443, '@enabled': 'false'}))
+
+    def test_zone_from_metadata(self):
+        instance = InstanceInfo.from_dict(dict(INSTANCE, dataCenterInfo={'name': 'MyOwn'},
+                                               metadata={'zone': 'us-east-1b'}))
+        self.assertEqual(instance.zone, 'us-east-1b')
+        self.assertIsNone(InstanceInfo.from_dict(dict(INSTANCE, dataCenterInfo={'name': 'MyOwn'})).zone)
+
+    def test_strings_interned(self):
+        first = InstanceInfo.from_dict(dict(INSTANCE, app=''.join(['ORD', 'ERS'])))
+        second = InstanceInfo.from_dict(dict(INSTANCE, app=''.join(['ORDE', 'RS'])))
+        self.assertIs(first.app, second.app)
+        self.assertIs(first.status, second.status)
+
+    def test_application_single_instance_object(self):
+        application = Application.from_dict({'name': 'orders', 'instance': INSTANCE})
+        self.assertEqual(application.name, 'ORDERS')
+        self.assertEqual(list(application.instances), ['host:orders:8080'])
@@ -0,0 +1,79 @@
+import unittest
+from flask_eureka.model import InstanceInfo
+from flask_eureka.query import RegistryIndex
+from flask_eureka.registry import RegistryCache
+from registry_fixtures import FakeEureka, applications
+
+
+def instance(app, instance_id, status='UP', zone='us-east-1a', vip='vip', version='1', action=None):
+    data = {'app': app, 'instanceId': instance_id, 'status': status, 'vipAddress': vip,
+            'secureVipAddress': vip + '-secure', 'metadata': {'version': version, 'team': 'core'},
+            'dataCenterInfo': {'name': 'Amazon', 'metadata': {'availability-zone': zone}}}
+    if action:
+        data['actionType'] = action
+    return data
+
+
+class TestRegistryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = RegistryIndex(metadata_keys=['version'])
+        for data in (instance('ORDERS', 'o1'), instance('ORDERS', 'o2', 'DOWN'),
+                     instance('ORDERS', 'o3', zone='us-east-1b', version='2'),
+                     instance('USERS', 'u1', vip='users,shared'), instance('USERS', 'u2', vip='shared')):
+            self.index.add(InstanceInfo.from_dict(data))
+
+    def ids(self, instances):
+        return sorted(instance.instance_id for instance in instances)
+
+    def test_query(self):
+        self.assertEqual(self.ids(self.index.query(app='orders', status='UP')), ['o1', 'o3'])
+        self.assertEqual(self.ids(self.index.query(vip='vip', zone='us-east-1a')), ['o1', 'o2'])
+        self.assertEqual(self.ids(self.index.query(vip='shared')), ['u1', 'u2'])
+        self.assertEqual(self.ids(self.index.query(svip='users-secure')), [])
+        self.assertEqual(self.ids(self.index.query(metadata={'version': '2'})), ['o3'])
+        self.assertEqual(self.ids(self.index.query(app='ORDERS', metadata={'team': 'core', 'version': '1'})),
+                         ['o1', 'o2'])
+        self.assertEqual(self.ids(self.index.query(metadata={'team': 'other'})), [])
+        self.assertEqual(len(self.index.query()), 5)
+        self.assertEqual(self.index.query(zone='eu-west-1a'), [])
+
+    def test_replace_and_remove(self):
+        self.index.add(InstanceInfo.from_dict(instance('ORDERS', 'o2', 'UP', zone='us-east-1c')))
+        self.assertEqual(self.ids(self.index.query(status='DOWN')), [])
+        self.assertEqual(self.ids(self.index.query(zone='us-east-1c')), ['o2'])
+
+        self.index.remove(InstanceInfo('o3'))
+        self.assertNotIn('o3', self.index.instances)
+        self.assertEqual(self.index.query(metadata={'version': '2'}), [])
+        self.assertNotIn('2', self.index._indexes[('metadata', 'version')])
+        self.assertEqual(len(self.index), 4)
+
+
+class TestRegistryQuery(unittest.TestCase):
+
+    def test_indexes_follow_refreshes(self):
+        full = applications([{'name': 'ORDERS', 'instance': [instance('ORDERS', 'o1'), instance('ORDERS', 'o2')]}])
+        delta = applications([{'name': 'ORDERS', 'instance': [
+            instance('ORDERS', 'o1', 'DOWN', action='MODIFIED'),
+            instance('ORDERS', 'o2', action='DELETED'),
+            instance('ORDERS', 'o3', zone='us-east-1b', action='ADDED')]}], hashcode='DOWN_1_UP_1_')
+        fetch = FakeEureka(full, delta)
+        cache = RegistryCache(fetch, index_metadata=['version'])
+        cache.refresh()
+        self.assertEqual(len(cache.query(vip_address='vip', status='UP')), 2)
+
+        cache.refresh()
+        self.assertEqual([i.instance_id for i in cache.query(vip_address='vip', status='UP')], ['o3'])
+        self.assertEqual([i.instance_id for i in cache.query(app_id='orders', zone='us-east-1a')], ['o1'])
+        self.assertEqual(len(cache.get_vip('vip')['applications']['application'][0]['instance']), 2)
+        self.assertEqual([i.instance_id for i in cache.get_up_vip_instances('vip')], ['o3'])
+
+        fetch.responses['apps'] = applications([{'name': 'USERS', 'instance': instance('USERS', 'u1')}])
+        cache.fetch_full()
+        self.assertEqual([i.instance_id for i in cache.query(vip_address='vip')], ['u1'])
+        self.assertEqual(cache.query(app_id='ORDERS'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
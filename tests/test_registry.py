@@ -0,0 +1,115 @@
+import copy
+import json
+import sys
+import threading
+import unittest
+from flask_eureka.model import STATUSES, InstanceInfo, status_code
+from flask_eureka.registry import RegistryCache, reconcile_hashcode
+from registry_fixtures import FakeEureka, applications, instance
+
+
+class TestRegistryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.full = applications([
+            {'name': 'ORDERS', 'instance': [instance('ORDERS', 'o1'), instance('ORDERS', 'o2', 'DOWN')]},
+            {'name': 'USERS', 'instance': instance('USERS', 'u1', vip='users')},
+        ])
+
+    def test_full_fetch(self):
+        cache = RegistryCache(FakeEureka(self.full))
+        cache.refresh()
+
+        self.assertTrue(cache.ready)
+        self.assertEqual(len(cache.get_app('orders')['application']['instance']), 2)
+        self.assertEqual(cache.get_instance('u1')['instance']['app'], 'USERS')
+        self.assertEqual(len(cache.get_vip('users')['applications']['application']), 1)
+        self.assertIsNone(cache.get_app('missing'))
+        self.assertEqual(cache.hashcode(), 'DOWN_1_UP_2_')
+
+    def test_delta_applied(self):
+        delta = applications([
+            {'name': 'ORDERS', 'instance': [instance('ORDERS', 'o2', 'UP', 'MODIFIED'),
+                                            instance('ORDERS', 'o3', 'UP', 'ADDED')]},
+            {'name': 'USERS', 'instance': [instance('USERS', 'u1', 'UP', 'DELETED')]},
+        ], hashcode='UP_3_')
+        fetch = FakeEureka(self.full, delta)
+        cache = RegistryCache(fetch)
+        cache.refresh()
+        cache.refresh()
+
+        self.assertEqual(fetch.calls, ['apps', 'apps/delta'])
+        self.assertEqual(cache.hashcode(), 'UP_3_')
+        self.assertIsNone(cache.get_app('USERS'))
+        self.assertIsNone(cache.get_instance('u1'))
+
+    def test_rendered_lookups_memoized_until_refresh(self):
+        delta = applications([{'name': 'ORDERS', 'instance': [instance('ORDERS', 'o2', 'UP', 'MODIFIED')]}],
+                             hashcode='UP_3_')
+        cache = RegistryCache(FakeEureka(self.full, delta))
+        cache.refresh()
+        rendered = cache.get_app('orders')
+        self.assertIs(cache.get_app('ORDERS'), rendered)
+        self.assertIs(cache.get_instance('o2'), cache.get_instance('o2'))
+
+        cache.refresh()
+        self.assertIsNot(cache.get_app('ORDERS'), rendered)
+        self.assertEqual(cache.get_instance('o2')['instance']['status'], 'UP')
+
+    def test_rendered_lookups_read_only(self):
+        cache = RegistryCache(FakeEureka(self.full))
+        cache.refresh()
+        rendered = cache.get_app('orders')
+        with self.assertRaises(TypeError):
+            rendered['application']['name'] = 'CHANGED'
+        with self.assertRaises(TypeError):
+            cache.get_apps()['applications'].update(application=[])
+        self.assertIsInstance(rendered['application']['instance'], tuple)
+        self.assertEqual(len(json.loads(json.dumps(rendered))['application']['instance']), 2)
+
+        changed = copy.deepcopy(rendered)
+        changed['application']['name'] = 'CHANGED'
+        changed['application']['instance'][0]['status'] = 'DOWN'
+        self.assertEqual(cache.get_app('orders')['application']['name'], 'ORDERS')
+        self.assertEqual(cache.get_instance('o1')['instance']['status'], 'UP')
+
+    def test_new_statuses_get_distinct_codes(self):
+        # switch threads as often as possible to make the race likely
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        for round in range(200):
+            statuses = ['CONCURRENT_%d_%d' % (round, index) for index in range(8)]
+            barrier = threading.Barrier(len(statuses))
+            codes = {}
+
+            def parse(status):
+                barrier.wait()
+                codes[status] = status_code(status)
+            threads = [threading.Thread(target=parse, args=(status,)) for status in statuses]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(dict((status, STATUSES[code]) for status, code in codes.items()),
+                             dict((status, status) for status in statuses))
+
+    def test_hashcode_mismatch_triggers_full_fetch(self):
+        delta = applications([], hashcode='UP_10_')
+        fetch = FakeEureka(self.full, delta)
+        cache = RegistryCache(fetch)
+        cache.refresh()
+        cache.refresh()
+
+        self.assertEqual(fetch.calls, ['apps', 'apps/delta', 'apps'])
+
+    def test_reconcile_hashcode(self):
+        instances = [InstanceInfo('a', status='UP'), InstanceInfo('b', status='DOWN'), InstanceInfo('c')]
+        self.assertEqual(reconcile_hashcode(instances), 'DOWN_1_UP_2_')
+
+    def test_lookups_render_registry_shapes(self):
+        cache = RegistryCache(FakeEureka(self.full))
+        cache.refresh()
+
+        rendered = cache.get_app_instance('orders', 'o2')['instance']
+        self.assertEqual((rendered['instanceId'], rendered['status'], rendered['vipAddress']), ('o2', 'DOWN', 'vip'))
+        self.assertEqual([instance.instance_id for instance in cache.get_up_instances('orders')], ['o1'])
@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+import unittest
+from flask_eureka.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.addCleanup(self.scheduler.stop)
+
+    def test_call_later_runs_in_order(self):
+        calls = []
+        done = threading.Event()
+        self.scheduler.call_later(0.05, calls.append, 'second')
+        self.scheduler.call_later(0.01, calls.append, 'first')
+        self.scheduler.call_later(0.1, done.set)
+
+        self.assertTrue(done.wait(1))
+        self.assertEqual(calls, ['first', 'second'])
+
+    def test_periodic_task_and_cancel(self):
+        calls = []
+        task = self.scheduler.call_every(0.01, calls.append, 'tick', jitter=0.5, first_delay=0)
+        time.sleep(0.1)
+        task.cancel()
+        time.sleep(0.02)
+        count = len(calls)
+        time.sleep(0.05)
+
+        self.assertGreater(count, 2)
+        self.assertEqual(len(calls), count)
+
+    def test_stop_joins_threads(self):
+        before = threading.active_count()
+        self.scheduler.call_later(0, lambda: None)
+        time.sleep(0.05)
+        self.scheduler.stop()
+        self.assertEqual(threading.active_count(), before)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+class TestSchedulerFork(unittest.TestCase):
+
+    def in_child(self, check):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                code = 0 if check() else 1
+            except BaseException:
+                code = 2
+            os._exit(code)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+
+    def test_restarted_in_forked_child(self):
+        scheduler = Scheduler()
+        self.addCleanup(scheduler.stop)
+        started = threading.Event()
+        scheduler.call_later(0, started.set)
+        self.assertTrue(started.wait(1))
+        scheduler.call_every(60, started.clear)
+
+        def check():
+            ran = threading.Event()
+            scheduler.call_later(0, ran.set)
+            return ran.wait(2) and len(scheduler) == 0
+        self.in_child(check)
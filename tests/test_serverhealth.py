@@ -0,0 +1,40 @@
+import unittest
+from flask_eureka.serverhealth import ServerHealth, ServerState
+
+URLS = ['http://peer1/', 'http://peer2/']
+
+
+class TestServerHealth(unittest.TestCase):
+
+    def test_circuit_opens_after_failures(self):
+        health = ServerHealth(failure_threshold=2, reset_timeout=60)
+        peer1 = health.state(URLS[0])
+        health.record_failure(peer1, 'timeout')
+        self.assertEqual([state.url for state in health.candidates(URLS)], URLS[::-1])
+
+        health.record_failure(peer1, 'timeout')
+        self.assertEqual(peer1.state, ServerState.OPEN)
+        self.assertEqual([state.url for state in health.candidates(URLS)], URLS[1:])
+
+    def test_half_open_probe(self):
+        health = ServerHealth(failure_threshold=1, reset_timeout=0)
+        peer1 = health.state(URLS[0])
+        health.record_failure(peer1, 'timeout')
+
+        self.assertIn(peer1, health.candidates(URLS))
+        self.assertTrue(health.acquire(peer1))
+        self.assertEqual(peer1.state, ServerState.HALF_OPEN)
+        self.assertFalse(health.acquire(peer1))
+
+        health.record_success(peer1, 0.01)
+        self.assertEqual(peer1.state, ServerState.CLOSED)
+
+    def test_sticks_to_current_server(self):
+        health = ServerHealth()
+        health.record_success(health.state(URLS[0]), 0.05)
+        health.record_success(health.state(URLS[1]), 0.01)
+        self.assertEqual(health.candidates(URLS)[0].url, URLS[1])
+
+        health.record_failure(health.state(URLS[1]), 'reset')
+        self.assertEqual(health.candidates(URLS)[0].url, URLS[0])
+        self.assertEqual([row['url'] for row in health.as_list(URLS)], URLS)
@@ -0,0 +1,95 @@
+import socket
+import threading
+import unittest
+from flask import Flask
+from flask_eureka import Eureka
+from flask_eureka.httpclient import ApiException
+from flask_eureka.model import InstanceInfo
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.path.encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeClient(object):
+    def __init__(self, instances):
+        self.instances = tuple(instances)
+
+    def get_up_instances(self, app_id):
+        return self.instances
+
+
+def dead_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestServiceSession(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), EchoHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.live = InstanceInfo('live', app='ORDERS', ip_addr='127.0.0.1', port=self.server.server_port)
+        self.dead = InstanceInfo('dead', app='ORDERS', ip_addr='127.0.0.1', port=dead_port())
+        self.eureka = Eureka(Flask(__name__))
+        self.eureka.client = FakeClient([self.dead, self.live])
+
+    def test_fails_over_and_reuses_connections(self):
+        session = self.eureka.session('orders')
+        self.assertIs(self.eureka.session('orders'), session)
+        for _ in range(3):
+            self.assertEqual(session.get('/api/x', query_params={'a': 1}).data, '/api/x?a=1')
+        self.assertEqual(session._pool(self.live).num_connections, 1)
+
+    def test_no_retry_left(self):
+        session = self.eureka.session('orders', retries=0)
+        self.eureka.client = FakeClient([self.dead])
+        with self.assertRaises(ApiException) as raised:
+            session.get('/')
+        self.assertEqual(raised.exception.status, 0)
+
+    def test_connection_error_reported_when_instances_run_out(self):
+        session = self.eureka.session('orders', retries=2)
+        self.eureka.client = FakeClient([self.dead])
+        with self.assertRaises(ApiException) as raised:
+            session.get('/')
+        self.assertEqual(raised.exception.status, 0)
+        self.assertIn('NewConnectionError', raised.exception.reason)
+
+    def test_pools_of_departed_instances_are_evicted(self):
+        session = self.eureka.session('orders')
+        session.get('/')
+        self.assertEqual(sorted(session._pools), ['dead', 'live'])
+
+        self.eureka.client = FakeClient([self.live])
+        session.get('/')
+        self.assertEqual(list(session._pools), ['live'])
@@ -0,0 +1,58 @@
+import threading
+import time
+import unittest
+from flask import Flask
+from flask_eureka import Eureka
+from flask_eureka.eurekaclient import EurekaClient
+from flask_eureka.stubserver import StubEureka
+
+
+class TestGracefulShutdown(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubEureka().start()
+        self.addCleanup(self.stub.stop)
+        self.app = Flask(__name__)
+        self.eureka = Eureka(self.app)
+        client = EurekaClient(name='app', host_name='host', port=8080, eureka_url=self.stub.url,
+                              use_dns=False, status_update_delay=0)
+        client.eureka_urls = [self.stub.url]
+        client.register()
+        self.eureka.client = client
+
+    def test_deregisters_then_drains(self):
+        release = threading.Event()
+
+        @self.app.route('/slow')
+        def slow():
+            release.wait(5)
+            return 'done'
+
+        request = threading.Thread(target=self.app.test_client().get, args=('/slow',))
+        request.start()
+        while self.eureka.in_flight == 0:
+            time.sleep(0.01)
+
+        result = []
+        shutdown = threading.Thread(target=lambda: result.append(self.eureka.shutdown(timeout=5)))
+        shutdown.start()
+        while self.stub.counts[('DELETE', 'apps', 2)] == 0:
+            time.sleep(0.01)
+        self.assertEqual(self.stub.counts[('PUT', 'apps', 3)], 1)
+        self.assertEqual(self.stub.instance_count(), 0)
+        self.assertTrue(shutdown.is_alive())
+
+        release.set()
+        shutdown.join(5)
+        request.join(5)
+        self.assertEqual(result, [True])
+        self.assertEqual(self.eureka.in_flight, 0)
+
+    def test_drain_timeout(self):
+        self.eureka.in_flight = 1
+        self.assertFalse(self.eureka.shutdown(timeout=0.1))
+
+    def test_renew_does_not_register_again_after_deregistration(self):
+        self.eureka.client.deregister()
+        self.assertRaises(Exception, self.eureka.client.renew)
+        self.assertEqual(self.stub.instance_count(), 0)
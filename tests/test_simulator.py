@@ -0,0 +1,19 @@
+import unittest
+from flask_eureka.simulator import Simulation, main
+
+
+class TestSimulation(unittest.TestCase):
+
+    def test_wipe_needs_the_stub(self):
+        self.assertRaises(ValueError, Simulation, 10, wipe_at=1, eureka_url='http://eureka:8761/')
+        with self.assertRaises(SystemExit):
+            main(['--eureka-url', 'http://eureka:8761/', '--wipe-at', '1'])
+
+    def test_wipe_triggers_reregistration(self):
+        report = Simulation(20, heartbeat_interval=0.2, duration=1.0, wipe_at=0.3, workers=4).run()
+
+        self.assertEqual(report['register']['calls'], 20)
+        self.assertEqual(report['register']['errors'], 0)
+        self.assertGreater(report['renew']['calls'], 20)
+        self.assertEqual(report['wipe']['reregistrations'], 20)
+        self.assertIsNotNone(report['wipe']['recovery_seconds'])
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from flask_eureka.model import Application, InstanceInfo
+from flask_eureka import registry
+from flask_eureka.registry import RegistryCache
+from flask_eureka.snapshot import LeaderLock, SnapshotReader, write_snapshot
+from registry_fixtures import FakeEureka, applications, instance
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'registry')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        apps = [Application('orders', [InstanceInfo('o1', app='ORDERS', port=8080)]),
+                Application('users', [InstanceInfo('u1', app='USERS', status='DOWN')])]
+        write_snapshot(self.path, apps, '3', 'DOWN_1_UP_1_')
+
+        reader = SnapshotReader(self.path)
+        self.assertEqual((reader.version, reader.hashcode), ('3', 'DOWN_1_UP_1_'))
+        self.assertEqual(reader.instances, {'o1': 'ORDERS', 'u1': 'USERS'})
+        self.assertEqual(reader.application('ORDERS').instances['o1'].port, 8080)
+        reader.close()
+
+    def test_leader_lock_is_exclusive(self):
+        first, second = LeaderLock(self.path + '.lock'), LeaderLock(self.path + '.lock')
+        self.assertTrue(first.try_acquire())
+        self.assertFalse(second.try_acquire())
+        first.release()
+        self.assertTrue(second.try_acquire())
+        second.release()
+
+    def test_workers_share_the_leader_fetch(self):
+        full = applications([
+            {'name': 'ORDERS', 'instance': [instance('ORDERS', 'o1'), instance('ORDERS', 'o2', 'DOWN')]},
+            {'name': 'USERS', 'instance': instance('USERS', 'u1', vip='users')},
+        ])
+        leader_fetch, follower_fetch = FakeEureka(full), FakeEureka(full)
+        leader = RegistryCache(leader_fetch, snapshot_path=self.path)
+        follower = RegistryCache(follower_fetch, snapshot_path=self.path)
+        leader.refresh()
+        follower.refresh()
+
+        self.assertEqual(leader_fetch.calls, ['apps'])
+        self.assertEqual(follower_fetch.calls, [])
+        self.assertTrue(follower.ready)
+        self.assertEqual(follower.hashcode(), 'DOWN_1_UP_2_')
+        self.assertEqual(follower.get_instance('u1')['instance']['app'], 'USERS')
+        self.assertEqual([i.instance_id for i in follower.get_up_instances('orders')], ['o1'])
+
+        leader.stop()
+        follower.refresh()
+        self.assertTrue(follower.is_leader)
+        self.assertEqual(follower_fetch.calls, ['apps'])
+        follower.stop()
+
+    def test_warm_start_from_persisted_snapshot(self):
+        full = applications([{'name': 'ORDERS', 'instance': instance('ORDERS', 'o1')}])
+        cache = RegistryCache(FakeEureka(full), persist_path=self.path)
+        cache.refresh()
+
+        def unavailable(endpoint):
+            raise IOError("Eureka is down")
+        restarted = RegistryCache(unavailable, persist_path=self.path)
+        self.assertTrue(restarted.ready)
+        self.assertEqual([i.instance_id for i in restarted.get_up_instances('orders')], ['o1'])
+        self.assertRaises(IOError, restarted.refresh)
+        self.assertEqual(restarted.get_app('orders')['application']['name'], 'ORDERS')
+
+        live = applications([{'name': 'USERS', 'instance': instance('USERS', 'u1')}])
+        restarted._fetch = FakeEureka(live)
+        restarted.refresh()
+        self.assertIsNone(restarted.get_app('orders'))
+        self.assertEqual(SnapshotReader(self.path).instances, {'u1': 'USERS'})
+
+    def test_lookups_not_blocked_while_writing(self):
+        full = applications([{'name': 'ORDERS', 'instance': instance('ORDERS', 'o1')}])
+        cache = RegistryCache(FakeEureka(full), persist_path=self.path)
+        looked_up = []
+
+        def slow_write(path, apps, version=None, hashcode=None):
+            lookup = threading.Thread(target=lambda: looked_up.append(cache.get_app('orders')))
+            lookup.start()
+            lookup.join(1)
+            write_snapshot(path, apps, version, hashcode)
+
+        with mock.patch.object(registry, 'write_snapshot', slow_write):
+            cache.refresh()
+        self.assertEqual(len(looked_up), 1)
+        self.assertEqual(SnapshotReader(self.path).instances, {'o1': 'ORDERS'})
@@ -0,0 +1,93 @@
+import socket
+import time
+import unittest
+from flask_eureka.eurekaclient import EurekaClient
+from flask_eureka.scheduler import Scheduler
+from flask_eureka.stubserver import StubEureka
+
+
+class TestStubEureka(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubEureka(instances=20, apps=2).start()
+        self.addCleanup(self.stub.stop)
+        self.client = EurekaClient(name='app', host_name='host', port=8080, eureka_url=self.stub.url,
+                                   use_dns=False, status_update_delay=0)
+        self.client.eureka_urls = [self.stub.url]
+
+    def test_register_renew_and_wipe(self):
+        self.client.register()
+        self.client.renew()
+        self.assertEqual(self.stub.instance_count(), 21)
+
+        self.stub.wipe()
+        self.client.renew()
+        self.assertEqual(self.stub.counts[('POST', 'apps', 1)], 2)
+        self.assertEqual(self.stub.instance_count(), 1)
+
+    def test_background_registration_running_before_star_returns(self):
+        class LateScheduler(Scheduler):
+            # the task runs before call_later returns its handle
+            def call_later(self, delay, fn, *args):
+                task = super(LateScheduler, self).call_later(delay, fn, *args)
+                time.sleep(0.05)
+                return task
+
+        scheduler = LateScheduler()
+        self.addCleanup(scheduler.stop)
+        self.client.scheduler = scheduler
+        self.client.star(background=True)
+        self.addCleanup(self.client.stop)
+        self.assertTrue(self.client.wait_until_registered(2))
+        self.assertEqual(self.stub.instance_count(), 21)
+
+    def hung_server(self):
+        # accepts connections but never replies
+        hung = socket.socket()
+        hung.bind(('127.0.0.1', 0))
+        hung.listen(8)
+        self.addCleanup(hung.close)
+        return 'http://127.0.0.1:%d/' % hung.getsockname()[1]
+
+    def test_hung_peer_leaves_time_for_the_next_ones(self):
+        self.client.request_timeout = 2
+        self.client.eureka_urls = [self.hung_server(), self.stub.url]
+
+        results = self.client.register()
+        self.assertIsNotNone(results[self.client.eureka_urls[0]])
+        self.assertIsNone(results[self.stub.url])
+        self.assertEqual(self.stub.instance_count(), 21)
+
+    def test_reads_fail_over_from_a_hung_server_with_the_default_timeouts(self):
+        client = EurekaClient(name='app', host_name='host', port=8080, eureka_url=self.stub.url, use_dns=False)
+        client.eureka_urls = [self.hung_server(), self.stub.url]
+
+        started = time.time()
+        self.assertEqual(len(client.get_apps()['applications']['application']), 2)
+        self.assertLess(time.time() - started, client.request_timeout)
+
+    def test_registered_zone_seen_by_peers(self):
+        self.client.zone = 'us-east-1b'
+        self.client.register()
+        peer = EurekaClient(name='peer', host_name='peer', port=8080, eureka_url=self.stub.url,
+                            use_dns=False, fetch_registry=True)
+        peer.eureka_urls = [self.stub.url]
+        peer.registry.refresh()
+        self.assertEqual([instance.zone for instance in peer.get_instances('app')], ['us-east-1b'])
+
+    def test_lookups(self):
+        self.assertEqual(len(self.client.get_up_instances('APP-1')), 10)
+        self.assertEqual(len(self.client.get_apps()['applications']['application']), 2)
+        self.assertEqual(self.client.get_instance('app-1-0:app-1:8080')['instance']['app'], 'APP-1')
+
+    def test_background_registration_retries(self):
+        self.stub.failure_rate = 1.0
+        self.client.registration_backoff = 0.05
+        self.client.star(background=True)
+        self.addCleanup(self.client.stop)
+        self.assertFalse(self.client.wait_until_registered(0.2))
+
+        self.stub.failure_rate = 0.0
+        self.assertTrue(self.client.wait_until_registered(2))
+        self.assertEqual(self.stub.instance_count(), 21)
+        self.assertIsNotNone(self.client.heartbeat_task)
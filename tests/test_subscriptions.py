@@ -0,0 +1,99 @@
+import unittest
+from flask_eureka.eurekaclient import EurekaClient, EurekaClientException
+from flask_eureka.model import Application, InstanceInfo
+from flask_eureka.registry import RegistryCache
+from flask_eureka.subscriptions import ChangeDispatcher, diff_applications
+from registry_fixtures import FakeEureka, applications, instance
+
+
+class TestSubscriptions(unittest.TestCase):
+
+    def setUp(self):
+        self.full = applications([
+            {'name': 'ORDERS', 'instance': [instance('ORDERS', 'o1'), instance('ORDERS', 'o2', 'DOWN')]},
+            {'name': 'USERS', 'instance': instance('USERS', 'u1')},
+        ])
+        self.received = []
+
+    def subscribe(self, cache, app_id):
+        cache.changes.subscribe(app_id, self.received.append)
+
+    def test_application_version(self):
+        application = Application('orders', [InstanceInfo('o1', status='UP')])
+        initial = application.version
+        previous = application.put(InstanceInfo('o2', status='UP'))
+        self.assertIsNone(previous)
+        application.pop('o2')
+        self.assertEqual(application.version, initial)
+        application.put(InstanceInfo('o1', status='DOWN'))
+        self.assertNotEqual(application.version, initial)
+        self.assertEqual(application.version, Application('orders', [InstanceInfo('o1', status='DOWN')]).version)
+
+    def test_diff_applications(self):
+        old = Application('orders', [InstanceInfo('o1', status='UP'), InstanceInfo('o2', status='UP')])
+        new = Application('orders', [InstanceInfo('o1', status='DOWN'), InstanceInfo('o3', status='UP')])
+        change = diff_applications('ORDERS', old, new)
+        self.assertEqual([i.instance_id for i in change.added], ['o3'])
+        self.assertEqual([i.instance_id for i in change.removed], ['o2'])
+        self.assertEqual([(status, i.status) for status, i in change.status_changed], [('UP', 'DOWN')])
+        self.assertFalse(diff_applications('ORDERS', old, old))
+
+    def test_delta_notifies_subscribers_of_the_application(self):
+        delta = applications([
+            {'name': 'ORDERS', 'instance': [instance('ORDERS', 'o2', 'UP', 'MODIFIED'),
+                                            instance('ORDERS', 'o3', 'UP', 'ADDED'),
+                                            instance('ORDERS', 'o1', 'UP', 'DELETED')]},
+            {'name': 'USERS', 'instance': [instance('USERS', 'u1', 'UP', 'DELETED')]},
+        ], hashcode='UP_2_')
+        cache = RegistryCache(FakeEureka(self.full, delta))
+        cache.refresh()
+        self.subscribe(cache, 'orders')
+        cache.refresh()
+        cache.changes.join()
+
+        self.assertEqual(len(self.received), 1)
+        change = self.received[0]
+        self.assertEqual(change.app, 'ORDERS')
+        self.assertEqual([i.instance_id for i in change.added], ['o3'])
+        self.assertEqual([i.instance_id for i in change.removed], ['o1'])
+        self.assertEqual([(status, i.instance_id) for status, i in change.status_changed], [('DOWN', 'o2')])
+        cache.changes.stop()
+
+    def test_full_fetch_only_notifies_changed_applications(self):
+        fetch = FakeEureka(self.full)
+        cache = RegistryCache(fetch)
+        cache.refresh()
+        self.subscribe(cache, 'ORDERS')
+        self.subscribe(cache, 'USERS')
+        fetch.responses['apps'] = applications([
+            {'name': 'ORDERS', 'instance': [instance('ORDERS', 'o1'), instance('ORDERS', 'o2', 'DOWN')]},
+        ])
+        cache.fetch_full()
+        cache.changes.join()
+
+        self.assertEqual([change.app for change in self.received], ['USERS'])
+        self.assertEqual([i.instance_id for i in self.received[0].removed], ['u1'])
+        cache.changes.stop()
+
+    def test_failing_subscriber_does_not_stop_delivery(self):
+        dispatcher = ChangeDispatcher()
+
+        def failing(change):
+            raise ValueError('boom')
+        dispatcher.subscribe('ORDERS', failing)
+        dispatcher.subscribe('ORDERS', self.received.append)
+        change = diff_applications('ORDERS', None, Application('orders', [InstanceInfo('o1')]))
+        dispatcher.publish([change])
+        dispatcher.join()
+        dispatcher.stop()
+
+        self.assertEqual(self.received, [change])
+
+    def test_client_requires_registry(self):
+        client = EurekaClient(name='app', eureka_url='http://localhost:8761/', use_dns=False)
+        with self.assertRaises(EurekaClientException):
+            client.on_change('ORDERS', self.received.append)
+
+
+if __name__ == '__main__':
+    unittest.main()